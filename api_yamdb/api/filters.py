@@ -4,22 +4,35 @@ from reviews.models import Title
 
 class TitleFilter(filters.FilterSet):
     category = filters.CharFilter(
-        field_name='category__slug',
-        lookup_expr='icontains'
+        field_name='category__slug'
     )
     genre = filters.CharFilter(
-        field_name='genre__slug',
-        lookup_expr='icontains'
+        field_name='genre__slug'
     )
     name = filters.CharFilter(
         field_name='name',
         lookup_expr='icontains'
     )
     year = filters.NumberFilter(
+        field_name='year'
+    )
+    year_min = filters.NumberFilter(
         field_name='year',
-        lookup_expr='icontains'
+        lookup_expr='gte'
+    )
+    year_max = filters.NumberFilter(
+        field_name='year',
+        lookup_expr='lte'
+    )
+    decade = filters.NumberFilter(
+        method='filter_decade'
     )
 
     class Meta:
         model = Title
         fields = '__all__'
+
+    def filter_decade(self, queryset, name, value):
+        """?decade=1990 — произведения 1990–1999 годов."""
+        start = int(value) // 10 * 10
+        return queryset.filter(year__range=(start, start + 9))
@@ -0,0 +1,56 @@
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db.models import Q
+
+from reviews.models import Comment, Review
+
+
+def latest_per_parent(queryset, parent_field, parents, limit=None):
+    """Свежие объекты для каждого родителя одним запросом.
+
+    Для каждого родителя в запрос входит подзапрос с его первыми
+    ``limit`` объектами из самого queryset — с фильтрами его менеджера,
+    — поэтому число запросов не зависит ни от количества родителей, ни
+    от ``limit``, а база читает по индексу (родитель, pub_date, id)
+    только ``limit`` строк на родителя.
+    Возвращает словарь {id родителя: [объекты]}.
+    """
+    if not parents:
+        return {}
+    if limit is None:
+        limit = settings.INCLUDE_RELATED_LIMIT
+    attname = queryset.model._meta.get_field(parent_field).attname
+    latest = queryset.order_by('-pub_date', '-pk').values('pk')
+    objects = queryset.filter(reduce(or_, (
+        Q(pk__in=latest.filter(**{parent_field: parent.pk})[:limit])
+        for parent in parents
+    ))).order_by('-pub_date', '-pk')
+    grouped = defaultdict(list)
+    for obj in objects:
+        grouped[getattr(obj, attname)].append(obj)
+    return grouped
+
+
+def attach_comments(reviews):
+    """Раскладывает свежие комментарии по отзывам в included_comments."""
+    comments = latest_per_parent(
+        Comment.objects.alive().select_related('author'), 'review', reviews
+    )
+    for review in reviews:
+        review.included_comments = comments.get(review.pk, [])
+
+
+def attach_reviews(titles, with_comments=False):
+    """Раскладывает свежие отзывы по произведениям в included_reviews."""
+    reviews = latest_per_parent(
+        Review.objects.alive().select_related('author'), 'title', titles
+    )
+    for title in titles:
+        title.included_reviews = reviews.get(title.pk, [])
+    if with_comments:
+        attach_comments(
+            [review for title in titles for review in title.included_reviews]
+        )
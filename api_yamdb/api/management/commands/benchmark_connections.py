@@ -0,0 +1,107 @@
+import statistics
+import threading
+import time
+
+from django.core.management import BaseCommand
+from django.db import close_old_connections, connection
+from django.db.backends.signals import connection_created
+from django.test import Client
+
+# Режимы: CONN_MAX_AGE и описание. С бэкендом api_yamdb.postgresql_pool
+# оба режима берут соединения из пула, и подключение — это выдача из
+# пула; новые соединения к серверу видны в статистике пула.
+MODES = (
+    (0, 'новое соединение на каждый запрос'),
+    (60, 'соединение переиспользуется (CONN_MAX_AGE=60)'),
+)
+
+
+class Command(BaseCommand):
+    help = ('Время ответа API с новым соединением к базе на каждый '
+            'запрос и с переиспользованием соединений. Запускайте с '
+            'DB_ENGINE=django.db.backends.postgresql и с '
+            'DB_ENGINE=api_yamdb.postgresql_pool, чтобы сравнить и пул.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', default='/api/v1/titles/',
+            help='адрес, который запрашивать'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='сколько запросов выполнить в каждом потоке'
+        )
+        parser.add_argument(
+            '--threads', type=int, default=1,
+            help='сколько потоков запрашивают одновременно'
+        )
+
+    def worker(self, path, count, timings):
+        client = Client(HTTP_HOST='localhost')
+        try:
+            for _ in range(count):
+                started = time.perf_counter()
+                client.get(path)
+                # Тестовый клиент не закрывает соединения в конце запроса,
+                # как это делает сервер; повторяем это вручную.
+                close_old_connections()
+                timings.append(time.perf_counter() - started)
+        finally:
+            connection.close()
+
+    def run(self, path, count, threads):
+        timings = []
+        workers = [
+            threading.Thread(
+                target=self.worker, args=(path, count, timings)
+            )
+            for _ in range(threads)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return sorted(timings)
+
+    def handle(self, *args, **options):
+        opened = []
+
+        def count_connection(sender, connection, **kwargs):
+            opened.append(connection.alias)
+
+        connection_created.connect(count_connection)
+        settings_dict = connection.settings_dict
+        initial = settings_dict['CONN_MAX_AGE']
+        self.stdout.write(f'Бэкенд: {settings_dict["ENGINE"]}')
+        try:
+            for max_age, name in MODES:
+                settings_dict['CONN_MAX_AGE'] = max_age
+                connection.close()
+                opened.clear()
+                timings = self.run(
+                    options['path'], options['requests'], options['threads']
+                )
+                p95 = timings[int(len(timings) * 0.95) - 1]
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                self.stdout.write(
+                    f'  p50 {statistics.median(timings) * 1000:.2f} мс, '
+                    f'p95 {p95 * 1000:.2f} мс, '
+                    f'среднее {statistics.mean(timings) * 1000:.2f} мс, '
+                    f'подключений: {len(opened)}'
+                )
+        finally:
+            settings_dict['CONN_MAX_AGE'] = initial
+            connection_created.disconnect(count_connection)
+        pool = getattr(connection, 'pool_stats', None)
+        if pool is not None:
+            stats = pool()
+            self.stdout.write(self.style.MIGRATE_HEADING('Пул соединений'))
+            self.stdout.write(
+                f'  выдано {stats["checkouts"]}, '
+                f'с ожиданием {stats["waits"]}, '
+                f'ожидание всего {stats["wait_seconds"] * 1000:.1f} мс, '
+                f'наибольшее {stats["max_wait_seconds"] * 1000:.1f} мс, '
+                f'отказов {stats["timeouts"]}, '
+                f'заменено {stats["replaced"]}, '
+                f'открыто {stats["opened"]}'
+            )
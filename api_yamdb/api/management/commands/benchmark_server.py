@@ -0,0 +1,86 @@
+import statistics
+import threading
+import time
+
+import requests
+from django.core.management import BaseCommand
+
+PATHS = (
+    '/api/v1/titles/',
+    '/api/v1/titles/{title}/',
+    '/api/v1/titles/{title}/reviews/',
+    '/api/v1/titles/{title}/reviews/{review}/comments/',
+)
+
+
+def percentile(timings, share):
+    return timings[max(int(len(timings) * share) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = ('Нагрузка на запущенный сервер: пропускная способность и '
+            'хвосты времени ответа при разном числе одновременных '
+            'клиентов на частых адресах чтения. Для сравнения запустите '
+            'сервер WSGI (gevent) и ASGI (uvicorn) с одинаковым числом '
+            'воркеров и прогоните команду против каждого.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='адрес сервера, например '
+                                        'http://localhost:8000')
+        parser.add_argument(
+            '--concurrency', type=int, nargs='+', default=[1, 10, 50],
+            help='число одновременных клиентов (можно несколько)'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='сколько запросов выполняет каждый клиент'
+        )
+        parser.add_argument('--title', type=int, default=1)
+        parser.add_argument('--review', type=int, default=1)
+
+    def client(self, paths, count, timings, errors):
+        session = requests.Session()
+        for number in range(count):
+            started = time.perf_counter()
+            try:
+                response = session.get(paths[number % len(paths)])
+                ok = response.status_code < 500
+            except requests.RequestException:
+                ok = False
+            timings.append(time.perf_counter() - started)
+            if not ok:
+                errors.append(number)
+
+    def handle(self, *args, **options):
+        base = options['url'].rstrip('/')
+        paths = [
+            base + path.format(
+                title=options['title'], review=options['review']
+            )
+            for path in PATHS
+        ]
+        for concurrency in options['concurrency']:
+            timings, errors = [], []
+            clients = [
+                threading.Thread(target=self.client, args=(
+                    paths, options['requests'], timings, errors
+                ))
+                for _ in range(concurrency)
+            ]
+            started = time.perf_counter()
+            for client in clients:
+                client.start()
+            for client in clients:
+                client.join()
+            elapsed = time.perf_counter() - started
+            timings.sort()
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'клиентов: {concurrency}'
+            ))
+            self.stdout.write(
+                f'  {len(timings) / elapsed:.1f} запросов/с, '
+                f'p50 {statistics.median(timings) * 1000:.1f} мс, '
+                f'p95 {percentile(timings, 0.95) * 1000:.1f} мс, '
+                f'p99 {percentile(timings, 0.99) * 1000:.1f} мс, '
+                f'ошибок: {len(errors)}'
+            )
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management import BaseCommand
+
+from api_yamdb import snapshots
+
+
+class Command(BaseCommand):
+    help = ('Собирает снимок заполненной базы для тестов, если для '
+            'текущих схемы и данных его ещё нет. Тесты собирают его и '
+            'сами, команда нужна, чтобы сделать это заранее (в CI).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='собрать заново, даже если снимок есть'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        name = snapshots.ensure(rebuild=options['rebuild'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Снимок {name} готов за {time.perf_counter() - started:.1f} с'
+        ))
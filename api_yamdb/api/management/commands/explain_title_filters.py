@@ -0,0 +1,71 @@
+import time
+
+from django.core.management import BaseCommand
+from django.db import connection
+
+from api.filters import TitleFilter
+from api.views import TitleViewSet
+from reviews.models import Category, Genre, Title
+
+# Прежний фильтр по году приводил year к тексту: year=199 находил и
+# 1990–1999, и 2199, а индекс по году не использовался.
+LEGACY = 'year icontains (старый фильтр)'
+
+
+class Command(BaseCommand):
+    help = ('Планы запросов и время выполнения типичных фильтров каталога '
+            'произведений. Для сравнения показывает и прежний фильтр '
+            'по году через icontains.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='выполнять запросы (EXPLAIN ANALYZE)'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='сколько раз выполнять каждый запрос для замера времени'
+        )
+
+    def scenarios(self):
+        year = Title.objects.values_list('year', flat=True).first() or 2000
+        category = Category.objects.values_list('slug', flat=True).first()
+        genre = Genre.objects.values_list('slug', flat=True).first()
+        return [
+            (LEGACY, None, {'year': str(year)}),
+            ('year', {'year': year}, None),
+            ('year_min + year_max', {
+                'year_min': year - 5, 'year_max': year + 5
+            }, None),
+            ('decade', {'decade': year // 10 * 10}, None),
+            ('category + year', {'category': category, 'year': year}, None),
+            ('genre', {'genre': genre}, None),
+        ]
+
+    def queryset(self, params, legacy):
+        if legacy is not None:
+            return TitleViewSet.queryset.filter(
+                year__icontains=legacy['year']
+            )
+        return TitleFilter(params, queryset=TitleViewSet.queryset.all()).qs
+
+    def handle(self, *args, **options):
+        explain = {}
+        if options['analyze']:
+            explain['analyze'] = True
+        for name, params, legacy in self.scenarios():
+            queryset = self.queryset(params, legacy)
+            started = time.perf_counter()
+            for _ in range(options['repeat']):
+                list(queryset.all())
+            elapsed = (time.perf_counter() - started) / options['repeat']
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{name}: {params or legacy} — {elapsed * 1000:.2f} мс'
+            ))
+            self.stdout.write(queryset.explain(**explain))
+            self.stdout.write('')
+        if connection.vendor == 'postgresql':
+            self.stdout.write(
+                'На маленькой таблице планировщик может выбрать '
+                'Seq Scan как более дешёвый; сравнивайте на полных данных.'
+            )
@@ -0,0 +1,53 @@
+from django.core.management import BaseCommand
+
+from api_yamdb import startup
+
+
+def ms(seconds):
+    return f'{seconds * 1000:8.1f} мс'
+
+
+class Command(BaseCommand):
+    help = ('Время старта воркера: django.setup() по приложениям '
+            '(импорт, модели, ready), импорт представлений, '
+            'сериализаторов, фильтров и бэкендов JWT, самые дорогие '
+            'пакеты. Замеряется в отдельном чистом интерпретаторе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top', type=int, default=15,
+            help='сколько самых дорогих пакетов показать'
+        )
+
+    def handle(self, *args, **options):
+        report = startup.profile()
+        self.stdout.write(f'django.setup(): {ms(report["setup"])}')
+        self.stdout.write(
+            f'{"приложение":<26}{"импорт":>12}{"модели":>12}{"ready":>12}'
+        )
+        for app in report['apps']:
+            self.stdout.write(
+                f'{app["app"]:<26}{ms(app["import"]):>12}'
+                f'{ms(app.get("models", 0)):>12}'
+                f'{ms(app.get("ready", 0)):>12}'
+            )
+        self.stdout.write('Импорт до первого запроса:')
+        for module in report['modules']:
+            self.stdout.write(
+                f'  {module["module"]:<42}{ms(module["import"])}'
+            )
+        self.stdout.write('Самые дорогие пакеты (importtime):')
+        packages = sorted(
+            report['importtime'].items(), key=lambda item: -item[1]
+        )
+        for package, seconds in packages[:options['top']]:
+            self.stdout.write(f'  {package:<42}{ms(seconds)}')
+        if report['heavy']:
+            self.stdout.write(self.style.WARNING(
+                'При старте загружены библиотеки пакетных пересчётов: '
+                + ', '.join(report['heavy'])
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                'Библиотеки пакетных пересчётов при старте не загружаются'
+            ))
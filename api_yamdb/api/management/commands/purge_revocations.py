@@ -0,0 +1,14 @@
+from django.core.management import BaseCommand
+
+from users.revocation import purge_expired
+
+
+class Command(BaseCommand):
+    help = ('Удаляет записи об отзыве токенов, срок действия которых уже '
+            'истёк. Запускается периодически, например из cron.')
+
+    def handle(self, *args, **kwargs):
+        count = purge_expired()
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено истёкших отзывов: {count}'
+        ))
@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from api import warmup
+
+
+class Command(BaseCommand):
+    help = ('Прогрев буфера базы и кэшей после выкладки: списки жанров и '
+            'категорий, первые страницы каталога и самые частые адреса '
+            'по статистике прошлого запуска.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=settings.WARM_CACHE_PATHS,
+            help='сколько адресов прогревать сверх общих списков'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=settings.WARM_CACHE_WORKERS,
+            help='сколько запросов выполнять одновременно'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        results = warmup.warm(
+            warmup.paths(options['limit']), options['workers']
+        )
+        for path, status_code, elapsed in results:
+            style = (
+                self.style.SUCCESS if status_code == 200
+                else self.style.WARNING
+            )
+            self.stdout.write(style(
+                f'{status_code} {elapsed * 1000:7.1f} мс {path}'
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f'Прогрето адресов: {len(results)} за '
+            f'{time.perf_counter() - started:.1f} с'
+        ))
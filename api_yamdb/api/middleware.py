@@ -0,0 +1,99 @@
+from django.conf import settings
+from django.http import JsonResponse
+
+from . import warmup
+from .mixins import Overloaded, in_flight, streams
+
+
+def streaming_view(view):
+    """Помечает вьюху потока SSE: её соединения считаются отдельно от
+    обычных запросов (см. RequestBudgetMiddleware)."""
+    view.streaming_view = True
+    return view
+
+
+class CountedStream:
+    """Тело потокового ответа, которое держит место в счётчике, пока
+    сервер не закроет ответ."""
+
+    def __init__(self, content, counter):
+        self.content = content
+        self.counter = counter
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.content)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.counter.__exit__()
+
+
+class RequestBudgetMiddleware:
+    """Считает запросы к API (все маршруты /api/: вьюсеты, функции,
+    потоки SSE), которые процесс обрабатывает сейчас, и сверх
+    API_MAX_IN_FLIGHT сразу отвечает 503 с Retry-After. Поток SSE
+    занимает место, пока открыт, в своём счётчике с порогом
+    API_MAX_STREAMS. Вьюсеты с порогом ниже общего сверяются с тем же
+    счётчиком (RequestBudgetMixin.max_in_flight).
+
+    Отсечение работает только у воркеров, которые обрабатывают
+    несколько запросов одновременно: gevent, потоки, ASGI. У
+    синхронного воркера в процессе всегда один запрос, и нагрузку там
+    ограничивает только число воркеров."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.budget_counter = None
+        response = self.get_response(request)
+        counter = request.budget_counter
+        if counter is None:
+            return response
+        if response.streaming:
+            response.streaming_content = CountedStream(
+                response.streaming_content, counter
+            )
+        else:
+            counter.__exit__()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not request.path_info.startswith('/api/'):
+            return None
+        if getattr(view_func, 'streaming_view', False):
+            counter, limit = streams, settings.API_MAX_STREAMS
+        else:
+            counter, limit = in_flight, settings.API_MAX_IN_FLIGHT
+        counter.__enter__()
+        request.budget_counter = counter
+        if counter.count > limit:
+            response = JsonResponse(
+                {'detail': str(Overloaded.default_detail)},
+                status=Overloaded.status_code
+            )
+            response['Retry-After'] = str(settings.API_RETRY_AFTER)
+            return response
+        return None
+
+
+class AccessStatsMiddleware:
+    """Считает успешные GET-запросы к каталогу для прогрева кэшей после
+    выкладки. Запросы самого прогрева не считаются."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            request.method == 'GET'
+            and response.status_code == 200
+            and warmup.WARMUP_HEADER not in request.META
+        ):
+            key = warmup.request_key(request)
+            if key is not None:
+                warmup.stats.hit(key)
+        return response
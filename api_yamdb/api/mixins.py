@@ -1,8 +1,208 @@
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import OperationalError, connection
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, ValidationError
 from rest_framework.mixins import (CreateModelMixin, DestroyModelMixin,
                                    ListModelMixin)
+from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
+from reviews import deletion
+
+from .serializers import DeletionJobSerializer
+
+
+# Код ошибки PostgreSQL: запрос прерван по statement_timeout.
+QUERY_CANCELED = '57014'
+
+
+class Overloaded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Сервер перегружен, повторите запрос позже.'
+    default_code = 'overloaded'
+
+    def __init__(self, wait):
+        super().__init__()
+        self.wait = wait
+
+
+class DeadlineExceeded(Overloaded):
+    default_detail = 'Запрос выполнялся слишком долго, повторите позже.'
+    default_code = 'deadline_exceeded'
+
+
+class InFlight:
+    """Число запросов к API, которые процесс обрабатывает сейчас."""
+
+    def __init__(self):
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        with self.lock:
+            self.count += 1
+
+    def __exit__(self, *exc_info):
+        with self.lock:
+            self.count -= 1
+
+
+in_flight = InFlight()
+streams = InFlight()
+
+
+class RequestBudgetMixin:
+    """Бюджет запроса вьюсета, задаётся атрибутами класса.
+
+    * statement_timeout — предел в миллисекундах на каждый запрос к базе
+      в транзакции запроса (SET LOCAL, только PostgreSQL). Запрос,
+      прерванный по времени, получает 503 с Retry-After;
+    * max_in_flight — если процесс уже обрабатывает больше запросов к
+      API (их считает RequestBudgetMiddleware), запрос сразу получает 503
+      с Retry-After, не выполняя запросов к базе. Дорогим вьюсетам
+      ставят порог ниже общего API_MAX_IN_FLIGHT, чтобы под нагрузкой
+      они отсекались первыми;
+    * max_limit — наибольший ?limit= пагинации вьюсета."""
+    statement_timeout = settings.API_STATEMENT_TIMEOUT
+    max_in_flight = settings.API_MAX_IN_FLIGHT
+    max_limit = settings.API_MAX_LIMIT
+
+    def initial(self, request, *args, **kwargs):
+        if in_flight.count > self.max_in_flight:
+            raise Overloaded(settings.API_RETRY_AFTER)
+        if connection.vendor == 'postgresql' and connection.in_atomic_block:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SET LOCAL statement_timeout = %s',
+                    [self.statement_timeout]
+                )
+        super().initial(request, *args, **kwargs)
+
+    def handle_exception(self, exc):
+        if (
+            isinstance(exc, OperationalError)
+            and getattr(exc.__cause__, 'pgcode', None) == QUERY_CANCELED
+        ):
+            exc = DeadlineExceeded(settings.API_RETRY_AFTER)
+        return super().handle_exception(exc)
+
 
 class ModelMixinSet(CreateModelMixin, ListModelMixin,
                     DestroyModelMixin, GenericViewSet):
     pass
+
+
+class BackgroundDestroyMixin:
+    """Удаление в фоне: объект сразу скрывается, зависимые записи
+    удаляются пачками после ответа. Ответ 202 содержит задание, за ходом
+    которого можно следить через /deletions/{id}/."""
+
+    def destroy(self, request, *args, **kwargs):
+        job = deletion.schedule(self.get_object())
+        return Response(
+            DeletionJobSerializer(job).data, status=status.HTTP_202_ACCEPTED
+        )
+
+
+class IncludeMixin:
+    """Встраивание связанных объектов по параметру ?include=a,b.
+
+    Вьюсет перечисляет допустимые значения в include_options и
+    подгружает их пачкой для страницы (или одного объекта) в
+    load_includes. Набор запрошенных значений передаётся сериализатору
+    через контекст под ключом include."""
+    include_options = ()
+
+    def get_includes(self):
+        requested = self.request.query_params.get('include', '')
+        return {
+            name for name in requested.split(',')
+            if name in self.include_options
+        }
+
+    def load_includes(self, objects, includes):
+        raise NotImplementedError
+
+    def include_related(self, objects):
+        includes = self.get_includes()
+        if includes and self.action in ('list', 'retrieve', 'batch'):
+            self.load_includes(objects, includes)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['include'] = self.get_includes()
+        return context
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None:
+            self.include_related(page)
+        return page
+
+    def get_object(self):
+        obj = super().get_object()
+        self.include_related([obj])
+        return obj
+
+    def get_batch(self, queryset, ids):
+        found = super().get_batch(queryset, ids)
+        self.include_related(list(found.values()))
+        return found
+
+
+class MultiGetMixin:
+    """Пакетное чтение: GET .../batch/?ids=a,b,c вместо запроса на
+    каждый объект.
+
+    Значения — lookup_field вьюсета (у пользователей — username), не
+    больше max_batch, повторы отбрасываются. Объекты читаются из
+    get_queryset() одним запросом с теми же select_related и
+    prefetch_related, что и в retrieve, и возвращаются в порядке ids;
+    ненайденные значения перечисляются в missing."""
+    max_batch = settings.MULTI_GET_MAX_IDS
+
+    def get_batch_ids(self, model):
+        values = [
+            value.strip()
+            for param in self.request.query_params.getlist('ids')
+            for value in param.split(',') if value.strip()
+        ]
+        if not values:
+            raise ValidationError(
+                {'ids': 'Перечислите значения через запятую'}
+            )
+        if len(values) > self.max_batch:
+            raise ValidationError(
+                {'ids': f'Не больше {self.max_batch} значений'}
+            )
+        if self.lookup_field == 'pk':
+            field = model._meta.pk
+        else:
+            field = model._meta.get_field(self.lookup_field)
+        try:
+            return list(dict.fromkeys(field.to_python(v) for v in values))
+        except DjangoValidationError:
+            raise ValidationError({'ids': 'Неверное значение'})
+
+    def get_batch(self, queryset, ids):
+        """Найденные объекты: {значение: объект}."""
+        return queryset.in_bulk(ids, field_name=self.lookup_field)
+
+    @action(detail=False, url_path='batch')
+    def batch(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        ids = self.get_batch_ids(queryset.model)
+        found = self.get_batch(queryset, ids)
+        for obj in found.values():
+            self.check_object_permissions(request, obj)
+        serializer = self.get_serializer(
+            [found[value] for value in ids if value in found], many=True
+        )
+        return Response({
+            'results': serializer.data,
+            'missing': [value for value in ids if value not in found],
+        })
@@ -0,0 +1,72 @@
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import (BasePagination, CursorPagination,
+                                       LimitOffsetPagination)
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def max_limit(view, default):
+    """Наибольший размер страницы: max_limit вьюсета или default."""
+    return getattr(view, 'max_limit', None) or default
+
+
+class CappedLimitOffsetPagination(LimitOffsetPagination):
+    """limit/offset, где ?limit= не больше max_limit вьюсета."""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.max_limit = max_limit(view, settings.API_MAX_LIMIT)
+        return super().paginate_queryset(queryset, request, view)
+
+
+class LeaderboardPagination(CappedLimitOffsetPagination):
+    """Пагинация рейтинга: число позиций хранится в самом рейтинге,
+    поэтому страница читается без COUNT(*) по всем позициям."""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.leaderboard = view.leaderboard
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_count(self, queryset):
+        if self.leaderboard is None:
+            return 0
+        return self.leaderboard.size
+
+
+class ActivityPagination(CursorPagination):
+    """Пагинация отзывов и комментариев пользователя по дате: страница
+    читается по индексу (author, pub_date) без OFFSET и COUNT(*)."""
+    ordering = '-pub_date'
+
+
+class SequencePagination(BasePagination):
+    """Пачки журнала изменений по номеру: ?since= — последний полученный
+    номер, ?limit= — размер пачки. Читается по первичному ключу без
+    OFFSET и COUNT(*)."""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = int(request.query_params.get(
+                'limit', settings.REST_FRAMEWORK['PAGE_SIZE']
+            ))
+        except ValueError:
+            raise ValidationError('since и limit должны быть числами')
+        limit = max(
+            min(limit, max_limit(view, settings.CHANGES_MAX_LIMIT)), 1
+        )
+        page = list(queryset.filter(seq__gt=since).order_by('seq')[:limit])
+        self.last_seq = page[-1].seq if page else since
+        self.next = None
+        if len(page) == limit:
+            self.next = replace_query_param(
+                request.build_absolute_uri(), 'since', self.last_seq
+            )
+        return page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'last_seq': self.last_seq,
+            'next': self.next,
+            'results': data,
+        })
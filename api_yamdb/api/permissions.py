@@ -20,7 +20,7 @@ class AdminModeratorAuthorPermission(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         return (
             request.method in permissions.SAFE_METHODS
-            or obj.author == request.user
+            or obj.author_id == request.user.pk
             or request.user.is_moderator
             or request.user.is_admin
         )
@@ -34,3 +34,12 @@ class IsAdmin(permissions.BasePermission):
                 or request.user.is_staff
                 or request.user.is_superuser
                 )
+
+
+class IsModerator(permissions.BasePermission):
+
+    def has_permission(self, request, view):
+        return (request.user.is_authenticated
+                and (request.user.is_moderator
+                     or request.user.is_admin
+                     or request.user.is_staff))
@@ -4,17 +4,27 @@ from rest_framework.generics import get_object_or_404
 from rest_framework.relations import SlugRelatedField
 from rest_framework.validators import UniqueTogetherValidator, UniqueValidator
 
-from reviews.models import Category, Comment, Genre, Review, Title
+from reviews import moderation
+from reviews.models import (Category, Change, Comment, DeletionJob, Genre,
+                            Review, Title)
 from users.models import CHOICE_ROLES, User
 from users.utils import (email_validate, username_validate)
 
 
+def unique_among_all(model):
+    """Проверка уникальности и среди объектов, которые удаляются в фоне:
+    менеджер по умолчанию их не показывает, но строка со значением ещё
+    есть в базе."""
+    return UniqueValidator(queryset=model.all_objects.all())
+
+
 class CategorySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Category
         lookup_field = 'slug'
         fields = ('name', 'slug')
+        extra_kwargs = {'slug': {'validators': [unique_among_all(Category)]}}
 
 
 class GenreSerializer(serializers.ModelSerializer):
@@ -23,6 +33,16 @@ class GenreSerializer(serializers.ModelSerializer):
         model = Genre
         lookup_field = 'slug'
         fields = ('name', 'slug')
+        extra_kwargs = {'slug': {'validators': [unique_among_all(Genre)]}}
+
+
+def nested_includes(includes, prefix):
+    """Значения include для вложенного сериализатора: reviews.comments
+    для произведения превращается в comments для отзыва."""
+    prefix = f'{prefix}.'
+    return {
+        name[len(prefix):] for name in includes if name.startswith(prefix)
+    }
 
 
 class TitleReadSerializer(serializers.ModelSerializer):
@@ -31,18 +51,39 @@ class TitleReadSerializer(serializers.ModelSerializer):
         read_only=True,
         many=True
     )
-    rating = serializers.IntegerField(read_only=True)
+    rating = serializers.FloatField(read_only=True)
+    reviews_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         fields = ('id',
                   'name',
                   'year',
                   'rating',
+                  'reviews_count',
                   'description',
                   'genre',
                   'category')
         model = Title
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if instance.category is not None and instance.category.deleting:
+            # Связь снимет фоновое удаление категории.
+            data['category'] = None
+        includes = self.context.get('include', ())
+        if 'reviews' in includes or 'reviews.comments' in includes:
+            data['reviews'] = ReviewSerializer(
+                getattr(instance, 'included_reviews', []),
+                many=True,
+                context={
+                    **self.context,
+                    'include': nested_includes(includes, 'reviews'),
+                }
+            ).data
+        if 'histogram' in includes:
+            data['histogram'] = getattr(instance, 'included_histogram', {})
+        return data
+
 
 class TitleWriteSerializer(serializers.ModelSerializer):
     category = serializers.SlugRelatedField(
@@ -77,7 +118,9 @@ class ReviewSerializer(serializers.ModelSerializer):
         title_id = self.context['view'].kwargs.get('title_id')
         title = get_object_or_404(Title, pk=title_id)
         if request.method == 'POST':
-            if Review.objects.filter(title=title, author=author).exists():
+            if Review.all_objects.filter(
+                title=title, author=author
+            ).exists():
                 raise serializers.ValidationError(
                     'Нельзя добавить больше одного отзыва'
                 )
@@ -86,13 +129,23 @@ class ReviewSerializer(serializers.ModelSerializer):
     class Meta:
         fields = (
             'id', 'text', 'author',
-            'score', 'pub_date',
+            'score', 'pub_date', 'comments_count',
         )
         read_only_fields = (
-            'id', 'author', 'pub_date',
+            'id', 'author', 'pub_date', 'comments_count',
         )
         model = Review
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if 'comments' in self.context.get('include', ()):
+            data['comments'] = CommentSerializer(
+                getattr(instance, 'included_comments', []),
+                many=True,
+                context=self.context
+            ).data
+        return data
+
 
 class CommentSerializer(serializers.ModelSerializer):
     author = SlugRelatedField(
@@ -110,8 +163,79 @@ class CommentSerializer(serializers.ModelSerializer):
         model = Comment
 
 
+class UserReviewSerializer(ReviewSerializer):
+
+    class Meta(ReviewSerializer.Meta):
+        fields = (
+            'id', 'title', 'text', 'author',
+            'score', 'pub_date', 'comments_count',
+        )
+        read_only_fields = fields
+
+
+class UserCommentSerializer(CommentSerializer):
+    title = serializers.IntegerField(source='review.title_id', read_only=True)
+
+    class Meta(CommentSerializer.Meta):
+        fields = (
+            'id', 'title', 'review', 'text', 'author',
+            'pub_date',
+        )
+        read_only_fields = fields
+
+
+class ChangeSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = Change
+        fields = (
+            'seq', 'model', 'object_id', 'key', 'action', 'created_at',
+        )
+        read_only_fields = fields
+
+
+class DeletionJobSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = DeletionJob
+        fields = (
+            'id', 'model', 'object_id', 'name', 'status', 'total',
+            'deleted', 'error', 'created_at', 'updated_at', 'finished_at',
+        )
+        read_only_fields = fields
+
+
+class ModerationSerializer(serializers.Serializer):
+    """Массовая модерация: действие и выборка записей — по списку id,
+    по автору и периоду [since, until) или по их пересечению"""
+    action = serializers.ChoiceField(choices=moderation.ACTIONS)
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        allow_empty=False,
+        max_length=settings.MODERATION_MAX_IDS
+    )
+    author = SlugRelatedField(
+        slug_field='username',
+        queryset=User.all_objects.all(),
+        required=False
+    )
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        if 'ids' not in data and 'author' not in data:
+            raise serializers.ValidationError(
+                'Укажите ids или author'
+            )
+        return data
+
+
 class UserSerializer(serializers.ModelSerializer):
     """Сериализатор модели User для обычных пользователей - не админов"""
+    reviews_count = serializers.IntegerField(read_only=True)
+    average_score = serializers.FloatField(read_only=True)
+    comments_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = User
@@ -121,8 +245,15 @@ class UserSerializer(serializers.ModelSerializer):
             'first_name',
             'last_name',
             'bio',
-            'role'
+            'role',
+            'reviews_count',
+            'average_score',
+            'comments_count',
         )
+        extra_kwargs = {
+            'username': {'validators': [unique_among_all(User)]},
+            'email': {'validators': [unique_among_all(User)]},
+        }
 
     def validate_username(self, value):
         username_validate(value)
@@ -136,9 +267,16 @@ class UserSerializer(serializers.ModelSerializer):
 class MeSerializer(serializers.ModelSerializer):
     """Сериализатор модели User для редактирования профайла"""
 
-    email = serializers.EmailField(max_length=254)
-    username = serializers.CharField(max_length=150)
+    email = serializers.EmailField(
+        max_length=254, validators=[unique_among_all(User)]
+    )
+    username = serializers.CharField(
+        max_length=150, validators=[unique_among_all(User)]
+    )
     role = serializers.CharField(max_length=15, read_only=True)
+    reviews_count = serializers.IntegerField(read_only=True)
+    average_score = serializers.FloatField(read_only=True)
+    comments_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = User
@@ -148,12 +286,15 @@ class MeSerializer(serializers.ModelSerializer):
             'first_name',
             'last_name',
             'bio',
-            'role'
+            'role',
+            'reviews_count',
+            'average_score',
+            'comments_count',
         )
 
         validators = (
             UniqueTogetherValidator(
-                queryset=User.objects.all(),
+                queryset=User.all_objects.all(),
                 fields=['username', 'email']
             ),
         )
@@ -171,9 +312,16 @@ class AdminOrSuperAdminUserSerializer(serializers.ModelSerializer):
     """Сериализатор модели User для пользователей админ и суперадмин.
     Этим пользователям доступно редактирование роли"""
 
-    email = serializers.EmailField(max_length=254)
-    username = serializers.CharField(max_length=150)
+    email = serializers.EmailField(
+        max_length=254, validators=[unique_among_all(User)]
+    )
+    username = serializers.CharField(
+        max_length=150, validators=[unique_among_all(User)]
+    )
     role = serializers.CharField(max_length=15, default='user')
+    reviews_count = serializers.IntegerField(read_only=True)
+    average_score = serializers.FloatField(read_only=True)
+    comments_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = User
@@ -184,11 +332,14 @@ class AdminOrSuperAdminUserSerializer(serializers.ModelSerializer):
             'last_name',
             'bio',
             'role',
+            'reviews_count',
+            'average_score',
+            'comments_count',
         )
 
         validators = (
             UniqueTogetherValidator(
-                queryset=User.objects.all(),
+                queryset=User.all_objects.all(),
                 fields=['username', 'email']
             ),
         )
@@ -215,11 +366,11 @@ class SignUpSerializer(serializers.ModelSerializer):
 
     username = serializers.CharField(
         max_length=150,
-        validators=[UniqueValidator(queryset=User.objects.all())]
-    ),
+        validators=[unique_among_all(User)]
+    )
     email = serializers.EmailField(
         max_length=254,
-        validators=[UniqueValidator(queryset=User.objects.all())])
+        validators=[unique_among_all(User)])
 
     class Meta:
         model = User
@@ -1,6 +1,8 @@
-from api.views import (CategoryViewSet, CommentViewSet, GenreViewSet,
-                       ReviewViewSet, signup, TitleViewSet, get_token,
-                       UserViewSet)
+from api.views import (activity_feed, CategoryViewSet, ChangeViewSet,
+                       comment_events, CommentViewSet, DeletionJobViewSet,
+                       GenreViewSet, moderate, review_events,
+                       ReviewLookupViewSet, ReviewViewSet, revoke, signup,
+                       suggest, TitleViewSet, get_token, UserViewSet)
 from django.urls import include, path
 from rest_framework import routers
 
@@ -17,12 +19,29 @@ router.register(r'titles/(?P<title_id>\d+)/reviews/'
                 r'(?P<review_id>\d+)/comments',
                 CommentViewSet,
                 basename='comments')
+router.register(r'reviews', ReviewLookupViewSet, basename='review-lookup')
 router.register(r'titles', TitleViewSet)
 router.register(r'genres', GenreViewSet)
 router.register(r'categories', CategoryViewSet)
+router.register(r'deletions', DeletionJobViewSet)
+router.register(r'changes', ChangeViewSet, basename='changes')
 
 urlpatterns = [
+    path(
+        'v1/titles/<int:title_id>/reviews/events/',
+        review_events,
+        name='review-events'
+    ),
+    path(
+        'v1/titles/<int:title_id>/reviews/<int:review_id>/comments/events/',
+        comment_events,
+        name='comment-events'
+    ),
     path('v1/', include(router.urls)),
     path('v1/auth/signup/', signup, name='signup'),
     path('v1/auth/token/', get_token, name='token'),
+    path('v1/auth/revoke/', revoke, name='revoke'),
+    path('v1/autocomplete/', suggest, name='autocomplete'),
+    path('v1/feed/', activity_feed, name='feed'),
+    path('v1/moderation/<str:kind>/', moderate, name='moderation'),
 ]
@@ -1,34 +1,72 @@
-from django.db.models import Avg
+import json
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET
 from django_filters.rest_framework import DjangoFilterBackend
 from django.contrib.auth.tokens import default_token_generator
-from rest_framework import status, viewsets, filters
-from rest_framework.decorators import action, api_view, permission_classes
-from rest_framework.filters import SearchFilter
+from rest_framework import filters, mixins, status, viewsets
+from rest_framework.exceptions import (NotFound, PermissionDenied,
+                                       ValidationError)
+from rest_framework.decorators import (action, api_view,
+                                       authentication_classes,
+                                       permission_classes)
+from rest_framework.filters import OrderingFilter, SearchFilter
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from rest_framework_simplejwt.tokens import AccessToken
 
-from reviews.models import Category, Genre, Review, Title
+from reviews import (autocomplete, changes, events, facets, feed,
+                     histograms, leaderboards, moderation, recommendations)
+from reviews.models import (Category, Comment, DeletionJob, Genre,
+                            Leaderboard, LeaderboardEntry, Review,
+                            SimilarTitle, Title)
 from users.models import User
+from users.revocation import revoke_token, revoke_user
 from users.utils import sent_email_with_confirmation_code
 
-from .mixins import ModelMixinSet
+from .includes import attach_comments, attach_reviews
+from .middleware import streaming_view
+from .mixins import (BackgroundDestroyMixin, IncludeMixin, ModelMixinSet,
+                     MultiGetMixin, RequestBudgetMixin)
+from .pagination import (ActivityPagination, LeaderboardPagination,
+                         SequencePagination)
 from .permissions import (IsAdminUserOrReadOnly,
-                          IsAdmin,
+                          IsAdmin, IsModerator,
                           AdminModeratorAuthorPermission)
-from .serializers import (CategorySerializer,
-                          CommentSerializer, GenreSerializer,
+from .serializers import (CategorySerializer, ChangeSerializer,
+                          CommentSerializer, DeletionJobSerializer,
+                          GenreSerializer, ModerationSerializer,
                           ReviewSerializer,
                           AdminOrSuperAdminUserSerializer,
                           SignUpSerializer, TitleReadSerializer,
                           TitleWriteSerializer, TokenSerializer,
+                          UserCommentSerializer, UserReviewSerializer,
                           UserSerializer,
                           MeSerializer)
 from .filters import TitleFilter
 
 
-class CategoryViewSet(ModelMixinSet):
+def query_limit(request, default, maximum):
+    """Размер страницы из ?limit= в пределах maximum."""
+    try:
+        limit = int(request.query_params.get('limit', default))
+    except ValueError:
+        return default
+    return max(min(limit, maximum), 0)
+
+
+def ordered_titles(queryset, title_ids):
+    """Произведения по списку id в порядке этого списка."""
+    titles = queryset.in_bulk(title_ids)
+    return [titles[pk] for pk in title_ids if pk in titles]
+
+
+class CategoryViewSet(RequestBudgetMixin, BackgroundDestroyMixin,
+                      ModelMixinSet):
     """
     Получить список всех категорий. Права доступа: Доступно без токена
     """
@@ -40,7 +78,8 @@ class CategoryViewSet(ModelMixinSet):
     lookup_field = 'slug'
 
 
-class GenreViewSet(ModelMixinSet):
+class GenreViewSet(RequestBudgetMixin, BackgroundDestroyMixin,
+                   ModelMixinSet):
     """
     Получить список всех жанров. Права доступа: Доступно без токена
     """
@@ -52,24 +91,111 @@ class GenreViewSet(ModelMixinSet):
     lookup_field = 'slug'
 
 
-class TitleViewSet(viewsets.ModelViewSet):
+class TitleViewSet(RequestBudgetMixin, BackgroundDestroyMixin, IncludeMixin,
+                   MultiGetMixin, viewsets.ModelViewSet):
     """
     Получить список всех объектов. Права доступа: Доступно без токена
     """
-    queryset = Title.objects.annotate(
-        rating=Avg('reviews__score')
-    ).all()
+    queryset = Title.objects.select_related(
+        'category'
+    ).prefetch_related('genre')
     permission_classes = (IsAdminUserOrReadOnly,)
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (DjangoFilterBackend, OrderingFilter)
     filterset_class = TitleFilter
+    ordering_fields = ('rating', 'name', 'year')
+    include_options = ('reviews', 'reviews.comments', 'histogram')
+    # Фильтры по названию и жанру и встраивание отзывов — самые дорогие
+    # запросы каталога: под нагрузкой они отсекаются первыми.
+    statement_timeout = 1500
+    max_in_flight = 100
+    max_limit = 50
+
+    def get_includes(self):
+        """Распределение оценок на странице произведения (и в пакетном
+        чтении) есть всегда"""
+        includes = super().get_includes()
+        if self.action in ('retrieve', 'batch'):
+            includes.add('histogram')
+        return includes
+
+    def load_includes(self, titles, includes):
+        if 'reviews' in includes or 'reviews.comments' in includes:
+            attach_reviews(
+                titles, with_comments='reviews.comments' in includes
+            )
+        if 'histogram' in includes:
+            histograms.attach(titles)
 
     def get_serializer_class(self):
-        if self.action in ('list', 'retrieve'):
+        if self.action in (
+            'list', 'retrieve', 'batch', 'top', 'trending', 'similar'
+        ):
             return TitleReadSerializer
         return TitleWriteSerializer
 
+    def leaderboard_response(self, slug):
+        """Страница предрасчитанного рейтинга в порядке мест."""
+        self.leaderboard = Leaderboard.objects.filter(slug=slug).first()
+        entries = LeaderboardEntry.objects.none()
+        if self.leaderboard is not None:
+            entries = self.leaderboard.entries.order_by(
+                '-value', 'title_id'
+            ).values_list('title_id', flat=True)
+        serializer = self.get_serializer(
+            self.get_titles(self.paginate_queryset(entries)), many=True
+        )
+        return self.get_paginated_response(serializer.data)
+
+    def list(self, request, *args, **kwargs):
+        """?facets=true добавляет к списку счётчики по жанрам,
+        категориям и десятилетиям с учётом текущих фильтров"""
+        response = super().list(request, *args, **kwargs)
+        if request.query_params.get('facets') in ('true', '1'):
+            filters = {
+                name: value for name, value in request.query_params.items()
+                if name in self.filterset_class.base_filters
+            }
+            response.data['facets'] = facets.cached_title_facets(
+                self.filter_queryset(self.get_queryset()), filters
+            )
+        return response
+
+    def get_titles(self, title_ids):
+        return ordered_titles(self.get_queryset(), title_ids)
+
+    @action(detail=False, pagination_class=LeaderboardPagination)
+    def top(self, request):
+        """Лучшие произведения, в том числе по ?genre= или ?category="""
+        slug = leaderboards.TOP
+        if request.query_params.get('genre'):
+            slug = leaderboards.genre_board(request.query_params['genre'])
+        elif request.query_params.get('category'):
+            slug = leaderboards.category_board(
+                request.query_params['category']
+            )
+        return self.leaderboard_response(slug)
+
+    @action(detail=False, pagination_class=LeaderboardPagination)
+    def trending(self, request):
+        """Популярные на этой неделе произведения"""
+        return self.leaderboard_response(leaderboards.TRENDING)
+
+    @action(detail=True)
+    def similar(self, request, pk=None):
+        """Похожие произведения по оценкам общих рецензентов"""
+        similar_ids = list(SimilarTitle.objects.filter(
+            title_id=pk
+        ).order_by('-score').values_list('similar_id', flat=True))
+        if not similar_ids:
+            get_object_or_404(Title, pk=pk)
+        serializer = self.get_serializer(
+            self.get_titles(similar_ids), many=True
+        )
+        return Response(serializer.data)
 
-class UserViewSet(viewsets.ModelViewSet):
+
+class UserViewSet(RequestBudgetMixin, BackgroundDestroyMixin, MultiGetMixin,
+                  viewsets.ModelViewSet):
     """Класс для работы с пользователем(ми)"""
     http_method_names = ['get', 'post', 'patch', 'delete']
     queryset = User.objects.all()
@@ -107,6 +233,65 @@ class UserViewSet(viewsets.ModelViewSet):
             serializer.save()
             return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(methods=['get'],
+            detail=False,
+            url_path='me/recommendations',
+            permission_classes=[IsAuthenticated, ],
+            )
+    def recommendations(self, request):
+        """Произведения, которые могут понравиться пользователю"""
+        title_ids = recommendations.recommend(
+            request.user, settings.RECOMMENDATIONS_COUNT
+        )
+        serializer = TitleReadSerializer(
+            ordered_titles(TitleViewSet.queryset.all(), title_ids),
+            many=True,
+            context=self.get_serializer_context()
+        )
+        return Response(serializer.data)
+
+    @action(methods=['post'],
+            detail=True,
+            url_path='revoke-tokens',
+            )
+    def revoke_tokens(self, request, username=None):
+        """Отзыв всех выданных пользователю токенов"""
+        revoke_user(self.get_object().pk)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def activity_response(self, queryset, serializer_class):
+        page = self.paginate_queryset(queryset)
+        serializer = serializer_class(
+            page, many=True, context=self.get_serializer_context()
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True,
+            pagination_class=ActivityPagination,
+            permission_classes=[IsModerator, ],
+            )
+    def reviews(self, request, username=None):
+        """Отзывы пользователя, новые сначала"""
+        return self.activity_response(
+            Review.objects.alive().filter(
+                author=self.get_object()
+            ).select_related('author'),
+            UserReviewSerializer
+        )
+
+    @action(detail=True,
+            pagination_class=ActivityPagination,
+            permission_classes=[IsModerator, ],
+            )
+    def comments(self, request, username=None):
+        """Комментарии пользователя, новые сначала"""
+        return self.activity_response(
+            Comment.objects.alive().filter(
+                author=self.get_object()
+            ).select_related('author', 'review'),
+            UserCommentSerializer
+        )
+
 
 @api_view(['POST'])
 @permission_classes([AllowAny, ])
@@ -152,14 +337,195 @@ def get_token(request):
         status=status.HTTP_200_OK)
 
 
-class ReviewViewSet(viewsets.ModelViewSet):
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, ])
+def revoke(request):
+    """Отзыв токена, с которым пришёл запрос (выход)"""
+    revoke_token(request.auth)
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny, ])
+def suggest(request):
+    """Подсказки названий по началу слова из индекса в памяти,
+    без запросов к базе."""
+    limit = query_limit(
+        request, settings.AUTOCOMPLETE_LIMIT, settings.AUTOCOMPLETE_MAX_LIMIT
+    )
+    entries = autocomplete.index.search(
+        request.query_params.get('q', ''), limit
+    )
+    return Response([
+        {
+            'type': entry.kind,
+            'id': entry.pk,
+            'slug': entry.slug,
+            'name': entry.name
+        }
+        for entry in entries
+    ])
+
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny, ])
+def activity_feed(request):
+    """Последние отзывы и комментарии по всему сайту, новые сначала.
+    Следующая страница — по ссылке next (?before=)."""
+    limit = query_limit(
+        request, settings.REST_FRAMEWORK['PAGE_SIZE'], settings.FEED_MAX_LIMIT
+    )
+    before = request.query_params.get('before')
+    if before is not None:
+        before = feed.parse_cursor(before)
+        if before is None:
+            raise ValidationError({'before': 'Неверный курсор'})
+    items = feed.page(before, limit)
+    next_url = None
+    if items and len(items) == limit:
+        next_url = replace_query_param(
+            request.build_absolute_uri(), 'before', feed.cursor(items[-1])
+        )
+    return Response({
+        'next': next_url,
+        'results': [
+            {key: value for key, value in item.items() if key != 'seq'}
+            for item in items
+        ],
+    })
+
+
+def event_message(seq, item):
+    data = json.dumps(item, ensure_ascii=False)
+    return f'id: {seq}\nevent: {item["type"]}\ndata: {data}\n\n'
+
+
+def event_stream(channel, last_seq):
+    """Пропущенные после last_seq события из журнала, затем новые по мере
+    появления. Подписка оформляется до чтения журнала, поэтому события,
+    опубликованные между ними, не теряются, а повторы отбрасываются по
+    номеру."""
+    subscription = events.broker.subscribe(channel)
+    try:
+        if last_seq is not None:
+            for seq, item in events.backlog(channel, last_seq):
+                last_seq = seq
+                yield event_message(seq, item)
+        connection.close()
+        while not subscription.overflowed:
+            event = subscription.get(settings.EVENTS_KEEPALIVE_SECONDS)
+            if event is None:
+                yield ': keepalive\n\n'
+            elif last_seq is None or event[0] > last_seq:
+                last_seq = event[0]
+                yield event_message(*event)
+    finally:
+        events.broker.unsubscribe(subscription)
+
+
+def events_response(request, channel):
+    """Поток SSE. Id события — номер записи журнала изменений. Клиент,
+    передавший Last-Event-ID (или ?last_event_id=), сначала получает всё
+    опубликованное после этого номера."""
+    last_seq = request.META.get(
+        'HTTP_LAST_EVENT_ID', request.GET.get('last_event_id')
+    )
+    if last_seq is not None:
+        try:
+            last_seq = int(last_seq)
+        except ValueError:
+            return HttpResponseBadRequest('Неверный Last-Event-ID')
+    response = StreamingHttpResponse(
+        event_stream(channel, last_seq),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@streaming_view
+@require_GET
+@transaction.non_atomic_requests
+def review_events(request, title_id):
+    """Новые отзывы на произведение, поток SSE"""
+    get_object_or_404(Title, pk=title_id)
+    return events_response(request, events.title_channel(title_id))
+
+
+@streaming_view
+@require_GET
+@transaction.non_atomic_requests
+def comment_events(request, title_id, review_id):
+    """Новые комментарии к отзыву, поток SSE"""
+    get_object_or_404(
+        Review.objects.alive(), pk=review_id, title_id=title_id
+    )
+    return events_response(request, events.review_channel(review_id))
+
+
+@transaction.non_atomic_requests
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, ])
+def moderate(request, kind):
+    """Массовое удаление, скрытие и возврат отзывов (kind=reviews) или
+    комментариев (kind=comments). Каждая пачка записей обрабатывается в
+    своей транзакции. Права доступа: модератор или администратор; автор
+    может удалять свои записи"""
+    model = moderation.KINDS.get(kind)
+    if model is None:
+        raise NotFound()
+    serializer = ModerationSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+    queryset = moderation.select(model, **data)
+    user = request.user
+    if not (user.is_moderator or user.is_admin) and (
+        data['action'] != moderation.DELETE
+        # Права проверяются для всей выборки одним запросом.
+        or queryset.exclude(author=user).exists()
+    ):
+        raise PermissionDenied()
+    return Response(moderation.Moderation(queryset, data['action']).run())
+
+
+class ChangeViewSet(RequestBudgetMixin, viewsets.GenericViewSet,
+                    mixins.ListModelMixin):
+    """Журнал изменений каталога по возрастанию номера. Клиент хранит
+    last_seq и запрашивает ?since=last_seq. Права доступа: Доступно без
+    токена"""
+    serializer_class = ChangeSerializer
+    pagination_class = SequencePagination
+    # Клиенты синхронизации забирают журнал большими пачками.
+    statement_timeout = 5000
+    max_limit = settings.CHANGES_MAX_LIMIT
+
+    def get_queryset(self):
+        return changes.published()
+
+
+class DeletionJobViewSet(RequestBudgetMixin, viewsets.ReadOnlyModelViewSet):
+    """Ход фоновых удалений. Права доступа: администратор"""
+    queryset = DeletionJob.objects.order_by('-pk')
+    serializer_class = DeletionJobSerializer
+    permission_classes = (IsAdmin,)
+
+
+class ReviewViewSet(RequestBudgetMixin, IncludeMixin, viewsets.ModelViewSet):
     serializer_class = ReviewSerializer
     permission_classes = [AdminModeratorAuthorPermission]
+    include_options = ('comments',)
+    max_limit = 50
+
+    def load_includes(self, reviews, includes):
+        attach_comments(reviews)
 
     def get_queryset(self):
         title = get_object_or_404(Title,
                                   pk=self.kwargs.get('title_id'))
-        return title.reviews.all()
+        return title.reviews.alive()
 
     def perform_create(self, serializer):
         title_id = self.kwargs.get('title_id')
@@ -167,17 +533,30 @@ class ReviewViewSet(viewsets.ModelViewSet):
         serializer.save(author=self.request.user, title=title)
 
 
-class CommentViewSet(viewsets.ModelViewSet):
+class ReviewLookupViewSet(RequestBudgetMixin, IncludeMixin, MultiGetMixin,
+                          viewsets.GenericViewSet):
+    """Пакетное чтение отзывов разных произведений: /reviews/batch/?ids=.
+    Права доступа: Доступно без токена"""
+    queryset = Review.objects.alive().select_related('author')
+    serializer_class = ReviewSerializer
+    permission_classes = [AdminModeratorAuthorPermission]
+    include_options = ('comments',)
+
+    def load_includes(self, reviews, includes):
+        attach_comments(reviews)
+
+
+class CommentViewSet(RequestBudgetMixin, viewsets.ModelViewSet):
     serializer_class = CommentSerializer
     permission_classes = [AdminModeratorAuthorPermission]
 
     def get_queryset(self):
-        review = get_object_or_404(Review,
+        review = get_object_or_404(Review.objects.alive(),
                                    pk=self.kwargs.get('review_id'))
-        return review.comments.all()
+        return review.comments.alive()
 
     def perform_create(self, serializer):
         review = get_object_or_404(
-            Review,
+            Review.objects.alive(),
             id=self.kwargs.get('review_id'))
         serializer.save(author=self.request.user, review=review)
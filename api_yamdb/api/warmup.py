@@ -0,0 +1,205 @@
+"""Прогрев кэшей после выкладки.
+
+Во время работы AccessStatsMiddleware считает успешные GET-запросы к
+каталогу (произведения, отзывы, жанры, категории) в памяти процесса и
+раз в ACCESS_STATS_FLUSH_SECONDS дописывает счётчики в AccessStat в
+фоновом потоке. После перезапуска warm_cache (или сам воркер при
+WARM_CACHE_ON_BOOT) запрашивает самые частые адреса прошлого запуска,
+списки жанров и категорий и первые страницы каталога. Запросы идут
+через обработчик Django в ограниченном пуле потоков: прогреваются буфер
+базы и общие кэши (фасеты, лента), а при прогреве на старте — и кэши
+самого воркера.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import F
+from django.test import Client
+from django.utils import timezone
+
+from reviews.models import AccessStat, Category, Genre, Title
+
+logger = logging.getLogger(__name__)
+
+PREFIX = '/api/v1/'
+SECTIONS = ('titles/', 'genres/', 'categories/')
+WARMUP_HEADER = 'HTTP_X_WARMUP'
+BASE_PATHS = (
+    '/api/v1/categories/',
+    '/api/v1/genres/',
+    '/api/v1/titles/',
+    '/api/v1/titles/top/',
+    '/api/v1/titles/trending/',
+)
+
+
+def request_key(request):
+    """Адрес с отсортированными параметрами или None, если запрос не к
+    каталогу."""
+    path = request.path
+    if (
+        not path.startswith(PREFIX)
+        or not path[len(PREFIX):].startswith(SECTIONS)
+        or path.endswith('/events/')
+    ):
+        return None
+    query = urlencode(sorted(request.GET.items()))
+    key = f'{path}?{query}' if query else path
+    return key if len(key) <= AccessStat._meta.get_field(
+        'path'
+    ).max_length else None
+
+
+class AccessStats:
+    """Счётчики запросов процесса до записи в базу."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.lock = threading.Lock()
+        self.flushed_at = time.monotonic()
+
+    def hit(self, key):
+        with self.lock:
+            if (
+                key in self.counts
+                or len(self.counts) < settings.ACCESS_STATS_MAX_PATHS
+            ):
+                self.counts[key] += 1
+            due = (
+                time.monotonic() - self.flushed_at
+                >= settings.ACCESS_STATS_FLUSH_SECONDS
+            )
+            if not due or not self.counts:
+                return
+            counts, self.counts = self.counts, Counter()
+            self.flushed_at = time.monotonic()
+        thread = threading.Thread(target=flush_in_thread, args=(counts,))
+        thread.daemon = True
+        thread.start()
+
+
+stats = AccessStats()
+
+
+def flush(counts):
+    now = timezone.now()
+    for path, hits in counts.items():
+        rows = AccessStat.objects.filter(path=path)
+        if rows.update(hits=F('hits') + hits, last_seen=now):
+            continue
+        try:
+            with transaction.atomic():
+                AccessStat.objects.create(
+                    path=path, hits=hits, last_seen=now
+                )
+        except IntegrityError:
+            rows.update(hits=F('hits') + hits, last_seen=now)
+
+
+def flush_in_thread(counts):
+    try:
+        flush(counts)
+    except DatabaseError:
+        logger.exception('Статистика запросов не записана')
+    finally:
+        connection.close()
+
+
+def hot_paths(limit):
+    """Самые частые адреса за последние WARM_CACHE_STATS_DAYS дней.
+    Более старая статистика удаляется."""
+    since = timezone.now() - timedelta(days=settings.WARM_CACHE_STATS_DAYS)
+    AccessStat.objects.filter(last_seen__lt=since).delete()
+    return list(AccessStat.objects.order_by('-hits').values_list(
+        'path', flat=True
+    )[:limit])
+
+
+def fallback_paths(limit):
+    """Адреса на случай, когда статистики ещё нет: каталог по
+    категориям и жанрам и страницы произведений с наибольшим числом
+    отзывов."""
+    paths = [
+        f'{PREFIX}titles/?category={slug}'
+        for slug in Category.objects.values_list('slug', flat=True)[:limit]
+    ]
+    paths += [
+        f'{PREFIX}titles/?genre={slug}'
+        for slug in Genre.objects.values_list('slug', flat=True)[:limit]
+    ]
+    paths += [
+        f'{PREFIX}titles/{pk}/'
+        for pk in Title.objects.order_by('-reviews_count').values_list(
+            'pk', flat=True
+        )[:limit]
+    ]
+    return paths
+
+
+def paths(limit):
+    """Адреса для прогрева: общие списки, затем частые по статистике,
+    затем запасные — всего не больше limit сверх общих."""
+    hot = hot_paths(limit)
+    chosen = dict.fromkeys(BASE_PATHS)
+    for path in hot + fallback_paths(limit):
+        if len(chosen) >= len(BASE_PATHS) + limit:
+            break
+        chosen.setdefault(path)
+    return list(chosen)
+
+
+def fetch(path):
+    """Код ответа и время запроса в секундах."""
+    host = next(
+        (host for host in settings.ALLOWED_HOSTS if host != '*'),
+        'localhost'
+    )
+    client = Client(HTTP_HOST=host, **{WARMUP_HEADER: '1'})
+    started = time.perf_counter()
+    try:
+        status_code = client.get(path).status_code
+    finally:
+        connection.close()
+    return status_code, time.perf_counter() - started
+
+
+def warm(paths, workers):
+    """Запрашивает адреса в пуле из workers потоков. Возвращает список
+    (адрес, код ответа, время)."""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(fetch, paths)
+        return [
+            (path, status_code, elapsed)
+            for path, (status_code, elapsed) in zip(paths, results)
+        ]
+
+
+def warm_in_thread():
+    try:
+        started = time.perf_counter()
+        results = warm(
+            paths(settings.WARM_CACHE_PATHS), settings.WARM_CACHE_WORKERS
+        )
+        logger.info(
+            'Прогрето адресов: %s за %.1f с',
+            len(results), time.perf_counter() - started
+        )
+    except DatabaseError:
+        logger.exception('Прогрев кэшей не выполнен')
+    finally:
+        connection.close()
+
+
+def start():
+    """Прогрев в фоне, чтобы не задерживать запуск воркера."""
+    thread = threading.Thread(target=warm_in_thread)
+    thread.daemon = True
+    thread.start()
+    return thread
@@ -0,0 +1,60 @@
+"""
+ASGI config for YaMDb project.
+
+Django 2.2 не умеет обрабатывать запросы асинхронно, поэтому приложение
+WSGI оборачивается asgiref: сервер ASGI (uvicorn) держит соединения в
+цикле событий, а каждый запрос — чтение произведений, отзывов и
+комментариев, получение токена и остальные — выполняется в пуле из
+ASGI_THREADS потоков. Обёртка asgiref 3.4 сама по себе выполняет все
+запросы воркера в одном потоке (thread_sensitive), поэтому запросы
+отдаются в пул явно. Постоянные соединения с базой (CONN_MAX_AGE)
+принадлежат потоку пула и в нём переиспользуются. Поток SSE занимает
+поток пула на всё время подключения, поэтому их лучше обслуживать
+воркерами gevent (см. gunicorn.conf.py).
+
+Запуск:
+    GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker \\
+        gunicorn api_yamdb.asgi:application --config gunicorn.conf.py
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+
+from .wsgi import application as wsgi_application
+
+ASGI_THREADS = int(os.getenv('ASGI_THREADS', 32))
+executor = ThreadPoolExecutor(
+    max_workers=ASGI_THREADS, thread_name_prefix='asgi'
+)
+
+
+class PooledWsgiToAsgiInstance(WsgiToAsgiInstance):
+    run_wsgi_app = sync_to_async(
+        WsgiToAsgiInstance.__dict__['run_wsgi_app'].func,
+        thread_sensitive=False, executor=executor
+    )
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi, которая выполняет запросы в пуле executor, а не в
+    одном потоке."""
+
+    async def __call__(self, scope, receive, send):
+        await PooledWsgiToAsgiInstance(self.wsgi_application)(
+            scope, receive, send
+        )
+
+
+def closing_application(environ, start_response):
+    """asgiref не вызывает close() у ответа, а Django по нему отправляет
+    request_finished и закрывает или возвращает соединения с базой."""
+    response = wsgi_application(environ, start_response)
+    try:
+        yield from response
+    finally:
+        response.close()
+
+
+application = PooledWsgiToAsgi(closing_application)
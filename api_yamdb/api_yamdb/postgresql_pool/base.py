@@ -0,0 +1,197 @@
+"""Бэкенд PostgreSQL с пулом соединений внутри процесса.
+
+Включается переменной окружения DB_ENGINE=api_yamdb.postgresql_pool.
+Нужен воркерам, у которых запрос выполняет новый поток или гринлет
+(gevent): постоянные соединения Django (CONN_MAX_AGE) живут в локальном
+хранилище потока и с такими воркерами не переиспользуются.
+
+Соединение берётся из пула при первом запросе к базе и возвращается в
+конце запроса (или при connection.close()). Пул держит не больше
+DB_POOL_SIZE соединений; если все заняты, ждёт свободное не дольше
+DB_POOL_TIMEOUT секунд. Перед выдачей соединение проверяется: закрытое
+или старше DB_POOL_MAX_AGE секунд заменяется новым, а простоявшее
+дольше DB_POOL_PING_SECONDS — проверяется запросом SELECT 1. Время
+ожидания копится в stats.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db.backends.postgresql import base
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+Database = base.Database
+
+logger = logging.getLogger(__name__)
+
+
+class Pool:
+
+    def __init__(self, size, timeout, ping_seconds, max_age):
+        self.size = size
+        self.timeout = timeout
+        self.ping_seconds = ping_seconds
+        self.max_age = max_age
+        self.idle = []
+        self.born = {}
+        self.opened = 0
+        self.condition = threading.Condition()
+        self.stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'replaced': 0,
+            'wait_seconds': 0.0,
+            'max_wait_seconds': 0.0,
+        }
+
+    def snapshot(self):
+        with self.condition:
+            return dict(
+                self.stats, opened=self.opened, idle=len(self.idle)
+            )
+
+    def take(self):
+        """Свободное соединение с временем возврата или (None, None),
+        если можно открыть новое. Ждёт, пока пул заполнен."""
+        started = time.monotonic()
+        with self.condition:
+            waited = False
+            while not self.idle and self.opened >= self.size:
+                remaining = started + self.timeout - time.monotonic()
+                if remaining <= 0:
+                    self.stats['timeouts'] += 1
+                    raise Database.OperationalError(
+                        f'Нет свободных соединений в пуле за '
+                        f'{self.timeout} с (размер пула {self.size})'
+                    )
+                waited = True
+                self.condition.wait(remaining)
+            wait = time.monotonic() - started if waited else 0.0
+            self.stats['checkouts'] += 1
+            self.stats['waits'] += waited
+            self.stats['wait_seconds'] += wait
+            self.stats['max_wait_seconds'] = max(
+                self.stats['max_wait_seconds'], wait
+            )
+            if self.idle:
+                connection, returned = self.idle.pop()
+            else:
+                self.opened += 1
+                connection, returned = None, None
+        if waited:
+            logger.warning('Ожидание соединения из пула %.3f с', wait)
+        return connection, returned
+
+    def healthy(self, connection, returned):
+        if connection.closed:
+            return False
+        if time.monotonic() - self.born[connection] > self.max_age:
+            return False
+        if time.monotonic() - returned < self.ping_seconds:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if connection.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except Database.Error:
+            return False
+        return True
+
+    def checkout(self, connect):
+        """Проверенное соединение из пула или новое от connect()."""
+        connection, returned = self.take()
+        if connection is not None:
+            if self.healthy(connection, returned):
+                return connection
+            self.stats['replaced'] += 1
+            self.drop(connection, release=False)
+        try:
+            connection = connect()
+        except Exception:
+            self.release()
+            raise
+        self.born[connection] = time.monotonic()
+        return connection
+
+    def checkin(self, connection):
+        """Возвращает соединение в пул. Незавершённая транзакция
+        откатывается, сломанное соединение закрывается."""
+        try:
+            if connection.closed:
+                raise Database.InterfaceError('connection already closed')
+            if connection.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except Database.Error:
+            self.drop(connection)
+            return
+        with self.condition:
+            self.idle.append((connection, time.monotonic()))
+            self.condition.notify()
+
+    def drop(self, connection, release=True):
+        self.born.pop(connection, None)
+        try:
+            connection.close()
+        except Database.Error:
+            pass
+        if release:
+            self.release()
+
+    def release(self):
+        with self.condition:
+            self.opened -= 1
+            self.condition.notify()
+
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+def get_pool(key):
+    if key not in pools:
+        with pools_lock:
+            if key not in pools:
+                pools[key] = Pool(
+                    settings.DB_POOL_SIZE,
+                    settings.DB_POOL_TIMEOUT,
+                    settings.DB_POOL_PING_SECONDS,
+                    settings.DB_POOL_MAX_AGE,
+                )
+    return pools[key]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    @property
+    def pool(self):
+        # Пул своей базы: тесты переключают соединение на другую базу
+        # (тестовую, копию снимка), и соединения прежней не подходят.
+        return get_pool((self.alias, self.settings_dict['NAME']))
+
+    def get_new_connection(self, conn_params):
+        def connect():
+            return super(DatabaseWrapper, self).get_new_connection(
+                conn_params
+            )
+
+        connection = self.pool.checkout(connect)
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level
+        )
+        return connection
+
+    def pool_stats(self):
+        return self.pool.snapshot()
+
+    def connect(self):
+        super().connect()
+        # Соединение возвращается в пул в конце каждого запроса,
+        # независимо от CONN_MAX_AGE.
+        self.close_at = time.monotonic()
+
+    def _close(self):
+        if self.connection is not None:
+            self.pool.checkin(self.connection)
@@ -26,7 +26,7 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'rest_framework_simplejwt',
     'django_filters',
-    'reviews',
+    'reviews.apps.ReviewsConfig',
     'api',
 ]
 
@@ -38,6 +38,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.AccessStatsMiddleware',
+    'api.middleware.RequestBudgetMiddleware',
 ]
 
 ROOT_URLCONF = 'api_yamdb.urls'
@@ -71,7 +73,13 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        # Журнал изменений пишется в той же транзакции, что и изменение
+        'ATOMIC_REQUESTS': True,
+        # Сколько секунд соединение живёт между запросами (0 — закрывать
+        # после каждого запроса). С бэкендом api_yamdb.postgresql_pool
+        # соединения переиспользует пул, и значение не учитывается.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default='60')),
     }
 }
 # Password validation
@@ -127,12 +135,12 @@ DEFAULT_FROM_EMAIL = 'szeman@yandex.ru'
 # Настройки DRF
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.RevocableJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.CappedLimitOffsetPagination',
     'PAGE_SIZE': 10,
 }
 
@@ -159,12 +167,12 @@ DEFAULT_FROM_EMAIL = 'szeman@yandex.ru'
 # Настройки DRF
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.RevocableJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.CappedLimitOffsetPagination',
     'PAGE_SIZE': 10,
 }
 
@@ -176,3 +184,139 @@ SIMPLE_JWT = {
 
 
 AUTH_USER_MODEL = 'users.User'
+
+# Сколько связанных объектов встраивается на родителя по ?include=
+INCLUDE_RELATED_LIMIT = 5
+
+# Рейтинг популярных произведений: окно и период полураспада веса отзыва
+TRENDING_WINDOW_DAYS = 7
+TRENDING_HALF_LIFE_HOURS = 48
+
+# Сколько похожих произведений хранить для каждого произведения
+SIMILAR_TITLES_COUNT = 10
+
+# Персональные рекомендации: каталог с обученной моделью и длина списка
+RECOMMENDATIONS_DIR = os.path.join(BASE_DIR, 'recommendations')
+RECOMMENDATIONS_COUNT = 10
+
+# Стратегия рейтинга произведений: mean, bayesian или wilson.
+# Вес априорной оценки для bayesian — квантиль числа оценок у произведений
+RATING_STRATEGY = os.getenv('RATING_STRATEGY', default='bayesian')
+RATING_PRIOR_QUANTILE = 0.5
+
+# Кэш. По умолчанию в памяти процесса; для нескольких воркеров gunicorn
+# задайте общий backend, например файловый или memcached.
+# shared — кэш, общий для всех воркеров (reviews.caches): лента и версия
+# индекса подсказок. В docker-compose это memcached; в памяти процесса
+# лента читается из базы
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    },
+    'shared': {
+        'BACKEND': os.getenv(
+            'SHARED_CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('SHARED_CACHE_LOCATION', default='shared'),
+    },
+}
+
+# Сколько секунд хранить счётчики фильтров каталога
+FACETS_CACHE_TIMEOUT = 300
+
+# Подсказки названий: как часто воркер сверяет версию индекса с кэшем
+# и как часто перестраивает его целиком (выравнивает популярность)
+AUTOCOMPLETE_CHECK_SECONDS = 1
+AUTOCOMPLETE_REBUILD_SECONDS = 600
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+# Фоновое удаление: сколько записей удалять одной транзакцией и через
+# сколько минут без прогресса задание считается брошенным
+DELETION_CHUNK_SIZE = 500
+DELETION_STALE_MINUTES = 10
+
+# Лента последних отзывов и комментариев: размер кольцевого буфера
+# в кэше и наибольший размер страницы
+FEED_SIZE = 200
+FEED_MAX_LIMIT = 100
+
+# Журнал изменений: наибольшая пачка и возраст записей для сжатия
+CHANGES_MAX_LIMIT = 1000
+CHANGES_COMPACT_AFTER_DAYS = 7
+
+# Потоки SSE новых отзывов и комментариев: длина очереди подписчика,
+# период пустых сообщений для удержания соединения и пауза перед
+# переподключением слушателя LISTEN
+EVENTS_QUEUE_SIZE = 100
+EVENTS_KEEPALIVE_SECONDS = 15
+EVENTS_RECONNECT_SECONDS = 1
+
+# Пул соединений бэкенда api_yamdb.postgresql_pool: наибольшее число
+# соединений в процессе, сколько секунд ждать свободное, после скольких
+# секунд простоя проверять соединение запросом и через сколько секунд
+# открывать его заново
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', default='20'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', default='5'))
+DB_POOL_PING_SECONDS = 10
+DB_POOL_MAX_AGE = 3600
+
+# Бюджет запроса к API по умолчанию (вьюсеты переопределяют его
+# атрибутами): предел времени запроса к базе в миллисекундах, число
+# одновременных запросов в процессе, после которого отвечаем 503,
+# число открытых потоков SSE в процессе (меньше worker_connections в
+# gunicorn.conf.py), наибольший ?limit= и пауза в Retry-After, секунд.
+# Отсечение по числу запросов действует только у воркеров gevent,
+# потоковых и ASGI: синхронный воркер обрабатывает один запрос за раз
+API_STATEMENT_TIMEOUT = 2000
+API_MAX_IN_FLIGHT = 200
+API_MAX_STREAMS = 1500
+API_MAX_LIMIT = 100
+API_RETRY_AFTER = 1
+
+# Сколько писем отправлять одновременно в фоне
+EMAIL_WORKERS = 4
+
+# Статистика запросов для прогрева: как часто записывать счётчики в
+# базу, секунд, и сколько разных адресов считать в процессе
+ACCESS_STATS_FLUSH_SECONDS = 30
+ACCESS_STATS_MAX_PATHS = 1000
+
+# Прогрев кэшей после выкладки (команда warm_cache): сколько частых
+# адресов прогревать, сколько запросов выполнять одновременно, за
+# сколько дней учитывать статистику и прогревать ли при запуске воркера
+WARM_CACHE_PATHS = 50
+WARM_CACHE_WORKERS = 4
+WARM_CACHE_STATS_DAYS = 7
+WARM_CACHE_ON_BOOT = os.getenv('WARM_CACHE_ON_BOOT', default='') == 'true'
+
+# Снимки заполненной базы для тестов (api_yamdb.snapshots): каталог
+# файлов SQLite и команда, которая заполняет базу
+TEST_SNAPSHOT_DIR = os.getenv(
+    'TEST_SNAPSHOT_DIR', default=os.path.join(BASE_DIR, '.snapshots')
+)
+TEST_SNAPSHOT_SEED = os.getenv('TEST_SNAPSHOT_SEED', default='load_csv')
+
+# Массовая модерация отзывов и комментариев: сколько записей
+# обрабатывать одной транзакцией и наибольший список ids в запросе
+MODERATION_CHUNK_SIZE = 500
+MODERATION_MAX_IDS = 10000
+
+# Отзыв JWT (users.revocation): на сколько записей рассчитан фильтр Блума
+# воркера, доля ложноположительных ответов (они проверяются запросом к
+# базе), как часто дочитывать новые отзывы и перестраивать фильтр,
+# секунд, и сколько секунд перечитывать свежие записи
+REVOCATION_CAPACITY = 10000
+REVOCATION_ERROR_RATE = 0.01
+REVOCATION_REFRESH_SECONDS = 5
+REVOCATION_REBUILD_SECONDS = 3600
+REVOCATION_SETTLE_SECONDS = 30
+
+# Пакетное чтение (GET .../batch/?ids=): наибольшее число значений в
+# одном запросе
+MULTI_GET_MAX_IDS = 100
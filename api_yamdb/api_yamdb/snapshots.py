@@ -0,0 +1,279 @@
+"""Снимки заполненной базы для тестов.
+
+Схема и данные (по умолчанию выгрузка static/data командой load_csv)
+собираются один раз и сохраняются снимком: файлом SQLite в
+TEST_SNAPSHOT_DIR или базой-шаблоном PostgreSQL. Тестовая сессия, а при
+параллельном запуске каждый воркер, получает свою копию снимка —
+копированием файла или CREATE DATABASE ... TEMPLATE — вместо создания
+таблиц и загрузки данных через ORM.
+
+Имя снимка содержит ключ — хэш описания схемы, файлов выгрузки и
+команды заполнения: после изменения моделей или данных собирается новый
+снимок, а устаревшие удаляются. Сборку для нескольких воркеров
+сериализует файловая блокировка; снимок собирается под временным именем
+и переименовывается, только когда готов.
+"""
+import fcntl
+import hashlib
+import inspect
+import io
+import os
+import re
+import shutil
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management import (call_command, get_commands,
+                                    load_command_class)
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from reviews import csvsync
+
+PREFIX = 'yamdb_snapshot_'
+SNAPSHOT_NAME = re.compile(rf'^{PREFIX}[0-9a-f]{{32}}$')
+
+
+def schema_description(connection):
+    """Таблицы, столбцы, индексы и ограничения всех моделей."""
+    lines = []
+    models = apps.get_models(include_auto_created=True)
+    for model in sorted(models, key=lambda model: model._meta.db_table):
+        opts = model._meta
+        lines.append(opts.db_table)
+        lines.extend(
+            f'{field.column} {field.db_type(connection)} {field.null} '
+            f'{field.unique} {field.db_index}'
+            for field in opts.local_concrete_fields
+        )
+        lines.extend(
+            repr(item.deconstruct())
+            for item in [*opts.indexes, *opts.constraints]
+        )
+        lines.append(repr((opts.unique_together, opts.index_together)))
+    return '\n'.join(lines)
+
+
+def seed_files():
+    """Файлы, от которых зависят данные снимка: выгрузка CSV и модуль
+    команды заполнения."""
+    command = settings.TEST_SNAPSHOT_SEED
+    data_dir = csvsync.default_path()
+    files = [
+        os.path.join(data_dir, csv_f) for _, csv_f, _ in csvsync.TABLES
+    ]
+    files.append(inspect.getsourcefile(
+        type(load_command_class(get_commands()[command], command))
+    ))
+    return files
+
+
+def snapshot_key(alias=DEFAULT_DB_ALIAS):
+    digest = hashlib.blake2b(digest_size=16)
+    connection = connections[alias]
+    digest.update(connection.vendor.encode())
+    digest.update(settings.TEST_SNAPSHOT_SEED.encode())
+    digest.update(schema_description(connection).encode())
+    for path in seed_files():
+        with open(path, 'rb') as source:
+            digest.update(source.read())
+    return digest.hexdigest()
+
+
+class SQLite:
+    """Снимки — файлы в TEST_SNAPSHOT_DIR."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.directory = settings.TEST_SNAPSHOT_DIR
+
+    def database_name(self, name):
+        return os.path.join(self.directory, f'{name}.sqlite3')
+
+    def names(self):
+        return [
+            file_name[:-len('.sqlite3')]
+            for file_name in os.listdir(self.directory)
+            if file_name.endswith('.sqlite3')
+        ]
+
+    def exists(self, name):
+        return os.path.exists(self.database_name(name))
+
+    def create(self, name):
+        self.drop(name)
+
+    def copy(self, source, target):
+        shutil.copyfile(
+            self.database_name(source), self.database_name(target)
+        )
+
+    def rename(self, source, target):
+        os.replace(self.database_name(source), self.database_name(target))
+
+    def drop(self, name):
+        try:
+            os.remove(self.database_name(name))
+        except FileNotFoundError:
+            pass
+
+
+class PostgreSQL:
+    """Снимки — базы-шаблоны на сервере."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    @contextmanager
+    def cursor(self):
+        # Служебное соединение с базой postgres: создавать и удалять
+        # базы можно только вне транзакции и не изнутри них самих.
+        nodb = self.connection._nodb_connection
+        try:
+            with nodb.cursor() as cursor:
+                yield cursor
+        finally:
+            nodb.close()
+
+    def quote(self, name):
+        return self.connection.ops.quote_name(name)
+
+    def database_name(self, name):
+        return name
+
+    def names(self):
+        with self.cursor() as cursor:
+            cursor.execute(
+                'SELECT datname FROM pg_database WHERE datname LIKE %s',
+                [PREFIX.replace('_', r'\_') + '%']
+            )
+            return [name for name, in cursor.fetchall()]
+
+    def exists(self, name):
+        with self.cursor() as cursor:
+            cursor.execute(
+                'SELECT 1 FROM pg_database WHERE datname = %s', [name]
+            )
+            return cursor.fetchone() is not None
+
+    def create(self, name):
+        with self.cursor() as cursor:
+            cursor.execute(f'DROP DATABASE IF EXISTS {self.quote(name)}')
+            cursor.execute(f'CREATE DATABASE {self.quote(name)}')
+
+    def copy(self, source, target):
+        with self.cursor() as cursor:
+            cursor.execute(f'DROP DATABASE IF EXISTS {self.quote(target)}')
+            cursor.execute(
+                f'CREATE DATABASE {self.quote(target)} '
+                f'TEMPLATE {self.quote(source)}'
+            )
+
+    def rename(self, source, target):
+        with self.cursor() as cursor:
+            cursor.execute(
+                f'ALTER DATABASE {self.quote(source)} '
+                f'RENAME TO {self.quote(target)}'
+            )
+
+    def drop(self, name):
+        with self.cursor() as cursor:
+            cursor.execute(f'DROP DATABASE IF EXISTS {self.quote(name)}')
+
+
+BACKENDS = {'sqlite': SQLite, 'postgresql': PostgreSQL}
+
+
+def storage(alias=DEFAULT_DB_ALIAS):
+    connection = connections[alias]
+    if connection.vendor not in BACKENDS:
+        raise NotImplementedError(
+            f'Снимки не поддерживаются для {connection.vendor}'
+        )
+    return BACKENDS[connection.vendor](connection)
+
+
+def switch(name, alias=DEFAULT_DB_ALIAS):
+    """Направляет соединение alias в базу name."""
+    connection = connections[alias]
+    connection.close()
+    connection.settings_dict['NAME'] = name
+
+
+@contextmanager
+def database(name, alias=DEFAULT_DB_ALIAS):
+    """Временно направляет соединение alias в базу name."""
+    original = connections[alias].settings_dict['NAME']
+    switch(name, alias)
+    try:
+        yield
+    finally:
+        switch(original, alias)
+
+
+@contextmanager
+def build_lock():
+    os.makedirs(settings.TEST_SNAPSHOT_DIR, exist_ok=True)
+    path = os.path.join(settings.TEST_SNAPSHOT_DIR, '.lock')
+    with open(path, 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def seed(alias=DEFAULT_DB_ALIAS):
+    call_command(
+        'migrate', database=alias, run_syncdb=True, interactive=False,
+        verbosity=0
+    )
+    call_command(settings.TEST_SNAPSHOT_SEED, stdout=io.StringIO())
+
+
+def prune(store, keep):
+    """Удаляет снимки с другими ключами. Занятые другим процессом
+    остаются до следующей сборки."""
+    for name in store.names():
+        if SNAPSHOT_NAME.match(name) and name != keep:
+            try:
+                store.drop(name)
+            except DatabaseError:
+                pass
+
+
+def ensure(alias=DEFAULT_DB_ALIAS, rebuild=False):
+    """Имя снимка для текущих схемы и данных; собирает его, если нет."""
+    name = f'{PREFIX}{snapshot_key(alias)}'
+    store = storage(alias)
+    with build_lock():
+        if rebuild or not store.exists(name):
+            building = f'{name}_{os.getpid()}_tmp'
+            store.create(building)
+            try:
+                with database(store.database_name(building), alias):
+                    seed(alias)
+                store.drop(name)
+                store.rename(building, name)
+            except BaseException:
+                store.drop(building)
+                raise
+            prune(store, keep=name)
+    return name
+
+
+def attach(snapshot, suffix, alias=DEFAULT_DB_ALIAS):
+    """Копирует снимок в базу сессии и направляет в неё соединение
+    alias. Возвращает (имя копии, прежнее имя базы) для detach()."""
+    clone = f'{snapshot}_{suffix}'
+    original = connections[alias].settings_dict['NAME']
+    store = storage(alias)
+    store.copy(snapshot, clone)
+    switch(store.database_name(clone), alias)
+    return clone, original
+
+
+def detach(clone, original, alias=DEFAULT_DB_ALIAS):
+    """Возвращает соединению прежнюю базу и удаляет копию снимка."""
+    switch(original, alias)
+    storage(alias).drop(clone)
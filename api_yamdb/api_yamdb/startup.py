@@ -0,0 +1,131 @@
+"""Профиль старта воркера.
+
+Воркер gunicorn при старте выполняет django.setup() — импорт приложений
+INSTALLED_APPS, их моделей и ready() — и при первом запросе импортирует
+URLconf с представлениями, сериализаторами, фильтрами и бэкендами JWT.
+measure() замеряет эти шаги в текущем процессе, поэтому её запускают в
+чистом интерпретаторе: python -X importtime -m api_yamdb.startup
+печатает замеры в JSON, а importtime пишет в stderr время импорта
+каждого модуля. profile() делает это в подпроцессе и сводит оба
+результата.
+"""
+import importlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Модули, которые воркер импортирует до ответа на первый запрос.
+PROFILED_MODULES = (
+    'rest_framework_simplejwt.authentication',
+    'users.authentication',
+    'django_filters.rest_framework',
+    'api.filters',
+    'api.serializers',
+    'api.views',
+    'api_yamdb.urls',
+)
+# Библиотеки, нужные только пакетным пересчётам: при старте их быть не
+# должно (см. reviews.lazy).
+HEAVY_MODULES = ('numpy', 'scipy', 'scipy.sparse')
+
+
+def seconds_since(start):
+    return round(time.perf_counter() - start, 6)
+
+
+def timed(record, stage, method):
+    """method, который записывает время выполнения в record[stage]."""
+    def wrapper():
+        start = time.perf_counter()
+        try:
+            return method()
+        finally:
+            record[stage] = seconds_since(start)
+    return wrapper
+
+
+def measure(modules=PROFILED_MODULES):
+    """Время django.setup(), импорта, моделей и ready() каждого
+    приложения и прироста от импорта modules. Вызывается в процессе, где
+    Django ещё не настроен."""
+    import django
+    from django.apps import AppConfig
+
+    apps = []
+    create = AppConfig.create
+
+    def timed_create(cls, entry):
+        start = time.perf_counter()
+        app_config = create.__func__(cls, entry)
+        record = {'app': app_config.label, 'import': seconds_since(start)}
+        app_config.import_models = timed(
+            record, 'models', app_config.import_models
+        )
+        app_config.ready = timed(record, 'ready', app_config.ready)
+        apps.append(record)
+        return app_config
+
+    AppConfig.create = classmethod(timed_create)
+    try:
+        start = time.perf_counter()
+        django.setup()
+        setup = seconds_since(start)
+    finally:
+        AppConfig.create = create
+    loaded_at_setup = [name for name in HEAVY_MODULES if name in sys.modules]
+    imports = []
+    for name in modules:
+        start = time.perf_counter()
+        importlib.import_module(name)
+        imports.append({'module': name, 'import': seconds_since(start)})
+    return {
+        'setup': setup,
+        'apps': apps,
+        'modules': imports,
+        'heavy_at_setup': loaded_at_setup,
+        'heavy': [name for name in HEAVY_MODULES if name in sys.modules],
+    }
+
+
+def parse_importtime(output):
+    """Собственное время импорта (с) по пакетам верхнего уровня из
+    вывода python -X importtime."""
+    packages = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        own, _, name = line[len('import time:'):].split('|')
+        if not own.strip().isdigit():
+            continue
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(own) / 1e6
+    return packages
+
+
+def profile(settings_module=None):
+    """Замеры measure() в чистом интерпретаторе и время импорта пакетов
+    (importtime['<пакет>'] в секундах)."""
+    from django.conf import settings
+
+    env = dict(os.environ)
+    env['DJANGO_SETTINGS_MODULE'] = (
+        settings_module or os.environ.get('DJANGO_SETTINGS_MODULE')
+        or 'api_yamdb.settings'
+    )
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-m', 'api_yamdb.startup'],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+    )
+    if result.returncode:
+        raise RuntimeError(
+            f'Профиль старта не снят:\n{result.stderr[-2000:]}'
+        )
+    report = json.loads(result.stdout.splitlines()[-1])
+    report['importtime'] = parse_importtime(result.stderr)
+    return report
+
+
+if __name__ == '__main__':
+    print(json.dumps(measure()))
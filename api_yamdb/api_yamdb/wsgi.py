@@ -14,3 +14,20 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api_yamdb.settings')
 
 application = get_wsgi_application()
+
+# Индекс подсказок строится при старте воркера, а не на первом запросе.
+# Если база ещё недоступна, он построится при первом обращении.
+from django.conf import settings  # noqa: E402
+from django.db import DatabaseError  # noqa: E402
+
+from api import warmup  # noqa: E402
+from reviews.autocomplete import index  # noqa: E402
+
+try:
+    index.build()
+except DatabaseError:
+    pass
+
+# Прогрев частых ответов в фоне (см. api/warmup.py).
+if settings.WARM_CACHE_ON_BOOT:
+    warmup.start()
@@ -0,0 +1,18 @@
+import os
+
+# Воркеры gevent: соединение — гринлет, а не поток, поэтому воркер
+# держит тысячи открытых потоков SSE. psycogreen делает запросы
+# psycopg2 кооперативными, чтобы запрос к базе не блокировал воркер.
+# Постоянные соединения Django (CONN_MAX_AGE) привязаны к гринлету и
+# между запросами не переиспользуются — для этого есть пул:
+# DB_ENGINE=api_yamdb.postgresql_pool.
+# Для приложения ASGI (api_yamdb.asgi) задайте
+# GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gevent')
+worker_connections = 2000
+
+
+def post_fork(server, worker):
+    if type(worker).__module__.startswith('gunicorn.workers.ggevent'):
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
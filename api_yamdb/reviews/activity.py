@@ -0,0 +1,88 @@
+"""Счётчики активности пользователей: число отзывов, сумма поставленных
+оценок (для средней) и число комментариев.
+
+Сигналы сдвигают счётчики на разницу одним UPDATE, команда
+recompute_user_activity пересчитывает их с нуля.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from users.models import User
+
+from .models import Comment, Review
+
+
+def apply_review(author_id, count_delta, sum_delta):
+    User.objects.filter(pk=author_id).update(
+        reviews_count=F('reviews_count') + count_delta,
+        score_sum=F('score_sum') + sum_delta
+    )
+
+
+def apply_comment(author_id, count_delta):
+    User.objects.filter(pk=author_id).update(
+        comments_count=F('comments_count') + count_delta
+    )
+
+
+def refresh_users(user_ids):
+    """Пересчитывает счётчики только пользователей user_ids."""
+    with transaction.atomic():
+        # Строки блокируются до подсчёта: сигнал отзыва или комментария,
+        # пришедшего во время пересчёта, дождётся коммита и сдвинет уже
+        # пересчитанный счётчик.
+        users = {
+            pk: User(pk=pk, reviews_count=0, score_sum=0, comments_count=0)
+            for pk in User.all_objects.select_for_update().filter(
+                pk__in=user_ids
+            ).order_by('pk').values_list('pk', flat=True)
+        }
+        reviews = Review.objects.filter(
+            author_id__in=list(users)
+        ).order_by().values('author_id').annotate(
+            count=Count('pk'), total=Sum('score')
+        ).values_list('author_id', 'count', 'total')
+        for author_id, count, total in reviews:
+            users[author_id].reviews_count = count
+            users[author_id].score_sum = total
+        comments = Comment.objects.filter(
+            author_id__in=list(users)
+        ).order_by().values('author_id').annotate(
+            count=Count('pk')
+        ).values_list('author_id', 'count')
+        for author_id, count in comments:
+            users[author_id].comments_count = count
+        User.all_objects.bulk_update(
+            list(users.values()),
+            ['reviews_count', 'score_sum', 'comments_count']
+        )
+
+
+def recompute_all(chunk_size):
+    """Пересчитывает счётчики всех пользователей. Возвращает число
+    пользователей с отзывами или комментариями."""
+    counters = {}
+    reviews = Review.objects.order_by().values('author_id').annotate(
+        count=Count('pk'), total=Sum('score')
+    ).values_list('author_id', 'count', 'total')
+    for author_id, count, total in reviews:
+        counters[author_id] = User(
+            pk=author_id, reviews_count=count, score_sum=total,
+            comments_count=0
+        )
+    comments = Comment.objects.order_by().values('author_id').annotate(
+        count=Count('pk')
+    ).values_list('author_id', 'count')
+    for author_id, count in comments:
+        counters.setdefault(
+            author_id, User(pk=author_id, reviews_count=0, score_sum=0)
+        ).comments_count = count
+    with transaction.atomic():
+        User.all_objects.exclude(pk__in=list(counters)).update(
+            reviews_count=0, score_sum=0, comments_count=0
+        )
+        User.all_objects.bulk_update(
+            list(counters.values()),
+            ['reviews_count', 'score_sum', 'comments_count'],
+            batch_size=chunk_size
+        )
+    return len(counters)
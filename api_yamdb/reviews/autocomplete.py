@@ -0,0 +1,254 @@
+"""Подсказки при вводе названий произведений, жанров и категорий.
+
+Индекс живёт в памяти каждого воркера: отсортированный список ключей
+(нормализованное название и все его хвосты по словам), поиск по префиксу
+— двоичный поиск диапазона. Для коротких префиксов лучшие по
+популярности варианты посчитаны заранее. Популярность произведения —
+число отзывов, жанра и категории — число отзывов на их произведения.
+
+Индекс строится при старте воркера и обновляется сигналами моделей
+после коммита. Смена популярности сдвигает произведение только в
+списках лучших, где оно есть или куда попадает; списки, которые так
+не пересчитать (смена названия, удаление, выпадение из списка), просто
+забываются и считаются заново при первом поиске. Поиск и изменения
+идут под одной блокировкой.
+Изменение названий меняет версию в общем кэше (reviews.caches); воркер,
+заметивший чужую версию, перестраивает индекс из базы. Популярность
+обновляется только локально и выравнивается периодической перестройкой.
+Если общий кэш в памяти процесса, воркеры согласуются только при
+перестройке.
+"""
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+
+from . import caches
+from .models import Category, Genre, Title
+
+VERSION_KEY = 'autocomplete-version'
+SHORT_PREFIX = 3
+TOP_SIZE = 20
+TITLE = 'title'
+GENRE = 'genre'
+CATEGORY = 'category'
+
+Entry = namedtuple('Entry', 'kind pk slug name popularity')
+
+
+def normalize(text):
+    text = text.lower().replace('ё', 'е')
+    return ' '.join(re.sub(r'\W+', ' ', text).split())
+
+
+def entry_keys(entry):
+    words = normalize(entry.name).split()
+    return {' '.join(words[start:]) for start in range(len(words))}
+
+
+def short_prefixes(keys):
+    return {
+        key[:size] for key in keys
+        for size in range(1, min(len(key), SHORT_PREFIX) + 1)
+    }
+
+
+def rank(entry):
+    return -entry.popularity, entry.name
+
+
+def title_entry(title):
+    return Entry(TITLE, title.pk, None, title.name, title.reviews_count)
+
+
+def group_entry(kind, group, popularity=0):
+    return Entry(kind, group.pk, group.slug, group.name, popularity)
+
+
+def load_entries():
+    entries = [
+        Entry(TITLE, pk, None, name, popularity)
+        for pk, name, popularity in Title.objects.values_list(
+            'pk', 'name', 'reviews_count'
+        )
+    ]
+    for kind, model in ((GENRE, Genre), (CATEGORY, Category)):
+        groups = model.objects.annotate(
+            popularity=Coalesce(Sum('titles__reviews_count'), 0)
+        ).values_list('pk', 'slug', 'name', 'popularity')
+        entries.extend(Entry(kind, *group) for group in groups)
+    return entries
+
+
+class PrefixIndex:
+
+    def __init__(self, entries):
+        self.entries = {(entry.kind, entry.pk): entry for entry in entries}
+        self.keys = sorted(
+            (key, kind, pk)
+            for (kind, pk), entry in self.entries.items()
+            for key in entry_keys(entry)
+        )
+        refs = defaultdict(set)
+        for key, kind, pk in self.keys:
+            for prefix in short_prefixes([key]):
+                refs[prefix].add((kind, pk))
+        self.top = {
+            prefix: self._best(found, TOP_SIZE)
+            for prefix, found in refs.items()
+        }
+
+    def _best(self, refs, limit):
+        return heapq.nsmallest(
+            limit, (self.entries[ref] for ref in refs), key=rank
+        )
+
+    def _range(self, prefix):
+        low = bisect_left(self.keys, (prefix,))
+        high = bisect_left(self.keys, (prefix + '\U0010ffff',))
+        return {(kind, pk) for _, kind, pk in self.keys[low:high]}
+
+    def search(self, query, limit):
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        if len(prefix) > SHORT_PREFIX:
+            return self._best(self._range(prefix), limit)
+        best = self.top.get(prefix)
+        if best is None:
+            best = self._best(self._range(prefix), TOP_SIZE)
+            if best:
+                self.top[prefix] = best
+        return best[:limit]
+
+    def _forget(self, keys):
+        for prefix in short_prefixes(keys):
+            self.top.pop(prefix, None)
+
+    def _rerank(self, entry):
+        """Сдвигает entry с новой популярностью в списках лучших."""
+        ref = (entry.kind, entry.pk)
+        for prefix in short_prefixes(entry_keys(entry)):
+            best = self.top.get(prefix)
+            if best is None:
+                continue
+            others = [item for item in best if (item.kind, item.pk) != ref]
+            if len(others) == len(best):
+                # Не в полном списке: попадает, только если лучше
+                # последнего.
+                if rank(entry) < rank(best[-1]):
+                    self.top[prefix] = sorted(
+                        others + [entry], key=rank
+                    )[:TOP_SIZE]
+            elif len(best) == TOP_SIZE and all(
+                rank(item) < rank(entry) for item in others
+            ):
+                # Стал последним в полном списке: его может обойти тот,
+                # кого в списке нет.
+                del self.top[prefix]
+            else:
+                self.top[prefix] = sorted(others + [entry], key=rank)
+
+    def _unlink(self, kind, pk):
+        entry = self.entries.pop((kind, pk), None)
+        if entry is None:
+            return set()
+        keys = entry_keys(entry)
+        for key in keys:
+            del self.keys[bisect_left(self.keys, (key, kind, pk))]
+        return keys
+
+    def remove(self, kind, pk):
+        self._forget(self._unlink(kind, pk))
+
+    def upsert(self, entry):
+        known = self.entries.get((entry.kind, entry.pk))
+        if known is not None and known.name == entry.name:
+            self.entries[(entry.kind, entry.pk)] = entry
+            self._rerank(entry)
+            return
+        keys = self._unlink(entry.kind, entry.pk)
+        self.entries[(entry.kind, entry.pk)] = entry
+        for key in entry_keys(entry):
+            insort(self.keys, (key, entry.kind, entry.pk))
+        self._forget(keys | entry_keys(entry))
+
+
+class SharedIndex:
+    """Индекс воркера и его согласование с остальными воркерами."""
+
+    def __init__(self):
+        self.index = None
+        self.version = None
+        self.built_at = 0
+        self.checked_at = 0
+        self.lock = threading.Lock()
+
+    def build(self):
+        version = caches.shared().get_or_set(VERSION_KEY, 1, None)
+        index = PrefixIndex(load_entries())
+        with self.lock:
+            self.index, self.version = index, version
+            self.built_at = self.checked_at = time.monotonic()
+
+    def current(self):
+        now = time.monotonic()
+        age = now - self.built_at
+        if self.index is None or age > settings.AUTOCOMPLETE_REBUILD_SECONDS:
+            self.build()
+        elif now - self.checked_at > settings.AUTOCOMPLETE_CHECK_SECONDS:
+            self.checked_at = now
+            if caches.shared().get(VERSION_KEY) != self.version:
+                self.build()
+        return self.index
+
+    def search(self, query, limit):
+        index = self.current()
+        with self.lock:
+            return index.search(query, limit)
+
+    def _apply(self, change, shared):
+        if self.index is None:
+            return
+        with self.lock:
+            change(self.index)
+            if not shared:
+                return
+            try:
+                version = caches.shared().incr(VERSION_KEY)
+            except ValueError:
+                version = None
+            if version is not None and version == self.version + 1:
+                self.version = version
+            else:
+                self.built_at = 0
+
+    def upsert(self, entry, shared=True):
+        self._apply(lambda index: index.upsert(entry), shared)
+
+    def upsert_many(self, entries, shared=True):
+        def change(index):
+            for entry in entries:
+                index.upsert(entry)
+        self._apply(change, shared)
+
+    def upsert_group(self, kind, group):
+        """Жанр или категория с прежней популярностью: она меняется
+        только при перестройке."""
+        def change(index):
+            known = index.entries.get((kind, group.pk))
+            popularity = known.popularity if known else 0
+            index.upsert(group_entry(kind, group, popularity))
+        self._apply(change, True)
+
+    def remove(self, kind, pk):
+        self._apply(lambda index: index.remove(kind, pk), True)
+
+
+index = SharedIndex()
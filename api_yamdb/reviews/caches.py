@@ -0,0 +1,39 @@
+"""Кэш, общий для всех воркеров.
+
+Лента и версии, по которым воркеры согласуют свои данные в памяти,
+хранятся в кэше SHARED (в docker-compose — memcached). Без настройки
+это память процесса: у каждого воркера gunicorn свой экземпляр, и
+записи одного воркера другие не видят. Код, которому нужен именно общий
+кэш, проверяет is_shared() и в этом случае обходится без него.
+"""
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+
+SHARED = 'shared'
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def shared():
+    """Кэш SHARED (соединение текущего потока)."""
+    return caches[SHARED]
+
+
+def is_shared():
+    """Видят ли воркеры записи друг друга в кэше SHARED."""
+    return settings.CACHES[SHARED]['BACKEND'] not in PROCESS_LOCAL_BACKENDS
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    if is_shared():
+        return []
+    return [checks.Warning(
+        f'Кэш {SHARED!r} в памяти процесса: лента читается из базы, а '
+        'подсказки воркеров согласуются только при перестройке.',
+        hint='Задайте SHARED_CACHE_BACKEND и SHARED_CACHE_LOCATION.',
+        id='reviews.W001',
+    )]
@@ -0,0 +1,127 @@
+"""Журнал изменений каталога: создание, изменение и удаление
+произведений, жанров, категорий, отзывов и комментариев.
+
+Запись пишется сигналом в той же транзакции, что и само изменение
+(запросы API выполняются в транзакции, ATOMIC_REQUESTS), но без номера.
+Номер seq выдаёт publish() после коммита, в своей короткой транзакции
+под блокировкой единственной строки ChangeSequence. Поэтому номера
+видны клиентам в порядке выдачи: запись с меньшим номером не может
+появиться после записи с большим, и клиент, забравший журнал до
+last_seq, ничего не пропускает. Записи, которые не успели получить
+номер (воркер упал сразу после коммита), нумерует следующий вызов
+publish() — после любой записи в журнал или в compact_changes.
+
+Команда compact_changes удаляет старые записи, которые перекрыты более
+новой записью о том же объекте: клиенту, отставшему больше чем на срок
+хранения, достаточно последнего состояния каждого объекта.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+
+from . import events
+from .models import (Category, Change, ChangeSequence, Comment, Genre,
+                     Review, Title)
+
+MODELS = {
+    Title: 'title',
+    Genre: 'genre',
+    Category: 'category',
+    Review: 'review',
+    Comment: 'comment',
+}
+
+
+def object_key(instance):
+    """Путь объекта в API относительно /api/v1/."""
+    if isinstance(instance, Title):
+        return f'titles/{instance.pk}'
+    if isinstance(instance, Genre):
+        return f'genres/{instance.slug}'
+    if isinstance(instance, Category):
+        return f'categories/{instance.slug}'
+    if isinstance(instance, Review):
+        return f'titles/{instance.title_id}/reviews/{instance.pk}'
+    if Comment.review.is_cached(instance):
+        review = instance.review
+    else:
+        review = Review._base_manager.only('title_id').get(
+            pk=instance.review_id
+        )
+    return (
+        f'titles/{review.title_id}/reviews/{review.pk}'
+        f'/comments/{instance.pk}'
+    )
+
+
+def record(instance, action):
+    Change.objects.create(
+        model=MODELS[type(instance)],
+        object_id=instance.pk,
+        key=object_key(instance),
+        action=action
+    )
+    transaction.on_commit(publish)
+
+
+def record_many(model, pks, action):
+    """Изменения объектов, обновлённых одним запросом без сигналов."""
+    objects = model._base_manager.filter(pk__in=pks)
+    if model is Comment:
+        objects = objects.select_related('review')
+    Change.objects.bulk_create(
+        Change(
+            model=MODELS[model],
+            object_id=instance.pk,
+            key=object_key(instance),
+            action=action
+        )
+        for instance in objects
+    )
+    transaction.on_commit(publish)
+
+
+def publish():
+    """Нумерует закоммиченные записи без номера в порядке id. Возвращает
+    число пронумерованных записей."""
+    with transaction.atomic():
+        sequence, _ = ChangeSequence.objects.select_for_update(
+        ).get_or_create(pk=1)
+        pending = list(Change.objects.filter(
+            seq__isnull=True
+        ).order_by('pk').only('pk'))
+        if not pending:
+            return 0
+        for number, change in enumerate(pending, start=sequence.last + 1):
+            change.seq = number
+        Change.objects.bulk_update(pending, ['seq'], batch_size=1000)
+        sequence.last = pending[-1].seq
+        sequence.save(update_fields=['last'])
+        events.broker.published()
+    return len(pending)
+
+
+def published():
+    """Записи, которые уже получили номер."""
+    return Change.objects.filter(seq__isnull=False)
+
+
+def compact(days, chunk_size):
+    """Удаляет записи старше days дней, перекрытые более новой записью
+    о том же объекте. Возвращает число удалённых записей."""
+    latest = published().filter(
+        model=OuterRef('model'), object_id=OuterRef('object_id')
+    ).order_by('-seq').values('seq')[:1]
+    superseded = published().filter(
+        created_at__lt=timezone.now() - timedelta(days=days)
+    ).annotate(latest=Subquery(latest)).filter(seq__lt=F('latest'))
+    removed = 0
+    while True:
+        pks = list(superseded.values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return removed
+        removed += Change.objects.filter(pk__in=pks)._raw_delete(
+            Change.objects.db
+        )
@@ -0,0 +1,96 @@
+"""Сверка денормализованных счётчиков с данными.
+
+Число и сумма оценок произведения (Title.reviews_count, score_sum) и
+число комментариев к отзыву (Review.comments_count) сигналы сдвигают
+запросами UPDATE с F(). Записи, созданные в обход сигналов (bulk_create
+при загрузке CSV, update() и delete() по запросу, правки в базе), дают
+расхождение, которое исправляет reconcile.
+
+Строки обходятся пачками по первичному ключу. Каждая пачка сверяется в
+своей транзакции: строки счётчиков блокируются (select_for_update) до
+подсчёта, поэтому параллельный сигнал не потеряется между подсчётом и
+записью.
+"""
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from . import ratings
+from .models import Comment, Review, Title
+
+
+def chunks(queryset, chunk_size):
+    """Первичные ключи queryset пачками по возрастанию."""
+    last = 0
+    while True:
+        pks = list(queryset.filter(pk__gt=last).order_by('pk').values_list(
+            'pk', flat=True
+        )[:chunk_size])
+        if not pks:
+            return
+        yield pks
+        last = pks[-1]
+
+
+def reconcile_titles(pks, check_only):
+    """Сверяет число и сумму оценок произведений pks. Возвращает число
+    произведений с расхождением."""
+    # list(): блокировка берётся здесь, до подсчёта, а не при обходе.
+    titles = list(Title.all_objects.select_for_update().filter(
+        pk__in=pks
+    ).order_by('pk').only('reviews_count', 'score_sum', 'rating'))
+    actual = {
+        title_id: (count, total)
+        for title_id, count, total in Review.objects.filter(
+            title_id__in=pks
+        ).order_by().values('title_id').annotate(
+            count=Count('pk'), total=Sum('score')
+        ).values_list('title_id', 'count', 'total')
+    }
+    drifted = []
+    for title in titles:
+        count, total = actual.get(title.pk, (0, 0))
+        if (title.reviews_count, title.score_sum) != (count, total):
+            title.reviews_count, title.score_sum = count, total
+            title.rating = ratings.rate(total, count)
+            drifted.append(title)
+    if drifted and not check_only:
+        Title.all_objects.bulk_update(
+            drifted, ['reviews_count', 'score_sum', 'rating']
+        )
+    return len(drifted)
+
+
+def reconcile_reviews(pks, check_only):
+    """Сверяет число комментариев отзывов pks. Возвращает число отзывов
+    с расхождением."""
+    reviews = list(Review.all_objects.select_for_update().filter(
+        pk__in=pks
+    ).order_by('pk').only('comments_count'))
+    actual = dict(
+        Comment.objects.filter(review_id__in=pks).order_by().values(
+            'review_id'
+        ).annotate(count=Count('pk')).values_list('review_id', 'count')
+    )
+    drifted = []
+    for review in reviews:
+        count = actual.get(review.pk, 0)
+        if review.comments_count != count:
+            review.comments_count = count
+            drifted.append(review)
+    if drifted and not check_only:
+        Review.all_objects.bulk_update(drifted, ['comments_count'])
+    return len(drifted)
+
+
+def reconcile(chunk_size, check_only=False):
+    """Сверяет все счётчики и, если не check_only, исправляет их.
+    Возвращает словарь: модель — число записей с расхождением."""
+    drifted = {'titles': 0, 'reviews': 0}
+    for key, queryset, check in (
+        ('titles', Title.all_objects.all(), reconcile_titles),
+        ('reviews', Review.all_objects.all(), reconcile_reviews),
+    ):
+        for pks in chunks(queryset, chunk_size):
+            with transaction.atomic():
+                drifted[key] += check(pks, check_only)
+    return drifted
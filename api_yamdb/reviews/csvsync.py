@@ -0,0 +1,276 @@
+"""Загрузка и сверка выгрузок CSV в формате static/data.
+
+Для каждой строки выгрузки хранится хэш её значений (RowHash). Ночная
+синхронизация сравнивает хэши новой выгрузки с сохранёнными и применяет
+только разницу: новые строки — bulk_create, изменённые — bulk_update,
+пропавшие — удаление, пачками по chunk_size, каждая пачка вместе с её
+хэшами в своей транзакции. Записывается столько строк, сколько
+изменилось, а не сколько их в выгрузке.
+
+Массовые операции не вызывают сигналы, поэтому после синхронизации
+затронутые произведения, отзывы и пользователи пересчитываются
+точечно, а изменения записываются в журнал. Удаления идут через
+delete() и обрабатываются сигналами.
+"""
+import csv
+import hashlib
+
+from django.conf import settings
+from django.db import transaction
+from users.models import User
+
+from . import (activity, autocomplete, changes, counters, facets,
+               histograms, leaderboards)
+from .models import (Category, Change, Comment, Genre, Review, RowHash,
+                     Title, TitleGenre)
+
+# Модель, файл и переименование столбцов CSV в поля модели — в порядке
+# зависимостей: строка ссылается только на таблицы выше.
+TABLES = (
+    (User, 'users.csv', {}),
+    (Category, 'category.csv', {}),
+    (Genre, 'genre.csv', {}),
+    (Title, 'titles.csv', {'category': 'category_id'}),
+    (TitleGenre, 'genre_title.csv', {}),
+    (Review, 'review.csv', {'author': 'author_id'}),
+    (Comment, 'comments.csv', {'author': 'author_id'}),
+)
+GROUPS = {Genre: autocomplete.GENRE, Category: autocomplete.CATEGORY}
+
+
+def default_path():
+    return f'{settings.BASE_DIR}/static/data'
+
+
+def table_name(csv_f):
+    return csv_f[:-len('.csv')]
+
+
+def read_rows(path, csv_f):
+    with open(
+        f'{path}/{csv_f}', 'r', encoding='utf-8', newline=''
+    ) as csv_file:
+        yield from csv.DictReader(csv_file)
+
+
+def row_digest(row):
+    values = '\x1f'.join(f'{name}={value}' for name, value in row.items())
+    return hashlib.blake2b(values.encode(), digest_size=16).hexdigest()
+
+
+def build(model, columns, row):
+    """Объект модели из строки CSV со значениями нужных типов."""
+    values = {}
+    for column, value in row.items():
+        name = columns.get(column, column)
+        values[name] = model._meta.get_field(name).to_python(value)
+    return model(**values)
+
+
+def auto_now_fields(model):
+    """Поля, которые bulk_create заполняет текущим временем вместо
+    значения из выгрузки."""
+    return [
+        field.name for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+
+
+def create(model, columns, rows):
+    """Создаёт объекты строк одним bulk_create, сохраняя даты из
+    выгрузки. Возвращает созданные объекты."""
+    objects = [build(model, columns, row) for row in rows]
+    model._base_manager.bulk_create(objects)
+    dates = auto_now_fields(model)
+    if dates and objects:
+        model._base_manager.bulk_update(
+            [build(model, columns, row) for row in rows], dates
+        )
+    return objects
+
+
+def chunks(items, chunk_size):
+    for start in range(0, len(items), chunk_size):
+        yield items[start:start + chunk_size]
+
+
+def record_baseline(path, chunk_size):
+    """Запоминает хэши выгрузки, уже загруженной в базу (load_csv)."""
+    for _, csv_f, _ in TABLES:
+        table = table_name(csv_f)
+        hashes = [
+            RowHash(table=table, row_id=int(row['id']), digest=row_digest(row))
+            for row in read_rows(path, csv_f)
+        ]
+        with transaction.atomic():
+            RowHash.objects.filter(table=table).delete()
+            RowHash.objects.bulk_create(hashes, batch_size=chunk_size)
+
+
+class TableDiff:
+    """Разница выгрузки таблицы с сохранёнными хэшами."""
+
+    def __init__(self, table):
+        self.table = table
+        self.inserted = []
+        self.updated = []
+        self.deleted = []
+        self.unchanged = 0
+
+    def counts(self):
+        return {
+            'inserted': len(self.inserted),
+            'updated': len(self.updated),
+            'deleted': len(self.deleted),
+            'unchanged': self.unchanged,
+        }
+
+
+class Sync:
+    """Синхронизация базы с выгрузкой в каталоге path."""
+
+    def __init__(self, path, chunk_size):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.titles = set()
+        self.relinked_titles = set()
+        self.reviews = set()
+        self.users = set()
+        self.groups = []
+        self.catalogue_changed = False
+
+    def diff(self, csv_f):
+        """Разница, строки выгрузки {id: (строка, хэш)} и сохранённые
+        хэши {id: (pk хэша, хэш)}."""
+        diff = TableDiff(table_name(csv_f))
+        stored = {
+            row_id: (pk, digest)
+            for pk, row_id, digest in RowHash.objects.filter(
+                table=diff.table
+            ).values_list('pk', 'row_id', 'digest').iterator()
+        }
+        rows = {}
+        for row in read_rows(self.path, csv_f):
+            row_id = int(row['id'])
+            rows[row_id] = row, row_digest(row)
+            if row_id not in stored:
+                diff.inserted.append(row_id)
+            elif stored[row_id][1] != rows[row_id][1]:
+                diff.updated.append(row_id)
+            else:
+                diff.unchanged += 1
+        diff.deleted = [row_id for row_id in stored if row_id not in rows]
+        return diff, rows, stored
+
+    def upsert(self, model, columns, diff, rows, stored):
+        """Новые и изменённые строки. Строка без хэша, которая уже есть в
+        базе, обновляется."""
+        for chunk in chunks(diff.inserted + diff.updated, self.chunk_size):
+            objects = [build(model, columns, rows[pk][0]) for pk in chunk]
+            fields = [
+                columns.get(column, column) for column in rows[chunk[0]][0]
+                if column != 'id'
+            ]
+            with transaction.atomic():
+                existing = set(model._base_manager.filter(
+                    pk__in=chunk
+                ).values_list('pk', flat=True))
+                self.track(model, existing)
+                created = create(model, columns, [
+                    rows[pk][0] for pk in chunk if pk not in existing
+                ])
+                model._base_manager.bulk_update(
+                    [obj for obj in objects if obj.pk in existing], fields
+                )
+                self.track(model, chunk)
+                RowHash.objects.bulk_update(
+                    [
+                        RowHash(pk=stored[pk][0], digest=rows[pk][1])
+                        for pk in chunk if pk in stored
+                    ],
+                    ['digest']
+                )
+                RowHash.objects.bulk_create(
+                    RowHash(table=diff.table, row_id=pk, digest=rows[pk][1])
+                    for pk in chunk if pk not in stored
+                )
+                if model in changes.MODELS:
+                    changes.record_many(
+                        model, [obj.pk for obj in created], Change.CREATE
+                    )
+                    changes.record_many(model, existing, Change.UPDATE)
+                if model in GROUPS:
+                    self.groups.append((model, chunk))
+
+    def delete(self, model, diff, stored):
+        for chunk in chunks(diff.deleted, self.chunk_size):
+            with transaction.atomic():
+                self.track(model, chunk)
+                model._base_manager.filter(pk__in=chunk).delete()
+                RowHash.objects.filter(
+                    pk__in=[stored[pk][0] for pk in chunk]
+                ).delete()
+
+    def track(self, model, pks):
+        """Запоминает, что пересчитать после синхронизации."""
+        rows = model._base_manager.filter(pk__in=pks)
+        if model is Title:
+            self.titles.update(pks)
+        elif model is TitleGenre:
+            title_ids = set(rows.values_list('title_id', flat=True))
+            self.titles.update(title_ids)
+            self.relinked_titles.update(title_ids)
+        elif model is Review:
+            self.reviews.update(pks)
+            for title_id, author_id in rows.values_list(
+                'title_id', 'author_id'
+            ):
+                self.titles.add(title_id)
+                self.users.add(author_id)
+        elif model is Comment:
+            for review_id, author_id in rows.values_list(
+                'review_id', 'author_id'
+            ):
+                self.reviews.add(review_id)
+                self.users.add(author_id)
+        if model in (Title, TitleGenre, Genre, Category):
+            self.catalogue_changed = True
+
+    def run(self, dry_run=False):
+        """Применяет разницу (или только считает её при dry_run).
+        Возвращает список TableDiff."""
+        diffs = []
+        for model, csv_f, columns in TABLES:
+            diff, rows, stored = self.diff(csv_f)
+            diffs.append((model, diff, stored))
+            if not dry_run:
+                self.upsert(model, columns, diff, rows, stored)
+        if not dry_run:
+            for model, diff, stored in reversed(diffs):
+                self.delete(model, diff, stored)
+            self.refresh()
+        return [diff for _, diff, _ in diffs]
+
+    def refresh(self):
+        """Точечный пересчёт того, что массовые операции обошли."""
+        for chunk in chunks(sorted(self.titles), self.chunk_size):
+            with transaction.atomic():
+                counters.reconcile_titles(chunk, check_only=False)
+            histograms.refresh(chunk)
+            for title in Title.objects.filter(
+                pk__in=chunk
+            ).select_related('category').prefetch_related('genre'):
+                leaderboards.refresh_title(title)
+                autocomplete.index.upsert(autocomplete.title_entry(title))
+        for chunk in chunks(sorted(self.reviews), self.chunk_size):
+            with transaction.atomic():
+                counters.reconcile_reviews(chunk, check_only=False)
+        for chunk in chunks(sorted(self.users), self.chunk_size):
+            activity.refresh_users(chunk)
+        for chunk in chunks(sorted(self.relinked_titles), self.chunk_size):
+            changes.record_many(Title, chunk, Change.UPDATE)
+        for model, pks in self.groups:
+            for group in model.objects.filter(pk__in=pks):
+                autocomplete.index.upsert_group(GROUPS[model], group)
+        if self.catalogue_changed:
+            facets.invalidate()
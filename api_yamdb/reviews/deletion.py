@@ -0,0 +1,193 @@
+"""Фоновое удаление произведений, пользователей, категорий и жанров.
+
+Запрос только помечает объект (deleting=True) — менеджеры по умолчанию
+его больше не показывают, а отзывы и комментарии удаляемых произведений
+и пользователей пути чтения отсекают через alive() — и создаёт
+DeletionJob. Зависимые записи
+удаляются пачками по DELETION_CHUNK_SIZE, каждая пачка в своей короткой
+транзакции, в фоновом потоке после коммита запроса; последним удаляется
+сам объект. Задания, прерванные перезапуском воркера, доделывает
+команда purge_deleted.
+"""
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from users.models import User
+from users.revocation import revoke_user
+
+from . import autocomplete, changes, facets, feed, leaderboards
+from .models import (Category, Change, Comment, DeletionJob, Genre,
+                     LeaderboardEntry, Leaderboard, Review, SimilarTitle,
+                     Title)
+
+logger = logging.getLogger(__name__)
+
+
+def title_steps(pk):
+    return [
+        (Comment.all_objects.filter(review__title_id=pk), None),
+        (Review.all_objects.filter(title_id=pk), None),
+        (SimilarTitle.objects.filter(similar_id=pk), None),
+        (Title.all_objects.filter(pk=pk), None),
+    ]
+
+
+def user_steps(pk):
+    return [
+        (Comment.all_objects.filter(author_id=pk), None),
+        (Comment.all_objects.filter(review__author_id=pk), None),
+        (Review.all_objects.filter(author_id=pk), None),
+        (User.all_objects.filter(pk=pk), None),
+    ]
+
+
+def group_steps(model, board):
+    def steps(pk):
+        slug = model.all_objects.filter(pk=pk).values_list(
+            'slug', flat=True
+        ).first()
+        return [
+            (LeaderboardEntry.objects.filter(
+                leaderboard__slug=board(slug)
+            ), None),
+            (Leaderboard.objects.filter(slug=board(slug)), None),
+            (model.all_objects.filter(pk=pk), None),
+        ]
+    return steps
+
+
+def category_steps(pk):
+    return [
+        (Title.all_objects.filter(category_id=pk), {'category': None}),
+    ] + group_steps(Category, leaderboards.category_board)(pk)
+
+
+def genre_steps(pk):
+    return [
+        (Title.genre.through.objects.filter(genre_id=pk), None),
+    ] + group_steps(Genre, leaderboards.genre_board)(pk)
+
+
+KINDS = {
+    Title: ('title', title_steps),
+    User: ('user', user_steps),
+    Category: ('category', category_steps),
+    Genre: ('genre', genre_steps),
+}
+STEPS = dict(KINDS.values())
+
+
+def hide(instance):
+    """Убирает помеченный объект из предрасчитанных данных. Каждое
+    действие затрагивает ограниченное число записей."""
+    if isinstance(instance, Title):
+        leaderboards.remove_title(instance)
+        autocomplete.index.remove(autocomplete.TITLE, instance.pk)
+    elif isinstance(instance, Genre):
+        autocomplete.index.remove(autocomplete.GENRE, instance.pk)
+    elif isinstance(instance, Category):
+        autocomplete.index.remove(autocomplete.CATEGORY, instance.pk)
+    if isinstance(instance, User):
+        revoke_user(instance.pk)
+    else:
+        facets.invalidate()
+    if isinstance(instance, (Title, User)):
+        feed.remove_dead()
+
+
+def schedule(instance):
+    """Помечает объект удаляемым и запускает фоновое удаление.
+    Возвращает DeletionJob."""
+    kind, _ = KINDS[type(instance)]
+    with transaction.atomic():
+        type(instance).all_objects.filter(pk=instance.pk).update(
+            deleting=True
+        )
+        job = DeletionJob.objects.create(
+            model=kind, object_id=instance.pk, name=str(instance)[:256]
+        )
+        if type(instance) in changes.MODELS:
+            changes.record(instance, Change.DELETE)
+        transaction.on_commit(lambda: start(job.pk))
+    hide(instance)
+    return job
+
+
+def start(job_id):
+    thread = threading.Thread(target=run_in_thread, args=(job_id,))
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def run_in_thread(job_id):
+    try:
+        run(job_id)
+    finally:
+        connection.close()
+
+
+def purge(job, queryset, values):
+    """Удаляет (или обновляет на values) записи queryset пачками."""
+    model = queryset.model
+    while True:
+        pks = list(queryset.order_by().values_list(
+            'pk', flat=True
+        )[:settings.DELETION_CHUNK_SIZE])
+        if not pks:
+            return
+        with transaction.atomic():
+            rows = model._base_manager.filter(pk__in=pks)
+            if values is None:
+                rows.delete()
+            else:
+                rows.update(**values)
+                if model in changes.MODELS:
+                    changes.record_many(model, pks, Change.UPDATE)
+        DeletionJob.objects.filter(pk=job.pk).update(
+            deleted=F('deleted') + len(pks), updated_at=timezone.now()
+        )
+
+
+def claim(job_id):
+    """Забирает задание, если его никто не выполняет: новое, упавшее или
+    давно не обновлявшееся."""
+    stale = timezone.now() - timedelta(
+        minutes=settings.DELETION_STALE_MINUTES
+    )
+    return DeletionJob.objects.filter(pk=job_id).filter(
+        Q(status__in=(DeletionJob.PENDING, DeletionJob.FAILED))
+        | Q(status=DeletionJob.RUNNING, updated_at__lt=stale)
+    ).update(status=DeletionJob.RUNNING, updated_at=timezone.now())
+
+
+def run(job_id):
+    """Выполняет задание. Возвращает False, если его выполняет кто-то
+    другой или оно уже завершено."""
+    if not claim(job_id):
+        return False
+    job = DeletionJob.objects.get(pk=job_id)
+    try:
+        steps = STEPS[job.model](job.object_id)
+        if job.total is None:
+            job.total = job.deleted + sum(
+                queryset.count() for queryset, _ in steps
+            )
+            DeletionJob.objects.filter(pk=job.pk).update(total=job.total)
+        for queryset, values in steps:
+            purge(job, queryset, values)
+    except Exception as error:
+        logger.exception('Удаление %s не завершено', job)
+        DeletionJob.objects.filter(pk=job.pk).update(
+            status=DeletionJob.FAILED, error=str(error)
+        )
+        return True
+    DeletionJob.objects.filter(pk=job.pk).update(
+        status=DeletionJob.DONE, error='', finished_at=timezone.now()
+    )
+    return True
@@ -0,0 +1,268 @@
+"""Рассылка новых отзывов и комментариев подписчикам потоков SSE.
+
+Каналы: title:<id> — новые отзывы на произведение, review:<id> — новые
+комментарии к отзыву. Источник событий — журнал изменений: записи о
+создании отзывов и комментариев, а номер события (id в SSE) — номер
+записи журнала. Номера становятся видны строго по порядку (см.
+reviews.changes), поэтому поток, дочитавший журнал до номера N, ничего
+не пропустит, если дальше получит всё с номерами больше N.
+
+Каждый процесс держит своих подписчиков в памяти (очередь на
+соединение). Когда changes.publish() выдаёт номера, брокер процесса
+дочитывает журнал после последнего разосланного номера, загружает
+новые записи один раз и раздаёт их подписчикам по порядку номеров:
+
+* PostgresBroker — publish() отправляет pg_notify, уведомление уходит
+  после коммита. В каждом процессе один поток слушает канал через
+  LISTEN и дочитывает журнал; на всякий случай он дочитывает его и
+  раз в минуту без уведомлений;
+* LocalBroker — дочитывает журнал в том же процессе после коммита. Для
+  тестов и разработки на SQLite.
+
+Подписчик, который не успевает читать (очередь переполнена),
+отключается: клиент переподключится с Last-Event-ID и дочитает
+пропущенное из журнала.
+"""
+import logging
+import select
+import threading
+import time
+from queue import Empty, Full, Queue
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+
+from . import feed
+from .models import Change, Comment, Review
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'yamdb_events'
+KINDS = (feed.REVIEW, feed.COMMENT)
+
+
+def title_channel(title_id):
+    return f'title:{title_id}'
+
+
+def review_channel(review_id):
+    return f'review:{review_id}'
+
+
+def key_prefix(channel):
+    """Начало key в журнале у записей канала."""
+    kind, pk = channel.split(':')
+    if kind == 'title':
+        return f'titles/{pk}/reviews/'
+    title_id = Review._base_manager.filter(pk=pk).values_list(
+        'title_id', flat=True
+    ).first()
+    return f'titles/{title_id}/reviews/{pk}/comments/'
+
+
+def channel_of(change):
+    """Канал записи журнала по её key."""
+    parts = change.key.split('/')
+    if change.model == feed.REVIEW:
+        return title_channel(parts[1])
+    return review_channel(parts[3])
+
+
+def created(changes):
+    """Записи журнала о создании отзывов и комментариев."""
+    return changes.filter(model__in=KINDS, action=Change.CREATE)
+
+
+def load_items(changes):
+    """Пары (запись журнала, запись ленты) для changes; записи уже
+    удалённых или скрытых объектов пропускаются."""
+    pks = {kind: set() for kind in KINDS}
+    for change in changes:
+        pks[change.model].add(change.object_id)
+    objects = {
+        (feed.REVIEW, review.pk): feed.review_item(review)
+        for review in Review.objects.alive().filter(
+            pk__in=pks[feed.REVIEW]
+        ).select_related('author')
+    }
+    objects.update(
+        ((feed.COMMENT, comment.pk), feed.comment_item(comment))
+        for comment in Comment.objects.alive().filter(
+            pk__in=pks[feed.COMMENT]
+        ).select_related('author', 'review')
+    )
+    return [
+        (change, objects[change.model, change.object_id])
+        for change in changes
+        if (change.model, change.object_id) in objects
+    ]
+
+
+def backlog(channel, last_seq):
+    """События канала после last_seq из журнала."""
+    changes = list(created(Change.objects.filter(
+        seq__gt=last_seq, key__startswith=key_prefix(channel)
+    )).order_by('seq').only('seq', 'model', 'object_id', 'key'))
+    return [
+        (change.seq, item) for change, item in load_items(
+            [change for change in changes if channel_of(change) == channel]
+        )
+    ]
+
+
+def last_published():
+    return Change.objects.filter(seq__isnull=False).order_by(
+        '-seq'
+    ).values_list('seq', flat=True).first() or 0
+
+
+class Subscription:
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.queue = Queue(settings.EVENTS_QUEUE_SIZE)
+        self.overflowed = False
+
+    def get(self, timeout):
+        """Следующая пара (номер, запись) или None, если за timeout
+        ничего не пришло."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except Empty:
+            return None
+
+
+class LocalBroker:
+
+    def __init__(self):
+        self.subscriptions = {}
+        self.lock = threading.Lock()
+        self.read_lock = threading.Lock()
+        self.last_seq = None
+
+    def subscribe(self, channel):
+        subscription = Subscription(channel)
+        # Под read_lock: read() не должен ни сбросить last_seq, ни
+        # разослать события между его чтением и регистрацией подписчика.
+        with self.read_lock:
+            if self.last_seq is None:
+                self.last_seq = last_published()
+            with self.lock:
+                self.subscriptions.setdefault(channel, set()).add(
+                    subscription
+                )
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            channel = self.subscriptions.get(subscription.channel, set())
+            channel.discard(subscription)
+            if not channel:
+                self.subscriptions.pop(subscription.channel, None)
+
+    def has_subscribers(self, channel):
+        return channel in self.subscriptions
+
+    def deliver(self, channel, event):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.queue.put_nowait(event)
+            except Full:
+                subscription.overflowed = True
+
+    def disconnect_all(self):
+        """Отключает всех подписчиков: они переподключатся и дочитают
+        пропущенное из журнала."""
+        with self.lock:
+            for subscriptions in self.subscriptions.values():
+                for subscription in subscriptions:
+                    subscription.overflowed = True
+
+    def read(self):
+        """Дочитывает журнал после last_seq и раздаёт события."""
+        with self.read_lock:
+            if self.last_seq is None or not self.subscriptions:
+                self.last_seq = None
+                return
+            top = last_published()
+            changes = list(created(Change.objects.filter(
+                seq__gt=self.last_seq, seq__lte=top
+            )).order_by('seq').only('seq', 'model', 'object_id', 'key'))
+            self.last_seq = top
+            for change, item in load_items([
+                change for change in changes
+                if self.has_subscribers(channel_of(change))
+            ]):
+                self.deliver(channel_of(change), (change.seq, item))
+
+    def published(self):
+        """Вызывается changes.publish() в транзакции выдачи номеров."""
+        transaction.on_commit(self.read)
+
+
+class PostgresBroker(LocalBroker):
+
+    def __init__(self):
+        super().__init__()
+        self.listener = None
+
+    def subscribe(self, channel):
+        if self.listener is None or not self.listener.is_alive():
+            with self.lock:
+                if self.listener is None or not self.listener.is_alive():
+                    self.listener = threading.Thread(target=self.listen)
+                    self.listener.daemon = True
+                    self.listener.start()
+        return super().subscribe(channel)
+
+    def published(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [CHANNEL, ''])
+
+    def listen(self):
+        while True:
+            try:
+                self.listen_once()
+            except Exception:
+                logger.exception('Слушатель событий остановился')
+                with self.read_lock:
+                    self.disconnect_all()
+                    self.last_seq = None
+                time.sleep(settings.EVENTS_RECONNECT_SECONDS)
+            finally:
+                connection.close()
+
+    def listen_once(self):
+        # Отдельное соединение мимо DatabaseWrapper: оно не должно
+        # занимать место в пуле соединений запросов.
+        wrapper = connections['default']
+        listener = wrapper.Database.connect(
+            **wrapper.get_connection_params()
+        )
+        listener.autocommit = True
+        try:
+            with listener.cursor() as cursor:
+                cursor.execute(f'LISTEN {CHANNEL}')
+            while True:
+                select.select([listener], [], [], 60)
+                listener.poll()
+                listener.notifies.clear()
+                try:
+                    self.read()
+                finally:
+                    # Соединение ORM нужно потоку только на время
+                    # чтения и не держится между уведомлениями.
+                    connection.close()
+        finally:
+            listener.close()
+
+
+def make_broker():
+    if connection.vendor == 'postgresql':
+        return PostgresBroker()
+    return LocalBroker()
+
+
+broker = make_broker()
@@ -0,0 +1,83 @@
+"""Счётчики произведений по жанрам, категориям и десятилетиям для
+фильтров каталога.
+
+Счётчики считаются группирующими запросами по уже отфильтрованному
+списку произведений и кэшируются для каждого набора фильтров. Любое
+изменение произведений, жанров или категорий меняет версию кэша, поэтому
+устаревшие счётчики не отдаются.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F
+
+from .models import Title
+
+VERSION_KEY = 'title-facets-version'
+
+
+def title_facets(titles):
+    """Счётчики для произведений titles (QuerySet)."""
+    title_ids = titles.values('pk')
+    genres = Title.genre.through.objects.filter(
+        title_id__in=title_ids, genre__deleting=False
+    ).values('genre__slug', 'genre__name').annotate(
+        count=Count('title_id')
+    ).order_by('-count', 'genre__slug')
+    categories = Title.objects.filter(
+        pk__in=title_ids, category__isnull=False, category__deleting=False
+    ).values('category__slug', 'category__name').annotate(
+        count=Count('pk')
+    ).order_by('-count', 'category__slug')
+    decades = Title.objects.filter(pk__in=title_ids).annotate(
+        decade=F('year') / 10 * 10
+    ).values('decade').annotate(count=Count('pk')).order_by('-decade')
+    return {
+        'genre': [
+            {
+                'slug': row['genre__slug'],
+                'name': row['genre__name'],
+                'count': row['count'],
+            }
+            for row in genres
+        ],
+        'category': [
+            {
+                'slug': row['category__slug'],
+                'name': row['category__name'],
+                'count': row['count'],
+            }
+            for row in categories
+        ],
+        'year': [
+            {
+                'from': row['decade'],
+                'to': row['decade'] + 9,
+                'count': row['count'],
+            }
+            for row in decades
+        ],
+    }
+
+
+def cached_title_facets(titles, filters):
+    """Счётчики из кэша по набору фильтров {имя: значение}."""
+    version = cache.get_or_set(VERSION_KEY, 1, None)
+    digest = hashlib.md5(
+        repr(sorted(filters.items())).encode()
+    ).hexdigest()
+    key = f'title-facets:{version}:{digest}'
+    facets = cache.get(key)
+    if facets is None:
+        facets = title_facets(titles)
+        cache.set(key, facets, settings.FACETS_CACHE_TIMEOUT)
+    return facets
+
+
+def invalidate():
+    """Сбрасывает все закэшированные счётчики."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
@@ -0,0 +1,272 @@
+"""Лента последних отзывов и комментариев по всему сайту.
+
+Свежие записи лежат в кольцевом буфере в кэше: номер последней записи
+под ключом SEQ_KEY, сама запись — в ячейке номер % FEED_SIZE. Сигналы
+дописывают новые записи, а изменённые и удалённые переписывают на месте,
+если они ещё в буфере; возвращённые модератором записи восстанавливаются
+так же. Записи произведения или пользователя, поставленного на удаление,
+убираются из буфера сразу (remove_dead), не дожидаясь фонового
+удаления. Поэтому голова ленты читается одним
+multi-get из кэша без запросов к базе.
+
+Ключ сортировки ленты — (pub_date, тип, id) по убыванию. Страницы
+старше буфера, а также пока буфер пуст после сброса кэша, читаются из
+базы по ключу сортировки (keyset) по индексам pub_date.
+
+Буфер лежит в общем кэше (reviews.caches): в кэше в памяти процесса у
+каждого воркера был бы свой буфер только с его записями. Если общего
+кэша нет, буфер не ведётся, и лента всегда читается из базы.
+"""
+from heapq import merge
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from . import caches
+from .models import Comment, Review
+
+SEQ_KEY = 'feed-seq'
+REVIEW = 'review'
+COMMENT = 'comment'
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+
+
+def slot_key(seq):
+    return f'feed-slot:{seq % settings.FEED_SIZE}'
+
+
+def item_key(kind, pk):
+    return f'feed-item:{kind}:{pk}'
+
+
+def review_item(review):
+    return {
+        'type': REVIEW,
+        'id': review.pk,
+        'title': review.title_id,
+        'review': None,
+        'author': review.author.username,
+        'text': review.text,
+        'score': review.score,
+        'pub_date': review.pub_date.strftime(DATE_FORMAT),
+    }
+
+
+def comment_item(comment):
+    return {
+        'type': COMMENT,
+        'id': comment.pk,
+        'title': comment.review.title_id,
+        'review': comment.review_id,
+        'author': comment.author.username,
+        'text': comment.text,
+        'score': None,
+        'pub_date': comment.pub_date.strftime(DATE_FORMAT),
+    }
+
+
+def sort_key(item):
+    return item['pub_date'], item['type'], item['id']
+
+
+def cursor(item):
+    return '|'.join(map(str, sort_key(item)))
+
+
+def parse_cursor(value):
+    """Ключ сортировки из курсора или None, если курсор испорчен."""
+    try:
+        pub_date, kind, pk = value.split('|')
+        if parse_datetime(pub_date) is None:
+            return None
+        return pub_date, kind, int(pk)
+    except ValueError:
+        return None
+
+
+def _store(items):
+    """Кладёт записи в буфер, забрав для них номера одним incr."""
+    if not caches.is_shared():
+        return
+    cache = caches.shared()
+    try:
+        last = cache.incr(SEQ_KEY, len(items))
+    except ValueError:
+        return
+    slots, positions = {}, {}
+    for seq, item in enumerate(items, start=last - len(items) + 1):
+        slots[slot_key(seq)] = dict(item, seq=seq)
+        positions[item_key(item['type'], item['id'])] = seq
+    cache.set_many(slots, None)
+    cache.set_many(positions, None)
+
+
+def append(item):
+    _store([item])
+
+
+def _rewrite(kind, pk, item):
+    if not caches.is_shared():
+        return
+    cache = caches.shared()
+    seq = cache.get(item_key(kind, pk))
+    if seq is None:
+        return
+    current = cache.get(slot_key(seq))
+    if current is not None and current['seq'] == seq:
+        cache.set(slot_key(seq), dict(item, seq=seq), None)
+
+
+def replace(item):
+    """Обновляет запись, если она ещё в буфере."""
+    _rewrite(item['type'], item['id'], item)
+
+
+def remove(kind, pk):
+    _rewrite(kind, pk, {'type': kind, 'id': pk, 'deleted': True})
+
+
+def remove_many(kind, pks):
+    """Помечает удалёнными записи pks, которые ещё в буфере: два
+    multi-get и один multi-set на все записи."""
+    if not caches.is_shared():
+        return
+    cache = caches.shared()
+    keys = {item_key(kind, pk): pk for pk in pks}
+    positions = cache.get_many(list(keys))
+    if not positions:
+        return
+    slots = cache.get_many(
+        [slot_key(seq) for seq in positions.values()]
+    )
+    removed = {}
+    for key, seq in positions.items():
+        current = slots.get(slot_key(seq))
+        if current is not None and current['seq'] == seq:
+            removed[slot_key(seq)] = {
+                'type': kind, 'id': keys[key], 'deleted': True, 'seq': seq,
+            }
+    cache.set_many(removed, None)
+
+
+def restore_many(kind, pks):
+    """Возвращает в буфер записи pks после снятия скрытия: на прежнее
+    место, если оно ещё в буфере, иначе дописывает записи не старше
+    буфера. Более старые лента и так читает из базы."""
+    if not caches.is_shared():
+        return
+    if kind == REVIEW:
+        items = list(map(review_item, Review.objects.alive().filter(
+            pk__in=pks
+        ).select_related('author')))
+    else:
+        items = list(map(comment_item, Comment.objects.alive().filter(
+            pk__in=pks
+        ).select_related('author', 'review')))
+    cache = caches.shared()
+    positions = cache.get_many([item_key(kind, item['id']) for item in items])
+    slots = cache.get_many(
+        [slot_key(seq) for seq in positions.values()]
+    )
+    restored, missing = {}, []
+    for item in items:
+        seq = positions.get(item_key(kind, item['id']))
+        current = slots.get(slot_key(seq)) if seq is not None else None
+        if current is not None and current['seq'] == seq:
+            restored[slot_key(seq)] = dict(item, seq=seq)
+        else:
+            missing.append(item)
+    cache.set_many(restored, None)
+    items = buffered()
+    if missing and items:
+        # Запись старше буфера оставила бы в нём дыру: страница из буфера
+        # пропустила бы записи между ней и буфером, которые есть в базе.
+        oldest = sort_key(items[-1])
+        _store(sorted(
+            (item for item in missing if sort_key(item) > oldest),
+            key=sort_key
+        ))
+
+
+def remove_dead():
+    """Помечает удалёнными записи буфера, чьё произведение или автор
+    поставлены на удаление: по запросу на тип записей, не больше
+    FEED_SIZE ключей в каждом."""
+    items = buffered()
+    if not items:
+        return
+    for kind, model in ((REVIEW, Review), (COMMENT, Comment)):
+        pks = {item['id'] for item in items if item['type'] == kind}
+        alive = model.objects.alive().filter(
+            pk__in=pks
+        ).values_list('pk', flat=True)
+        remove_many(kind, pks.difference(alive))
+
+
+def buffered():
+    """Записи буфера по убыванию ключа сортировки; None, если буфера
+    нет (кэш сброшен или не общий)."""
+    if not caches.is_shared():
+        return None
+    cache = caches.shared()
+    if cache.get(SEQ_KEY) is None:
+        return None
+    items, seen = [], set()
+    slots = cache.get_many(
+        [slot_key(seq) for seq in range(settings.FEED_SIZE)]
+    )
+    for item in slots.values():
+        ref = item['type'], item['id']
+        if not item.get('deleted') and ref not in seen:
+            seen.add(ref)
+            items.append(item)
+    return sorted(items, key=sort_key, reverse=True)
+
+
+def older(kind, before):
+    """Условие keyset: запись типа kind младше ключа before."""
+    if before is None:
+        return Q()
+    pub_date, before_kind, pk = before
+    pub_date = parse_datetime(pub_date)
+    condition = Q(pub_date__lt=pub_date)
+    if kind < before_kind:
+        condition |= Q(pub_date=pub_date)
+    elif kind == before_kind:
+        condition |= Q(pub_date=pub_date, pk__lt=pk)
+    return condition
+
+
+def from_db(before, limit):
+    reviews = Review.objects.alive().filter(
+        older(REVIEW, before)
+    ).select_related('author').order_by('-pub_date', '-pk')[:limit]
+    comments = Comment.objects.alive().filter(
+        older(COMMENT, before)
+    ).select_related('author', 'review').order_by('-pub_date', '-pk')[:limit]
+    items = merge(
+        map(review_item, reviews), map(comment_item, comments),
+        key=sort_key, reverse=True
+    )
+    return list(items)[:limit]
+
+
+def fill():
+    """Заполняет пустой буфер последними записями из базы. Заполняет
+    только тот процесс, который первым создал счётчик."""
+    if caches.is_shared() and caches.shared().add(SEQ_KEY, 0, None):
+        _store(from_db(None, settings.FEED_SIZE)[::-1])
+
+
+def page(before, limit):
+    """Записи ленты младше ключа before (None — с начала)."""
+    items = buffered()
+    if items is None:
+        fill()
+        return from_db(before, limit)
+    if before is not None:
+        items = [item for item in items if sort_key(item) < before]
+    if len(items) >= limit:
+        return items[:limit]
+    return from_db(before, limit)
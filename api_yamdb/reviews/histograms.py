@@ -0,0 +1,136 @@
+"""Распределение оценок по произведениям.
+
+Сигналы отзывов сдвигают счётчики одним UPDATE с F-выражениями, поэтому
+параллельные отзывы не теряют обновлений. Пакетный пересчёт строит все
+распределения одним np.bincount по массивам отзывов и сравнивает их с
+сохранёнными.
+"""
+from django.db import transaction
+from django.db.models import Count, F
+
+from .lazy import LazyModule
+from .models import SCORES, Review, ScoreHistogram, Title, score_field
+from .similarity import review_arrays
+
+np = LazyModule('numpy')
+
+
+def apply(title_id, deltas):
+    """Сдвигает счётчики произведения: deltas — {оценка: разница}."""
+    updates = {
+        score_field(score): F(score_field(score)) + delta
+        for score, delta in deltas.items() if delta
+    }
+    if not updates:
+        return
+    if ScoreHistogram.objects.filter(title_id=title_id).update(**updates):
+        return
+    # Строки нет: первый отзыв или произведение удаляется каскадом
+    # (распределение удалено раньше отзывов). Уменьшать нечего.
+    if any(delta < 0 for delta in deltas.values()):
+        return
+    ScoreHistogram.objects.get_or_create(title_id=title_id)
+    ScoreHistogram.objects.filter(title_id=title_id).update(**updates)
+
+
+def attach(titles):
+    """Раскладывает распределения по произведениям в included_histogram."""
+    histograms = ScoreHistogram.objects.in_bulk([title.pk for title in titles])
+    for title in titles:
+        histogram = histograms.get(title.pk)
+        counts = histogram.counts() if histogram else [0] * len(SCORES)
+        title.included_histogram = dict(zip(map(str, SCORES), counts))
+
+
+def expected(chunk_size):
+    """id произведений и их распределения, посчитанные по отзывам."""
+    title_ids = np.fromiter(
+        Title.objects.order_by('pk').values_list('pk', flat=True),
+        dtype=np.int64
+    )
+    _, titles, scores = review_arrays(chunk_size)
+    known = np.isin(titles, title_ids)
+    index = np.searchsorted(title_ids, titles[known])
+    counts = np.bincount(
+        index * len(SCORES) + scores[known] - SCORES[0],
+        minlength=len(title_ids) * len(SCORES)
+    ).reshape(len(title_ids), len(SCORES))
+    return title_ids, counts
+
+
+def stored(title_ids):
+    counts = np.zeros((len(title_ids), len(SCORES)), dtype=np.int64)
+    rows = ScoreHistogram.objects.values_list(
+        'title_id', *map(score_field, SCORES)
+    )
+    for title_id, *row in rows.iterator():
+        position = np.searchsorted(title_ids, title_id)
+        if position < len(title_ids) and title_ids[position] == title_id:
+            counts[position] = row
+    return counts
+
+
+def rebuild(chunk_size, check_only=False):
+    """Сверяет сохранённые распределения с отзывами и, если не
+    check_only, исправляет расхождения. Возвращает число произведений
+    с расхождением."""
+    title_ids, counts = expected(chunk_size)
+    drifted = np.flatnonzero((stored(title_ids) != counts).any(axis=1))
+    if check_only or not len(drifted):
+        return len(drifted)
+    histograms = [
+        ScoreHistogram(
+            title_id=int(title_ids[position]),
+            **{
+                score_field(score): int(count)
+                for score, count in zip(SCORES, counts[position])
+            }
+        )
+        for position in drifted
+    ]
+    with transaction.atomic():
+        existing = set(ScoreHistogram.objects.filter(
+            title_id__in=title_ids[drifted].tolist()
+        ).values_list('title_id', flat=True))
+        ScoreHistogram.objects.bulk_update(
+            [item for item in histograms if item.title_id in existing],
+            list(map(score_field, SCORES)),
+            batch_size=chunk_size
+        )
+        ScoreHistogram.objects.bulk_create(
+            [item for item in histograms if item.title_id not in existing],
+            batch_size=chunk_size
+        )
+    return len(drifted)
+
+
+def refresh(title_ids):
+    """Пересчитывает по отзывам распределения только произведений
+    title_ids — для изменений в обход сигналов."""
+    with transaction.atomic():
+        # Как в counters.reconcile_titles: строки блокируются до
+        # подсчёта и обновляются на месте, поэтому сдвиг от сигнала
+        # параллельного отзыва применяется к пересчитанным счётчикам.
+        existing = set(ScoreHistogram.objects.select_for_update().filter(
+            title_id__in=title_ids
+        ).order_by('title_id').values_list('title_id', flat=True))
+        histograms = {
+            title_id: ScoreHistogram(title_id=title_id)
+            for title_id in Title.all_objects.filter(
+                pk__in=title_ids
+            ).values_list('pk', flat=True)
+        }
+        rows = Review.objects.filter(
+            title_id__in=list(histograms)
+        ).order_by().values('title_id', 'score').annotate(
+            count=Count('pk')
+        ).values_list('title_id', 'score', 'count')
+        for title_id, score, count in rows:
+            setattr(histograms[title_id], score_field(score), count)
+        ScoreHistogram.objects.bulk_update(
+            [item for item in histograms.values() if item.pk in existing],
+            list(map(score_field, SCORES))
+        )
+        ScoreHistogram.objects.bulk_create(
+            [item for item in histograms.values() if item.pk not in existing]
+        )
@@ -0,0 +1,26 @@
+"""Отложенный импорт тяжёлых библиотек.
+
+NumPy и SciPy нужны только пакетным пересчётам (рейтинги, распределения
+оценок, похожие произведения, рекомендации), но модули с ними
+импортируются при старте воркера через сигналы и представления. Вместо
+import numpy as np модуль объявляет np = LazyModule('numpy'), и
+библиотека загружается при первом обращении к её атрибуту.
+"""
+import importlib
+
+
+class LazyModule:
+    """Модуль name, импортируемый при первом обращении к атрибуту."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        # Вызывается только для атрибутов, которых нет у самого объекта.
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+    def __repr__(self):
+        return f'<LazyModule {self._name!r}>'
@@ -0,0 +1,172 @@
+"""Предрасчитанные рейтинги произведений.
+
+Рейтинги лучших (top, category:<slug>, genre:<slug>) хранят рейтинг
+произведения Title.rating, рейтинг trending — сумму оценок за последнюю неделю
+с экспоненциальным затуханием. Затухание считается относительно момента
+пересчёта рейтинга built_at: свежий отзыв получает вес больше единицы,
+поэтому порядок остаётся верным и между полными пересчётами.
+
+Отзывы обновляют рейтинги по одному произведению через сигналы,
+команда rebuild_leaderboards пересчитывает всё целиком.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Leaderboard, LeaderboardEntry, Review, Title
+
+TOP = 'top'
+TRENDING = 'trending'
+
+
+def category_board(slug):
+    return f'category:{slug}'
+
+
+def genre_board(slug):
+    return f'genre:{slug}'
+
+
+def title_boards(title):
+    """Рейтинги лучших, в которых участвует произведение."""
+    slugs = [TOP]
+    if title.category_id is not None:
+        slugs.append(category_board(title.category.slug))
+    slugs.extend(genre_board(genre.slug) for genre in title.genre.all())
+    return slugs
+
+
+def trending_weight(pub_date, built_at):
+    half_life = timedelta(hours=settings.TRENDING_HALF_LIFE_HOURS)
+    return 0.5 ** ((built_at - pub_date) / half_life)
+
+
+def _resize(changes):
+    """Поправляет сохранённый размер рейтингов: {id рейтинга: разница}."""
+    for board_id, delta in changes.items():
+        if delta:
+            Leaderboard.objects.filter(pk=board_id).update(
+                size=F('size') + delta
+            )
+
+
+def _remove_entries(entries):
+    stale = list(entries.values_list('pk', 'leaderboard_id'))
+    if stale:
+        LeaderboardEntry.objects.filter(
+            pk__in=[pk for pk, _ in stale]
+        ).delete()
+        changes = Counter()
+        for _, board_id in stale:
+            changes[board_id] -= 1
+        _resize(changes)
+
+
+def remove_title(title):
+    """Убирает произведение из всех рейтингов."""
+    _remove_entries(LeaderboardEntry.objects.filter(title=title))
+
+
+def refresh_title(title):
+    """Обновляет рейтинг произведения во всех рейтингах лучших."""
+    slugs = title_boards(title) if title.rating is not None else []
+    _remove_entries(
+        LeaderboardEntry.objects.filter(title=title).exclude(
+            leaderboard__slug=TRENDING
+        ).exclude(leaderboard__slug__in=slugs)
+    )
+    for slug in slugs:
+        board, _ = Leaderboard.objects.get_or_create(slug=slug)
+        _, created = LeaderboardEntry.objects.update_or_create(
+            leaderboard=board,
+            title=title,
+            defaults={'value': title.rating}
+        )
+        _resize({board.pk: int(created)})
+
+
+def add_trending(title_id, score, pub_date):
+    """Прибавляет (или вычитает при score < 0) оценку в trending."""
+    add_trending_many([(title_id, score, pub_date)])
+
+
+def add_trending_many(scores):
+    """То же для многих оценок (id произведения, оценка, дата отзыва):
+    один UPDATE на произведение."""
+    board, _ = Leaderboard.objects.get_or_create(slug=TRENDING)
+    since = board.built_at - timedelta(days=settings.TRENDING_WINDOW_DAYS)
+    weights = defaultdict(float)
+    for title_id, score, pub_date in scores:
+        if pub_date >= since:
+            weights[title_id] += score * trending_weight(
+                pub_date, board.built_at
+            )
+    created = 0
+    for title_id, weight in weights.items():
+        updated = LeaderboardEntry.objects.filter(
+            leaderboard=board, title_id=title_id
+        ).update(value=F('value') + weight)
+        if not updated and weight > 0:
+            LeaderboardEntry.objects.create(
+                leaderboard=board, title_id=title_id, value=weight
+            )
+            created += 1
+    _resize({board.pk: created})
+
+
+def _replace_entries(slug, values, built_at):
+    board, _ = Leaderboard.objects.get_or_create(slug=slug)
+    board.entries.all()._raw_delete(board.entries.db)
+    LeaderboardEntry.objects.bulk_create(
+        LeaderboardEntry(leaderboard=board, title_id=title_id, value=value)
+        for title_id, value in values.items()
+    )
+    board.built_at = built_at
+    board.size = len(values)
+    board.save()
+
+
+def top_values():
+    """Рейтинги произведений для всех рейтингов лучших:
+    {ключ: {id: значение}}."""
+    boards = defaultdict(dict)
+    ratings = Title.objects.filter(rating__isnull=False).values_list(
+        'pk', 'rating', 'category__slug'
+    )
+    for title_id, rating, category in ratings:
+        boards[TOP][title_id] = rating
+        if category is not None:
+            boards[category_board(category)][title_id] = rating
+    genres = Title.genre.through.objects.filter(
+        title_id__in=list(boards[TOP])
+    ).values_list('title_id', 'genre__slug')
+    for title_id, genre in genres:
+        boards[genre_board(genre)][title_id] = boards[TOP][title_id]
+    return boards
+
+
+def trending_values(built_at):
+    values = defaultdict(float)
+    recent = Review.objects.filter(
+        pub_date__gte=built_at - timedelta(
+            days=settings.TRENDING_WINDOW_DAYS)
+    ).values_list('title_id', 'score', 'pub_date')
+    for title_id, score, pub_date in recent:
+        values[title_id] += score * trending_weight(pub_date, built_at)
+    return values
+
+
+def rebuild():
+    """Полный пересчёт всех рейтингов. Возвращает число рейтингов."""
+    built_at = timezone.now()
+    boards = top_values()
+    boards[TRENDING] = trending_values(built_at)
+    with transaction.atomic():
+        Leaderboard.objects.exclude(slug__in=list(boards)).delete()
+        for slug, values in boards.items():
+            _replace_entries(slug, values, built_at)
+    return len(boards)
@@ -0,0 +1,38 @@
+import os
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from reviews import similarity
+
+
+class Command(BaseCommand):
+    help = ('Пересчёт похожих произведений по оценкам пользователей. '
+            'По умолчанию только для произведений с изменившимися отзывами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='пересчитать все произведения'
+        )
+        parser.add_argument(
+            '--top-k', type=int, default=settings.SIMILAR_TITLES_COUNT,
+            help='сколько соседей хранить для произведения'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=512,
+            help='размер блока произведений на одно умножение матриц'
+        )
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count(),
+            help='число параллельных процессов'
+        )
+
+    def handle(self, *args, **options):
+        count = similarity.build(
+            options['full'], options['top_k'],
+            options['chunk_size'], options['processes']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлены похожие для произведений: {count}'
+        ))
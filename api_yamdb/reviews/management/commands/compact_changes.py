@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from reviews import changes
+
+
+class Command(BaseCommand):
+    help = ('Сжатие журнала изменений: нумерует записи, не получившие '
+            'номер, и удаляет старые записи, перекрытые более новой '
+            'записью о том же объекте. Запускается периодически.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.CHANGES_COMPACT_AFTER_DAYS,
+            help='сжимать записи старше этого числа дней'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='сколько записей удалять одним запросом'
+        )
+
+    def handle(self, *args, **options):
+        changes.publish()
+        removed = changes.compact(options['days'], options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено записей журнала: {removed}'
+        ))
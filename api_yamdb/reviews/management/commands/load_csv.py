@@ -1,31 +1,37 @@
-import csv
+from django.core.management import BaseCommand, call_command
+from django.core.management.color import no_style
+from django.db import connection, transaction
 
-from django.conf import settings
-from django.core.management import BaseCommand
+from reviews import csvsync
 
-from reviews.models import Category, Comment, Genre, Review, Title
-from user.models import User
-
-
-TABLES = {
-    User: 'users.csv',
-    Category: 'category.csv',
-    Genre: 'genre.csv',
-    Title: 'titles.csv',
-    Review: 'review.csv',
-    Comment: 'comments.csv',
-}
+# bulk_create не вызывает сигналы, поэтому счётчики и агрегаты
+# пересчитываются после загрузки.
+RECOMPUTE = (
+    'reconcile_counters',
+    'recompute_ratings',
+    'rebuild_histograms',
+    'recompute_user_activity',
+)
 
 
 class Command(BaseCommand):
+    help = ('Полная загрузка выгрузки CSV из static/data. Последующие '
+            'выгрузки применяет sync_csv.')
+
     def handle(self, *args, **kwargs):
-        for model, csv_f in TABLES.items():
-            with open(
-                f'{settings.BASE_DIR}/static/data/{csv_f}',
-                'r',
-                encoding='utf-8'
-            ) as csv_file:
-                reader = csv.DictReader(csv_file)
-                model.objects.bulk_create(
-                    model(**data) for data in reader)
+        path = csvsync.default_path()
+        with transaction.atomic():
+            for model, csv_f, columns in csvsync.TABLES:
+                csvsync.create(
+                    model, columns, list(csvsync.read_rows(path, csv_f))
+                )
+            # Первичные ключи взяты из CSV — сдвигаем последовательности.
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(
+                    no_style(), [model for model, _, _ in csvsync.TABLES]
+                ):
+                    cursor.execute(sql)
+        csvsync.record_baseline(path, chunk_size=1000)
+        for command in RECOMPUTE:
+            call_command(command, stdout=self.stdout)
         self.stdout.write(self.style.SUCCESS('Все данные загружены'))
@@ -0,0 +1,18 @@
+from django.core.management import BaseCommand
+
+from reviews import deletion
+from reviews.models import DeletionJob
+
+
+class Command(BaseCommand):
+    help = ('Доделывает фоновые удаления, прерванные перезапуском или '
+            'ошибкой. Запускается периодически.')
+
+    def handle(self, *args, **options):
+        job_ids = DeletionJob.objects.exclude(
+            status=DeletionJob.DONE
+        ).order_by('pk').values_list('pk', flat=True)
+        done = sum(deletion.run(job_id) for job_id in job_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано удалений: {done}'
+        ))
@@ -0,0 +1,30 @@
+from django.core.management import BaseCommand
+
+from reviews import histograms
+
+
+class Command(BaseCommand):
+    help = ('Пересчёт распределений оценок всех произведений по отзывам. '
+            'С --check только сообщает о расхождениях.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='только проверить, ничего не изменяя'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='сколько строк читать и обновлять одним запросом'
+        )
+
+    def handle(self, *args, **options):
+        drifted = histograms.rebuild(
+            options['chunk_size'], check_only=options['check']
+        )
+        if options['check']:
+            message = f'Расхождений в распределениях оценок: {drifted}'
+            style = self.style.WARNING if drifted else self.style.SUCCESS
+        else:
+            message = f'Исправлено распределений оценок: {drifted}'
+            style = self.style.SUCCESS
+        self.stdout.write(style(message))
@@ -0,0 +1,12 @@
+from django.core.management import BaseCommand
+
+from reviews import leaderboards
+
+
+class Command(BaseCommand):
+    help = ('Полный пересчёт рейтингов лучших и популярных произведений. '
+            'Запускается периодически, например из cron.')
+
+    def handle(self, *args, **kwargs):
+        count = leaderboards.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано рейтингов: {count}'))
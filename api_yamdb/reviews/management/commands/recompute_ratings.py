@@ -0,0 +1,23 @@
+from django.core.management import BaseCommand
+
+from reviews import leaderboards, ratings
+
+
+class Command(BaseCommand):
+    help = ('Пересчёт общих параметров и рейтингов всех произведений по '
+            'их числу и сумме оценок, затем рейтингов лучших. Сами '
+            'агрегаты сверяет reconcile_counters. Запускается '
+            'периодически и после загрузки данных из CSV.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='сколько произведений обновлять в одной транзакции'
+        )
+
+    def handle(self, *args, **options):
+        count = ratings.recompute_all(options['chunk_size'])
+        leaderboards.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитаны рейтинги произведений: {count}'
+        ))
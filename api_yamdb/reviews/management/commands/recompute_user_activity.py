@@ -0,0 +1,21 @@
+from django.core.management import BaseCommand
+
+from reviews import activity
+
+
+class Command(BaseCommand):
+    help = ('Пересчёт с нуля числа отзывов, суммы оценок и числа '
+            'комментариев пользователей. Запускается после загрузки '
+            'данных из CSV.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='сколько пользователей обновлять одним запросом'
+        )
+
+    def handle(self, *args, **options):
+        count = activity.recompute_all(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитаны счётчики пользователей: {count}'
+        ))
@@ -0,0 +1,36 @@
+from django.core.management import BaseCommand
+
+from reviews import counters
+
+
+class Command(BaseCommand):
+    help = ('Сверка числа и суммы оценок произведений и числа '
+            'комментариев отзывов с данными. С --check только сообщает '
+            'о расхождениях.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='только проверить, ничего не изменяя'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='сколько строк сверять в одной транзакции'
+        )
+
+    def handle(self, *args, **options):
+        drifted = counters.reconcile(
+            options['chunk_size'], check_only=options['check']
+        )
+        total = sum(drifted.values())
+        details = (
+            f'произведений: {drifted["titles"]}, '
+            f'отзывов: {drifted["reviews"]}'
+        )
+        if options['check']:
+            message = f'Расхождений в счётчиках — {details}'
+            style = self.style.WARNING if total else self.style.SUCCESS
+        else:
+            message = f'Исправлены счётчики — {details}'
+            style = self.style.SUCCESS
+        self.stdout.write(style(message))
@@ -0,0 +1,51 @@
+from django.core.management import BaseCommand
+
+from reviews import csvsync
+
+
+class Command(BaseCommand):
+    help = ('Применяет новую полную выгрузку CSV как разницу с предыдущей: '
+            'добавляет, изменяет и удаляет только изменившиеся строки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', default=csvsync.default_path(),
+            help='каталог с файлами выгрузки'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='сколько строк записывать в одной транзакции'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='только посчитать разницу, ничего не изменяя'
+        )
+        parser.add_argument(
+            '--baseline', action='store_true',
+            help='только запомнить хэши выгрузки, уже загруженной в базу'
+        )
+
+    def handle(self, *args, **options):
+        if options['baseline']:
+            csvsync.record_baseline(options['path'], options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS('Хэши выгрузки сохранены'))
+            return
+        sync = csvsync.Sync(options['path'], options['chunk_size'])
+        diffs = sync.run(dry_run=options['dry_run'])
+        totals = dict.fromkeys(('inserted', 'updated', 'deleted'), 0)
+        totals['unchanged'] = 0
+        for diff in diffs:
+            counts = diff.counts()
+            for key, value in counts.items():
+                totals[key] += value
+            self.stdout.write(
+                f'{diff.table:12} +{counts["inserted"]} '
+                f'~{counts["updated"]} -{counts["deleted"]} '
+                f'={counts["unchanged"]}'
+            )
+        verb = 'Будет изменено' if options['dry_run'] else 'Изменено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb}: добавлено {totals["inserted"]}, '
+            f'обновлено {totals["updated"]}, удалено {totals["deleted"]}, '
+            f'без изменений {totals["unchanged"]}'
+        ))
@@ -0,0 +1,42 @@
+import os
+
+from django.core.management import BaseCommand
+
+from reviews import recommendations
+
+
+class Command(BaseCommand):
+    help = ('Обучение модели персональных рекомендаций по оценкам. '
+            'Новая версия подхватывается веб-воркерами без перезапуска.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--factors', type=int, default=32,
+            help='размерность скрытых факторов'
+        )
+        parser.add_argument(
+            '--iterations', type=int, default=10,
+            help='число итераций ALS'
+        )
+        parser.add_argument(
+            '--regularization', type=float, default=0.1,
+            help='коэффициент регуляризации'
+        )
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count(),
+            help='число параллельных процессов'
+        )
+        parser.add_argument(
+            '--chunk-nnz', type=int, default=4096,
+            help='число оценок в одной пачке уравнений'
+        )
+
+    def handle(self, *args, **options):
+        users, titles = recommendations.train(
+            options['factors'], options['iterations'],
+            options['regularization'], options['processes'],
+            options['chunk_nnz']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Модель обучена: пользователей {users}, произведений {titles}'
+        ))
@@ -0,0 +1,14 @@
+class MaintainedFieldsMixin:
+    """Поля MAINTAINED_FIELDS ведут сигналы и массовые операции
+    запросами UPDATE. Обычное сохранение объекта их не перезаписывает,
+    чтобы не затереть параллельное обновление устаревшими значениями."""
+    MAINTAINED_FIELDS = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.MAINTAINED_FIELDS
+            ]
+        super().save(*args, **kwargs)
@@ -1,10 +1,42 @@
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.utils import timezone
 from users.models import User
 
+from .mixins import MaintainedFieldsMixin
 from .validators import validate_year
 
 
+SCORES = range(1, 11)
+
+
+def score_field(score):
+    return f'score_{score}'
+
+
+class VisibleManager(models.Manager):
+    """Менеджер по умолчанию: без объектов, помеченных на удаление.
+    Помеченные видны только через all_objects, пока их удаляет
+    фоновое задание."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleting=False)
+
+
+class ShownManager(models.Manager):
+    """Менеджер по умолчанию для отзывов и комментариев: без скрытых
+    модератором. Скрытые видны только через all_objects."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(hidden=False)
+
+    def alive(self):
+        """Без записей, которые удалит фоновое удаление произведения или
+        пользователя (условие ALIVE модели): пока оно идёт, они ещё в
+        базе, но читателям их показывать нельзя."""
+        return self.filter(self.model.ALIVE)
+
+
 class Category(models.Model):
     name = models.CharField(
         'имя категории',
@@ -15,6 +47,13 @@ class Category(models.Model):
         unique=True,
         db_index=True
     )
+    deleting = models.BooleanField(
+        'удаляется',
+        default=False
+    )
+
+    objects = VisibleManager()
+    all_objects = models.Manager()
 
     class Meta:
         verbose_name = 'Категория'
@@ -34,6 +73,13 @@ class Genre(models.Model):
         unique=True,
         db_index=True
     )
+    deleting = models.BooleanField(
+        'удаляется',
+        default=False
+    )
+
+    objects = VisibleManager()
+    all_objects = models.Manager()
 
     class Meta:
         verbose_name = 'Жанр'
@@ -43,7 +89,7 @@ class Genre(models.Model):
         return f'{self.name} {self.name}'
 
 
-class Title(models.Model):
+class Title(MaintainedFieldsMixin, models.Model):
     name = models.CharField(
         'название произведения',
         max_length=256,
@@ -51,7 +97,8 @@ class Title(models.Model):
     )
     year = models.IntegerField(
         'год',
-        validators=(validate_year, )
+        validators=(validate_year, ),
+        db_index=True
     )
     category = models.ForeignKey(
         Category,
@@ -69,19 +116,92 @@ class Title(models.Model):
     )
     genre = models.ManyToManyField(
         Genre,
+        through='TitleGenre',
         related_name='titles',
         verbose_name='жанр'
     )
+    similar_outdated = models.BooleanField(
+        'похожие произведения устарели',
+        default=True,
+        db_index=True
+    )
+    reviews_count = models.PositiveIntegerField(
+        'число отзывов',
+        default=0
+    )
+    score_sum = models.PositiveIntegerField(
+        'сумма оценок',
+        default=0
+    )
+    rating = models.FloatField(
+        'рейтинг',
+        null=True,
+        blank=True,
+        db_index=True
+    )
+    deleting = models.BooleanField(
+        'удаляется',
+        default=False
+    )
+
+    objects = VisibleManager()
+    all_objects = models.Manager()
+
+    MAINTAINED_FIELDS = (
+        'similar_outdated', 'reviews_count', 'score_sum', 'rating',
+    )
 
     class Meta:
         verbose_name = 'Произведение'
         verbose_name_plural = 'Произведения'
+        indexes = [
+            models.Index(
+                name='title_category_year_idx',
+                fields=['category', 'year'],
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
 
-class Review (models.Model):
+class TitleGenre(models.Model):
+    """Жанр произведения. Таблица та же, что была у автоматической
+    промежуточной модели; явная модель нужна ради индекса (жанр,
+    произведение) для фильтра по жанру."""
+    title = models.ForeignKey(
+        Title,
+        on_delete=models.CASCADE,
+        verbose_name='произведение'
+    )
+    genre = models.ForeignKey(
+        Genre,
+        on_delete=models.CASCADE,
+        verbose_name='жанр'
+    )
+
+    class Meta:
+        db_table = 'reviews_title_genre'
+        verbose_name = 'Жанр произведения'
+        verbose_name_plural = 'Жанры произведений'
+        constraints = [
+            models.UniqueConstraint(
+                name='unique_title_genre',
+                fields=['title', 'genre'],
+            ),
+        ]
+        indexes = [
+            models.Index(
+                name='title_genre_genre_idx',
+                fields=['genre', 'title'],
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.title} {self.genre}'
+
+
+class Review(MaintainedFieldsMixin, models.Model):
     """Класс Отзыв. Пользователь пишет отзывы на произведения.
     Отзыв должен быть привязан к конкретному произведению,
     на которое написан отзыв"""
@@ -111,6 +231,20 @@ class Review (models.Model):
         auto_now_add=True,
         db_index=True
     )
+    comments_count = models.PositiveIntegerField(
+        'число комментариев',
+        default=0
+    )
+    hidden = models.BooleanField(
+        'скрыт модератором',
+        default=False
+    )
+
+    objects = ShownManager()
+    all_objects = models.Manager()
+
+    MAINTAINED_FIELDS = ('comments_count', 'hidden')
+    ALIVE = models.Q(title__deleting=False, author__deleting=False)
 
     def __str__(self):
         return self.text
@@ -123,9 +257,19 @@ class Review (models.Model):
                 fields=['title', 'author'],
             ),
         ]
+        indexes = [
+            models.Index(
+                name='review_author_date_idx',
+                fields=['author', 'pub_date'],
+            ),
+            models.Index(
+                name='review_title_date_idx',
+                fields=['title', 'pub_date', 'id'],
+            ),
+        ]
 
 
-class Comment(models.Model):
+class Comment(MaintainedFieldsMixin, models.Model):
     """Класс Комментарии. Здесь будет описание комментариев пользователей
     к отзывам. Комментарии должны быть привязаны к конкретному отзыву."""
     review = models.ForeignKey(
@@ -149,6 +293,356 @@ class Comment(models.Model):
         auto_now_add=True,
         db_index=True
     )
+    hidden = models.BooleanField(
+        'скрыт модератором',
+        default=False
+    )
+
+    objects = ShownManager()
+    all_objects = models.Manager()
+
+    MAINTAINED_FIELDS = ('hidden',)
+    ALIVE = models.Q(
+        author__deleting=False,
+        review__author__deleting=False,
+        review__title__deleting=False,
+    )
 
     class Meta:
         ordering = ('pub_date',)
+        indexes = [
+            models.Index(
+                name='comment_author_date_idx',
+                fields=['author', 'pub_date'],
+            ),
+            models.Index(
+                name='comment_review_date_idx',
+                fields=['review', 'pub_date', 'id'],
+            ),
+        ]
+
+
+class ScoreHistogram(models.Model):
+    """Распределение оценок произведения: число отзывов с каждой оценкой
+    от 1 до 10. Счётчики ведут сигналы отзывов, команда
+    rebuild_histograms пересчитывает их с нуля."""
+    title = models.OneToOneField(
+        Title,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='histogram',
+        verbose_name='произведение'
+    )
+    score_1 = models.PositiveIntegerField('оценок 1', default=0)
+    score_2 = models.PositiveIntegerField('оценок 2', default=0)
+    score_3 = models.PositiveIntegerField('оценок 3', default=0)
+    score_4 = models.PositiveIntegerField('оценок 4', default=0)
+    score_5 = models.PositiveIntegerField('оценок 5', default=0)
+    score_6 = models.PositiveIntegerField('оценок 6', default=0)
+    score_7 = models.PositiveIntegerField('оценок 7', default=0)
+    score_8 = models.PositiveIntegerField('оценок 8', default=0)
+    score_9 = models.PositiveIntegerField('оценок 9', default=0)
+    score_10 = models.PositiveIntegerField('оценок 10', default=0)
+
+    class Meta:
+        verbose_name = 'Распределение оценок'
+        verbose_name_plural = 'Распределения оценок'
+
+    def counts(self):
+        return [getattr(self, score_field(score)) for score in SCORES]
+
+
+class Leaderboard(models.Model):
+    """Предрасчитанный рейтинг произведений: лучшие в целом, в категории,
+    в жанре или популярные на этой неделе. Значения хранятся в
+    LeaderboardEntry, built_at — момент последнего полного пересчёта."""
+    slug = models.CharField(
+        'ключ рейтинга',
+        max_length=64,
+        unique=True
+    )
+    built_at = models.DateTimeField(
+        'пересчитан',
+        default=timezone.now
+    )
+    size = models.PositiveIntegerField(
+        'число произведений',
+        default=0
+    )
+
+    class Meta:
+        verbose_name = 'Рейтинг'
+        verbose_name_plural = 'Рейтинги'
+
+    def __str__(self):
+        return self.slug
+
+
+class LeaderboardEntry(models.Model):
+    """Место произведения в рейтинге. Порядок задаёт value по убыванию,
+    индекс позволяет читать страницу рейтинга без сортировки."""
+    leaderboard = models.ForeignKey(
+        Leaderboard,
+        on_delete=models.CASCADE,
+        related_name='entries',
+        verbose_name='рейтинг'
+    )
+    title = models.ForeignKey(
+        Title,
+        on_delete=models.CASCADE,
+        related_name='leaderboard_entries',
+        verbose_name='произведение'
+    )
+    value = models.FloatField('значение')
+
+    class Meta:
+        verbose_name = 'Позиция в рейтинге'
+        verbose_name_plural = 'Позиции в рейтинге'
+        constraints = [
+            models.UniqueConstraint(
+                name='unique_leaderboard_title',
+                fields=['leaderboard', 'title'],
+            ),
+        ]
+        indexes = [
+            models.Index(
+                name='leaderboard_order_idx',
+                fields=['leaderboard', '-value', 'title'],
+            ),
+        ]
+
+
+class SimilarTitle(models.Model):
+    """Похожее произведение: его оценивали те же пользователи и
+    похожим образом. Заполняется командой build_similar_titles."""
+    title = models.ForeignKey(
+        Title,
+        on_delete=models.CASCADE,
+        related_name='similar_titles',
+        verbose_name='произведение'
+    )
+    similar = models.ForeignKey(
+        Title,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='похожее произведение'
+    )
+    score = models.FloatField('сходство')
+
+    class Meta:
+        verbose_name = 'Похожее произведение'
+        verbose_name_plural = 'Похожие произведения'
+        constraints = [
+            models.UniqueConstraint(
+                name='unique_similar_title',
+                fields=['title', 'similar'],
+            ),
+        ]
+        indexes = [
+            models.Index(
+                name='similar_title_order_idx',
+                fields=['title', '-score'],
+            ),
+        ]
+
+
+class RatingPriors(models.Model):
+    """Общие для всех произведений параметры рейтинга: средняя оценка
+    по сайту и вес априорной оценки. Одна запись, пересчитывается
+    командой recompute_ratings."""
+    mean = models.FloatField(
+        'средняя оценка',
+        default=0
+    )
+    votes = models.FloatField(
+        'вес априорной оценки',
+        default=0
+    )
+    computed_at = models.DateTimeField(
+        'пересчитаны',
+        auto_now=True
+    )
+
+    class Meta:
+        verbose_name = 'Параметры рейтинга'
+        verbose_name_plural = 'Параметры рейтинга'
+
+
+class DeletionJob(models.Model):
+    """Фоновое удаление произведения, пользователя, категории или жанра
+    вместе с зависимыми записями. total и deleted показывают ход
+    удаления."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [
+        (PENDING, PENDING),
+        (RUNNING, RUNNING),
+        (DONE, DONE),
+        (FAILED, FAILED),
+    ]
+
+    model = models.CharField(
+        'тип объекта',
+        max_length=16
+    )
+    object_id = models.PositiveIntegerField('id объекта')
+    name = models.CharField(
+        'объект',
+        max_length=256
+    )
+    status = models.CharField(
+        'состояние',
+        max_length=16,
+        choices=STATUSES,
+        default=PENDING,
+        db_index=True
+    )
+    total = models.PositiveIntegerField(
+        'всего записей',
+        null=True,
+        blank=True
+    )
+    deleted = models.PositiveIntegerField(
+        'обработано записей',
+        default=0
+    )
+    error = models.TextField(
+        'ошибка',
+        blank=True
+    )
+    created_at = models.DateTimeField(
+        'создано',
+        auto_now_add=True
+    )
+    updated_at = models.DateTimeField(
+        'обновлено',
+        auto_now=True
+    )
+    finished_at = models.DateTimeField(
+        'завершено',
+        null=True,
+        blank=True
+    )
+
+    class Meta:
+        verbose_name = 'Удаление'
+        verbose_name_plural = 'Удаления'
+
+    def __str__(self):
+        return f'{self.model} {self.name}'
+
+
+class Change(models.Model):
+    """Запись журнала изменений каталога для синхронизации клиентов.
+    Номер seq выдаётся после коммита (см. reviews.changes) и растёт
+    монотонно без пропусков, key — путь объекта в API."""
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    ACTIONS = [
+        (CREATE, CREATE),
+        (UPDATE, UPDATE),
+        (DELETE, DELETE),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    seq = models.BigIntegerField(
+        'номер',
+        null=True,
+        unique=True
+    )
+    model = models.CharField(
+        'тип объекта',
+        max_length=16
+    )
+    object_id = models.PositiveIntegerField('id объекта')
+    key = models.CharField(
+        'путь объекта',
+        max_length=128
+    )
+    action = models.CharField(
+        'действие',
+        max_length=8,
+        choices=ACTIONS
+    )
+    created_at = models.DateTimeField(
+        'время изменения',
+        default=timezone.now
+    )
+
+    class Meta:
+        verbose_name = 'Изменение'
+        verbose_name_plural = 'Изменения'
+        indexes = [
+            models.Index(
+                name='change_object_idx',
+                fields=['model', 'object_id', 'seq'],
+            ),
+            models.Index(
+                name='change_pending_idx',
+                fields=['id'],
+                condition=models.Q(seq__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.seq} {self.action} {self.key}'
+
+
+class ChangeSequence(models.Model):
+    """Последний выданный номер журнала изменений. Одна запись: её
+    блокировка упорядочивает выдачу номеров."""
+    last = models.BigIntegerField(
+        'последний номер',
+        default=0
+    )
+
+    class Meta:
+        verbose_name = 'Номер журнала изменений'
+        verbose_name_plural = 'Номер журнала изменений'
+
+
+class AccessStat(models.Model):
+    """Сколько раз запрашивали адрес API (путь с отсортированными
+    параметрами). По этой статистике warm_cache прогревает самые частые
+    ответы после выкладки."""
+    path = models.CharField(
+        'адрес',
+        max_length=512,
+        unique=True
+    )
+    hits = models.BigIntegerField('запросов', default=0)
+    last_seen = models.DateTimeField(
+        'последний запрос',
+        default=timezone.now
+    )
+
+    class Meta:
+        verbose_name = 'Статистика запросов'
+        verbose_name_plural = 'Статистика запросов'
+
+    def __str__(self):
+        return f'{self.path}: {self.hits}'
+
+
+class RowHash(models.Model):
+    """Хэш строки последней синхронизированной выгрузки CSV: table —
+    имя файла без .csv, row_id — значение столбца id."""
+    table = models.CharField('таблица', max_length=32)
+    row_id = models.BigIntegerField('id строки')
+    digest = models.CharField('хэш', max_length=32)
+
+    class Meta:
+        verbose_name = 'Хэш строки выгрузки'
+        verbose_name_plural = 'Хэши строк выгрузки'
+        constraints = [
+            models.UniqueConstraint(
+                name='unique_row_hash',
+                fields=['table', 'row_id'],
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.table}:{self.row_id}'
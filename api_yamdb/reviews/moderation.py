@@ -0,0 +1,165 @@
+"""Массовая модерация отзывов и комментариев.
+
+Модератор удаляет, скрывает или возвращает записи по списку id, все
+записи автора или записи автора за период. Записи обрабатываются
+пачками по MODERATION_CHUNK_SIZE, каждая пачка — в своей транзакции:
+строки пачки блокируются и удаляются (скрываются) одним запросом, а в
+той же транзакции по данным пересчитываются затронутые агрегаты — число
+и сумма оценок и рейтинг произведений, распределения оценок, trending,
+число комментариев отзывов и счётчики активности авторов. Сигналы при
+этом не вызываются: построчные обработчики делали бы по несколько
+запросов на каждую запись.
+
+Скрытые записи не видны через менеджер objects и не входят в агрегаты
+и ленту, возврат (unhide) добавляет их обратно. В журнал изменений скрытие
+пишется как удаление, возврат — как создание.
+"""
+from django.conf import settings
+from django.db import transaction
+
+from . import (activity, autocomplete, changes, counters, feed,
+               histograms, leaderboards)
+from .models import Change, Comment, Review, Title
+
+DELETE = 'delete'
+HIDE = 'hide'
+UNHIDE = 'unhide'
+ACTIONS = (DELETE, HIDE, UNHIDE)
+KINDS = {'reviews': Review, 'comments': Comment}
+LOGGED_AS = {DELETE: Change.DELETE, HIDE: Change.DELETE,
+             UNHIDE: Change.CREATE}
+
+
+def select(model, action, ids=None, author=None, since=None, until=None):
+    """Записи model, к которым применимо действие: по списку id, автору
+    и периоду [since, until)."""
+    lookups = {}
+    if action != DELETE:
+        lookups['hidden'] = action == UNHIDE
+    if ids is not None:
+        lookups['pk__in'] = ids
+    if author is not None:
+        lookups['author'] = author
+    if since is not None:
+        lookups['pub_date__gte'] = since
+    if until is not None:
+        lookups['pub_date__lt'] = until
+    return model.all_objects.filter(**lookups)
+
+
+def raw_delete(queryset):
+    # Без сигналов и без сбора каскада в память: зависимые комментарии
+    # удаляются отдельно, агрегаты пересчитываются для всей пачки.
+    queryset._raw_delete(queryset.db)
+
+
+class Moderation:
+    """Действие action над записями queryset (результат select)."""
+
+    def __init__(self, queryset, action, chunk_size=None):
+        self.queryset = queryset
+        self.model = queryset.model
+        self.action = action
+        self.chunk_size = chunk_size or settings.MODERATION_CHUNK_SIZE
+        self.processed = 0
+        self.cascaded = 0
+        self.titles = set()
+        self.reviews = set()
+        self.users = set()
+
+    def run(self):
+        """Применяет действие. Возвращает сводку."""
+        apply = (
+            self.apply_reviews if self.model is Review
+            else self.apply_comments
+        )
+        for pks in counters.chunks(self.queryset, self.chunk_size):
+            with transaction.atomic():
+                apply(pks)
+        return self.summary()
+
+    def summary(self):
+        return {
+            'action': self.action,
+            'processed': self.processed,
+            'cascaded_comments': self.cascaded,
+            'titles': len(self.titles),
+            'reviews': len(self.reviews),
+            'users': len(self.users),
+        }
+
+    def lock(self, pks, fields):
+        """Строки пачки, которые всё ещё подходят под выборку."""
+        rows = list(self.queryset.filter(
+            pk__in=pks
+        ).select_for_update().order_by('pk').values_list('pk', *fields))
+        self.processed += len(rows)
+        return rows
+
+    def mark(self, model, pks):
+        """Удаляет или скрывает (возвращает) записи pks."""
+        if not pks:
+            return
+        changes.record_many(model, pks, LOGGED_AS[self.action])
+        rows = model.all_objects.filter(pk__in=pks)
+        if self.action == DELETE:
+            raw_delete(rows)
+        else:
+            rows.update(hidden=self.action == HIDE)
+        kind = feed.REVIEW if model is Review else feed.COMMENT
+        if self.action == UNHIDE:
+            transaction.on_commit(lambda: feed.restore_many(kind, pks))
+        else:
+            transaction.on_commit(lambda: feed.remove_many(kind, pks))
+
+    def apply_reviews(self, pks):
+        rows = self.lock(pks, ('title_id', 'author_id', 'score',
+                               'pub_date', 'hidden'))
+        if not rows:
+            return
+        pks = [pk for pk, *_ in rows]
+        title_ids = {title_id for _, title_id, *_ in rows}
+        user_ids = {author_id for _, _, author_id, *_ in rows}
+        sign = 1 if self.action == UNHIDE else -1
+        scores = [
+            (title_id, sign * score, pub_date)
+            for _, title_id, _, score, pub_date, hidden in rows
+            if self.action == UNHIDE or not hidden
+        ]
+        if self.action == DELETE:
+            comments = Comment.all_objects.filter(review_id__in=pks)
+            comment_rows = list(comments.values_list('pk', 'author_id'))
+            self.cascaded += len(comment_rows)
+            user_ids.update(author_id for _, author_id in comment_rows)
+            self.mark(Comment, [pk for pk, _ in comment_rows])
+        self.mark(Review, pks)
+        counters.reconcile_titles(title_ids, check_only=False)
+        histograms.refresh(title_ids)
+        leaderboards.add_trending_many(scores)
+        activity.refresh_users(user_ids)
+        Title.all_objects.filter(pk__in=title_ids).update(
+            similar_outdated=True
+        )
+        entries = []
+        for title in Title.objects.filter(
+            pk__in=title_ids
+        ).select_related('category').prefetch_related('genre'):
+            leaderboards.refresh_title(title)
+            entries.append(autocomplete.title_entry(title))
+        transaction.on_commit(
+            lambda: autocomplete.index.upsert_many(entries, shared=False)
+        )
+        self.titles.update(title_ids)
+        self.users.update(user_ids)
+
+    def apply_comments(self, pks):
+        rows = self.lock(pks, ('review_id', 'author_id'))
+        if not rows:
+            return
+        review_ids = {review_id for _, review_id, _ in rows}
+        user_ids = {author_id for _, _, author_id in rows}
+        self.mark(Comment, [pk for pk, _, _ in rows])
+        counters.reconcile_reviews(review_ids, check_only=False)
+        activity.refresh_users(user_ids)
+        self.reviews.update(review_ids)
+        self.users.update(user_ids)
@@ -0,0 +1,138 @@
+"""Рейтинг произведения по сохранённым сумме и числу оценок.
+
+Стратегия выбирается настройкой RATING_STRATEGY:
+
+* mean — обычная средняя оценка;
+* bayesian — взвешенная оценка IMDb: средняя произведения, сдвинутая к
+  средней по сайту тем сильнее, чем меньше у произведения оценок;
+* wilson — нижняя граница доверительного интервала Уилсона для доли
+  «положительности» оценки, переведённая обратно в шкалу 1–10.
+
+Формулы записаны только арифметикой, поэтому одинаково считают и одно
+произведение в сигнале, и массивы numpy в пакетном пересчёте.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .lazy import LazyModule
+from .models import RatingPriors, Title
+
+np = LazyModule('numpy')
+
+MIN_SCORE = 1
+MAX_SCORE = 10
+
+
+class MeanRating:
+
+    def rate(self, score_sum, count, priors):
+        return score_sum / count
+
+
+class BayesianRating:
+
+    def rate(self, score_sum, count, priors):
+        return (
+            (score_sum + priors.votes * priors.mean)
+            / (count + priors.votes)
+        )
+
+
+class WilsonRating:
+    z = 1.96
+
+    def rate(self, score_sum, count, priors):
+        share = (score_sum / count - MIN_SCORE) / (MAX_SCORE - MIN_SCORE)
+        spread = self.z ** 2 / count
+        lower = (
+            share + spread / 2
+            - self.z * (share * (1 - share) / count + spread / count / 4)
+            ** 0.5
+        ) / (1 + spread)
+        return MIN_SCORE + lower * (MAX_SCORE - MIN_SCORE)
+
+
+STRATEGIES = {
+    'mean': MeanRating(),
+    'bayesian': BayesianRating(),
+    'wilson': WilsonRating(),
+}
+
+
+def get_strategy():
+    return STRATEGIES[settings.RATING_STRATEGY]
+
+
+def current_priors():
+    return RatingPriors.objects.first() or RatingPriors()
+
+
+def rate(score_sum, count, priors=None):
+    """Рейтинг одного произведения; None, если оценок нет."""
+    if not count:
+        return None
+    return get_strategy().rate(score_sum, count, priors or current_priors())
+
+
+def apply_scores(title_id, count_delta, sum_delta):
+    """Атомарно сдвигает агрегаты произведения и пересчитывает рейтинг.
+    Возвращает обновлённое произведение или None, если его уже нет."""
+    Title.objects.filter(pk=title_id).update(
+        reviews_count=F('reviews_count') + count_delta,
+        score_sum=F('score_sum') + sum_delta
+    )
+    title = Title.objects.select_related('category').filter(
+        pk=title_id
+    ).first()
+    if title is None:
+        return None
+    title.rating = rate(title.score_sum, title.reviews_count)
+    Title.objects.filter(pk=title_id).update(rating=title.rating)
+    return title
+
+
+def recompute_all(chunk_size):
+    """Пересчитывает общие параметры и рейтинги всех произведений по их
+    числу и сумме оценок. Возвращает число произведений.
+
+    Сами агрегаты поддерживают сигналы (apply_scores) и сверяет
+    reconcile_counters; здесь они только читаются — под блокировкой
+    строк пачки, поэтому отзыв, сохранённый во время пересчёта, не
+    теряется и получает рейтинг по своим агрегатам."""
+    title_ids, counts, sums = np.array(
+        list(Title.objects.order_by('pk').values_list(
+            'pk', 'reviews_count', 'score_sum'
+        )), dtype=np.int64
+    ).reshape(-1, 3).T
+    rated = counts > 0
+    priors = current_priors()
+    priors.mean = float(sums.sum() / counts.sum()) if rated.any() else 0
+    priors.votes = float(np.quantile(
+        counts[rated], settings.RATING_PRIOR_QUANTILE
+    )) if rated.any() else 0
+    priors.save()
+    for start in range(0, len(title_ids), chunk_size):
+        with transaction.atomic():
+            pks, counts, sums = np.array(
+                list(Title.objects.select_for_update().filter(
+                    pk__in=title_ids[start:start + chunk_size].tolist()
+                ).order_by('pk').values_list(
+                    'pk', 'reviews_count', 'score_sum'
+                )), dtype=np.int64
+            ).reshape(-1, 3).T
+            rated = counts > 0
+            ratings = np.full(len(pks), np.nan)
+            ratings[rated] = get_strategy().rate(
+                sums[rated], counts[rated], priors
+            )
+            Title.objects.bulk_update(
+                [
+                    Title(pk=int(pk), rating=(
+                        float(rating) if is_rated else None
+                    ))
+                    for pk, rating, is_rated in zip(pks, ratings, rated)
+                ],
+                ['rating']
+            )
+    return len(title_ids)
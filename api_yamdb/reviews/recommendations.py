@@ -0,0 +1,204 @@
+"""Персональные рекомендации произведений.
+
+Матрица оценок раскладывается методом чередующихся наименьших квадратов
+(ALS): оценка пользователя u произведению t приближается как
+mean + U[u] · T[t]. На каждом полушаге все строки одной стороны
+решаются пачками: матрица Грама каждой строки собирается произведением
+F.T @ F её факторов, матрицы пачки решаются одним вызовом
+np.linalg.solve, пачки распределяются по процессам.
+
+Обученные матрицы сохраняются в .npy в отдельный каталог версии, файл
+CURRENT указывает на последнюю версию. Веб-воркеры открывают матрицы
+через mmap, поэтому память с данными общая для всех процессов, а новая
+версия подхватывается без перезапуска.
+"""
+import json
+import multiprocessing
+import os
+import shutil
+
+from django.conf import settings
+from django.utils import timezone
+
+from .lazy import LazyModule
+from .leaderboards import TOP
+from .models import LeaderboardEntry, Review
+from .similarity import review_arrays
+
+np = LazyModule('numpy')
+sparse = LazyModule('scipy.sparse')
+
+CURRENT = 'CURRENT'
+
+_rows = None
+_other = None
+_model = None
+
+
+def _solve_chunk(start, end, regularization):
+    """Решает нормальные уравнения ALS для строк [start, end)."""
+    indptr, indices, data = _rows
+    size = _other.shape[1]
+    gram = np.empty((end - start, size, size))
+    rhs = np.empty((end - start, size))
+    # Матрица Грама строки — F.T @ F по её ненулевым: память O(nnz·k),
+    # а не O(nnz·k²), даже для произведения со всеми отзывами в пачке.
+    for row in range(start, end):
+        low, high = indptr[row], indptr[row + 1]
+        factors = _other[indices[low:high]]
+        gram[row - start] = factors.T @ factors
+        rhs[row - start] = factors.T @ data[low:high]
+    counts = np.diff(indptr[start:end + 1])
+    gram += regularization * counts[:, None, None] * np.eye(size)
+    return np.linalg.solve(gram, rhs[..., None])[..., 0]
+
+
+def _solve(matrix, other, regularization, processes, chunk_nnz):
+    """Новые факторы для всех строк matrix при фиксированных other."""
+    global _rows, _other
+    _rows = (matrix.indptr, matrix.indices, matrix.data)
+    _other = other
+    bounds = np.unique(np.append(
+        np.searchsorted(
+            matrix.indptr, np.arange(0, matrix.nnz, chunk_nnz), 'right'
+        ) - 1,
+        matrix.shape[0]
+    ))
+    tasks = [
+        (start, end, regularization)
+        for start, end in zip(bounds[:-1], bounds[1:])
+    ]
+    if processes > 1 and len(tasks) > 1:
+        with multiprocessing.get_context('fork').Pool(processes) as pool:
+            parts = pool.starmap(_solve_chunk, tasks)
+    else:
+        parts = [_solve_chunk(*task) for task in tasks]
+    return np.vstack(parts)
+
+
+def train(factors, iterations, regularization, processes, chunk_nnz):
+    """Обучает модель и сохраняет её новой версией. Возвращает число
+    пользователей и произведений в модели."""
+    authors, titles, scores = review_arrays(chunk_size=2000)
+    if not len(scores):
+        return 0, 0
+    user_ids, user_index = np.unique(authors, return_inverse=True)
+    title_ids, title_index = np.unique(titles, return_inverse=True)
+    mean = scores.mean()
+    by_user = sparse.csr_matrix(
+        (scores - mean, (user_index, title_index)),
+        shape=(len(user_ids), len(title_ids))
+    )
+    by_title = by_user.T.tocsr()
+    random = np.random.default_rng(0)
+    user_factors = random.normal(0, 0.1, (len(user_ids), factors))
+    title_factors = random.normal(0, 0.1, (len(title_ids), factors))
+    for _ in range(iterations):
+        user_factors = _solve(
+            by_user, title_factors, regularization, processes, chunk_nnz
+        )
+        title_factors = _solve(
+            by_title, user_factors, regularization, processes, chunk_nnz
+        )
+    save(user_ids, title_ids, user_factors, title_factors, mean)
+    return len(user_ids), len(title_ids)
+
+
+def save(user_ids, title_ids, user_factors, title_factors, mean):
+    root = settings.RECOMMENDATIONS_DIR
+    version = timezone.now().strftime('%Y%m%d%H%M%S%f')
+    path = os.path.join(root, version)
+    os.makedirs(path)
+    np.save(os.path.join(path, 'user_ids.npy'), user_ids)
+    np.save(os.path.join(path, 'title_ids.npy'), title_ids)
+    np.save(
+        os.path.join(path, 'user_factors.npy'),
+        user_factors.astype(np.float32)
+    )
+    np.save(
+        os.path.join(path, 'title_factors.npy'),
+        title_factors.astype(np.float32)
+    )
+    with open(os.path.join(path, 'meta.json'), 'w') as meta:
+        json.dump({'mean': float(mean)}, meta)
+    previous = current_version()
+    pointer = os.path.join(root, f'{CURRENT}.tmp')
+    with open(pointer, 'w') as current:
+        current.write(version)
+    os.replace(pointer, os.path.join(root, CURRENT))
+    for name in os.listdir(root):
+        if name not in (version, previous, CURRENT):
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+class FactorModel:
+    """Обученная модель, открытая через mmap."""
+
+    def __init__(self, path):
+        def load(name):
+            return np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+
+        self.user_ids = load('user_ids')
+        self.title_ids = load('title_ids')
+        self.user_factors = load('user_factors')
+        self.title_factors = load('title_factors')
+
+    def recommend(self, user_id, exclude_ids, count):
+        """id лучших для пользователя произведений, кроме exclude_ids.
+        Пустой список, если пользователя нет в модели."""
+        row = np.searchsorted(self.user_ids, user_id)
+        if row == len(self.user_ids) or self.user_ids[row] != user_id:
+            return []
+        scores = self.title_factors @ self.user_factors[row]
+        excluded = np.searchsorted(self.title_ids, exclude_ids)
+        excluded = excluded[excluded < len(self.title_ids)]
+        excluded = excluded[np.isin(self.title_ids[excluded], exclude_ids)]
+        scores[excluded] = -np.inf
+        count = min(count, len(scores) - len(excluded))
+        if count <= 0:
+            return []
+        best = np.argpartition(-scores, count - 1)[:count]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return self.title_ids[best].tolist()
+
+
+def current_version():
+    try:
+        with open(os.path.join(settings.RECOMMENDATIONS_DIR, CURRENT)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def current_model():
+    """Последняя обученная модель или None, если обучения ещё не было."""
+    global _model
+    version = current_version()
+    if version is None:
+        return None
+    if _model is None or _model[0] != version:
+        _model = (version, FactorModel(
+            os.path.join(settings.RECOMMENDATIONS_DIR, version)
+        ))
+    return _model[1]
+
+
+def popular(exclude_ids, count):
+    """Лучшие произведения из рейтинга — для новых пользователей."""
+    return list(LeaderboardEntry.objects.filter(
+        leaderboard__slug=TOP
+    ).exclude(title_id__in=exclude_ids).order_by(
+        '-value', 'title_id'
+    ).values_list('title_id', flat=True)[:count])
+
+
+def recommend(user, count):
+    """id рекомендованных пользователю произведений."""
+    reviewed = list(Review.objects.filter(
+        author=user
+    ).values_list('title_id', flat=True))
+    model = current_model()
+    title_ids = []
+    if model is not None:
+        title_ids = model.recommend(user.pk, reviewed, count)
+    return title_ids or popular(reviewed, count)
@@ -0,0 +1,192 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from . import (activity, autocomplete, changes, facets, feed, histograms,
+               leaderboards, ratings)
+from .models import Category, Change, Comment, Genre, Review, Title
+
+
+def update_popularity(title):
+    """Популярность произведения в подсказках — после коммита: откат не
+    должен менять индекс."""
+    entry = autocomplete.title_entry(title)
+    transaction.on_commit(
+        lambda: autocomplete.index.upsert(entry, shared=False)
+    )
+
+
+@receiver(pre_save, sender=Review)
+def remember_previous_score(sender, instance, **kwargs):
+    """Сохраняет оценку до изменения, чтобы пересчитывать агрегаты
+    на разницу, а не заново по всем отзывам."""
+    instance.previous_score = None
+    if instance.pk is not None:
+        instance.previous_score = Review.objects.filter(
+            pk=instance.pk
+        ).values_list('score', flat=True).first()
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, **kwargs):
+    previous_score = getattr(instance, 'previous_score', None) or 0
+    if instance.hidden or instance.score == previous_score:
+        return
+    activity.apply_review(
+        instance.author_id, int(created), instance.score - previous_score
+    )
+    title = ratings.apply_scores(
+        instance.title_id, int(created), instance.score - previous_score
+    )
+    deltas = {instance.score: 1}
+    if previous_score:
+        deltas[previous_score] = -1
+    histograms.apply(instance.title_id, deltas)
+    Title.objects.filter(pk=instance.title_id).update(similar_outdated=True)
+    leaderboards.refresh_title(title)
+    leaderboards.add_trending(
+        instance.title_id,
+        instance.score - previous_score,
+        instance.pub_date
+    )
+    update_popularity(title)
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    # Скрытый отзыв уже вычтен из агрегатов при скрытии.
+    if instance.hidden:
+        return
+    activity.apply_review(instance.author_id, -1, -instance.score)
+    title = ratings.apply_scores(instance.title_id, -1, -instance.score)
+    if title is None:
+        return
+    histograms.apply(instance.title_id, {instance.score: -1})
+    Title.objects.filter(pk=title.pk).update(similar_outdated=True)
+    leaderboards.refresh_title(title)
+    leaderboards.add_trending(
+        instance.title_id, -instance.score, instance.pub_date
+    )
+    update_popularity(title)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_save, sender=Comment)
+def feed_item_saved(sender, instance, created, **kwargs):
+    if instance.hidden:
+        return
+    if sender is Review:
+        item = feed.review_item(instance)
+    else:
+        item = feed.comment_item(instance)
+    if created:
+        transaction.on_commit(lambda: feed.append(item))
+    else:
+        transaction.on_commit(lambda: feed.replace(item))
+
+
+@receiver(post_delete, sender=Review)
+@receiver(post_delete, sender=Comment)
+def feed_item_deleted(sender, instance, **kwargs):
+    kind = feed.REVIEW if sender is Review else feed.COMMENT
+    pk = instance.pk
+    transaction.on_commit(lambda: feed.remove(kind, pk))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        activity.apply_comment(instance.author_id, 1)
+        Review.all_objects.filter(pk=instance.review_id).update(
+            comments_count=F('comments_count') + 1
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    if instance.hidden:
+        return
+    activity.apply_comment(instance.author_id, -1)
+    # При каскадном удалении отзыва его строки уже нет — UPDATE ничего
+    # не меняет.
+    Review.all_objects.filter(pk=instance.review_id).update(
+        comments_count=F('comments_count') - 1
+    )
+
+
+@receiver(post_save, sender=Title)
+def title_saved(sender, instance, created, **kwargs):
+    facets.invalidate()
+    if not created:
+        leaderboards.refresh_title(instance)
+    entry = autocomplete.title_entry(instance)
+    transaction.on_commit(lambda: autocomplete.index.upsert(entry))
+
+
+@receiver(pre_delete, sender=Title)
+def title_deleting(sender, instance, **kwargs):
+    leaderboards.remove_title(instance)
+
+
+@receiver(post_delete, sender=Title)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def catalogue_changed(sender, **kwargs):
+    facets.invalidate()
+
+
+@receiver(post_delete, sender=Title)
+def title_deleted(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(
+        lambda: autocomplete.index.remove(autocomplete.TITLE, pk)
+    )
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_save, sender=Category)
+def group_saved(sender, instance, **kwargs):
+    kind = autocomplete.GENRE if sender is Genre else autocomplete.CATEGORY
+    transaction.on_commit(
+        lambda: autocomplete.index.upsert_group(kind, instance)
+    )
+
+
+@receiver(post_delete, sender=Genre)
+@receiver(post_delete, sender=Category)
+def group_deleted(sender, instance, **kwargs):
+    kind = autocomplete.GENRE if sender is Genre else autocomplete.CATEGORY
+    pk = instance.pk
+    transaction.on_commit(lambda: autocomplete.index.remove(kind, pk))
+
+
+@receiver(m2m_changed, sender=Title.genre.through)
+def title_genres_changed(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        facets.invalidate()
+        leaderboards.refresh_title(instance)
+
+
+def log_saved(sender, instance, created, **kwargs):
+    changes.record(instance, Change.CREATE if created else Change.UPDATE)
+
+
+def log_deleted(sender, instance, **kwargs):
+    # Удаление через deletion.schedule записано при постановке задания.
+    if not getattr(instance, 'deleting', False):
+        changes.record(instance, Change.DELETE)
+
+
+for model in changes.MODELS:
+    post_save.connect(log_saved, sender=model)
+    post_delete.connect(log_deleted, sender=model)
+
+
+@receiver(m2m_changed, sender=Title.genre.through)
+def log_title_genres(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        changes.record(instance, Change.UPDATE)
@@ -0,0 +1,189 @@
+"""Похожие произведения по оценкам общих рецензентов.
+
+Отзывы превращаются в разреженную матрицу пользователь × произведение,
+из оценок вычитается средняя оценка произведения, столбцы нормируются —
+получается косинус центрированных оценок (корреляция Пирсона). Столбец
+зависит только от отзывов на само произведение, поэтому инкрементальный
+пересчёт даёт тот же результат, что и полный.
+
+Сходство блока произведений со всеми остальными — одно разреженное
+произведение матриц, блоки считаются параллельно в нескольких
+процессах. Для каждого произведения хранятся top-K соседей
+в SimilarTitle.
+
+При инкрементальном пересчёте заново считаются произведения с
+изменившимися отзывами (Title.similar_outdated) и те, чьи списки соседей
+от них зависят: список содержал изменившееся произведение или новое
+сходство с ним проходит в top-K. Флаг снимается в транзакции, которая
+записывает соседей произведения, и только если число и сумма его оценок
+не изменились с начала пересчёта: прерванный пересчёт и отзывы,
+пришедшие во время него, дождутся следующего запуска.
+"""
+import multiprocessing
+from itertools import chain
+
+from django.db import transaction
+from django.db.models import Count, Min
+
+from .lazy import LazyModule
+from .models import Review, SimilarTitle, Title
+
+np = LazyModule('numpy')
+sparse = LazyModule('scipy.sparse')
+
+_matrix = None
+
+
+def review_arrays(chunk_size):
+    """Автор, произведение и оценка всех отзывов тремя массивами."""
+    reviews = Review.objects.order_by().values_list(
+        'author_id', 'title_id', 'score'
+    ).iterator(chunk_size=chunk_size)
+    data = np.fromiter(chain.from_iterable(reviews), dtype=np.int64)
+    return data.reshape(-1, 3).T
+
+
+def review_matrix(chunk_size):
+    """Нормированная матрица оценок и id произведений по её столбцам."""
+    authors, titles, scores = review_arrays(chunk_size)
+    user_ids, user_index = np.unique(authors, return_inverse=True)
+    title_ids, title_index = np.unique(titles, return_inverse=True)
+    scores = scores.astype(np.float64)
+    title_means = (
+        np.bincount(title_index, weights=scores) / np.bincount(title_index)
+    )
+    matrix = sparse.csc_matrix(
+        (scores - title_means[title_index], (user_index, title_index)),
+        shape=(len(user_ids), len(title_ids))
+    )
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    norms[norms == 0] = 1
+    return title_ids, (matrix @ sparse.diags(1 / norms)).tocsc()
+
+
+def _init_worker(matrix):
+    global _matrix
+    _matrix = matrix
+
+
+def _neighbours(columns, top_k):
+    """Top-K соседей для блока столбцов и максимум сходства с блоком
+    по каждому столбцу матрицы."""
+    block = (_matrix[:, columns].T @ _matrix).tocsr()
+    result = []
+    for row, column in enumerate(columns):
+        start, end = block.indptr[row], block.indptr[row + 1]
+        indices, values = block.indices[start:end], block.data[start:end]
+        keep = (indices != column) & (values > 0)
+        indices, values = indices[keep], values[keep]
+        if len(values) > top_k:
+            best = np.argpartition(-values, top_k)[:top_k]
+            indices, values = indices[best], values[best]
+        order = np.argsort(-values, kind='stable')
+        result.append((column, indices[order], values[order]))
+    block_max = block.max(axis=0).toarray().ravel()
+    return result, block_max
+
+
+def compute(matrix, columns, top_k, chunk_size, processes):
+    """Соседи для столбцов columns и общий максимум сходства с ними."""
+    chunks = [
+        columns[start:start + chunk_size]
+        for start in range(0, len(columns), chunk_size)
+    ]
+    tasks = [(chunk, top_k) for chunk in chunks]
+    if processes > 1 and len(chunks) > 1:
+        context = multiprocessing.get_context('fork')
+        with context.Pool(processes, _init_worker, (matrix,)) as pool:
+            parts = pool.starmap(_neighbours, tasks)
+    else:
+        _init_worker(matrix)
+        parts = [_neighbours(*task) for task in tasks]
+    neighbours = [item for part, _ in parts for item in part]
+    maximum = np.zeros(matrix.shape[1])
+    for _, block_max in parts:
+        np.maximum(maximum, block_max, out=maximum)
+    return neighbours, maximum
+
+
+def affected_columns(title_ids, maximum, dirty, top_k):
+    """Столбцы, чьи списки соседей могли измениться из-за dirty."""
+    holders = SimilarTitle.objects.filter(
+        similar_id__in=title_ids[dirty].tolist()
+    ).values_list('title_id', flat=True)
+    affected = set(np.flatnonzero(np.isin(title_ids, list(holders))))
+    candidates = np.flatnonzero(maximum > 0)
+    stored = SimilarTitle.objects.filter(
+        title_id__in=title_ids[candidates].tolist()
+    ).values('title_id').annotate(
+        count=Count('pk'), lowest=Min('score')
+    ).values_list('title_id', 'count', 'lowest')
+    stored = {title_id: (count, lowest) for title_id, count, lowest in stored}
+    for column in candidates:
+        count, lowest = stored.get(title_ids[column], (0, 0))
+        if count < top_k or maximum[column] > lowest:
+            affected.add(column)
+    affected.difference_update(dirty)
+    return np.array(sorted(affected), dtype=np.int64)
+
+
+def mark_fresh(pks, seen):
+    """Снимает similar_outdated с произведений pks, у которых число и
+    сумма оценок те же, что в seen ({id: (число, сумма)}) — при чтении
+    отзывов для пересчёта."""
+    rows = Title.objects.select_for_update().filter(
+        pk__in=[pk for pk in pks if pk in seen]
+    ).values_list('pk', 'reviews_count', 'score_sum')
+    Title.objects.filter(pk__in=[
+        pk for pk, count, total in rows if seen[pk] == (count, total)
+    ]).update(similar_outdated=False)
+
+
+def store(title_ids, neighbours, chunk_size, seen):
+    for start in range(0, len(neighbours), chunk_size):
+        batch = neighbours[start:start + chunk_size]
+        pks = [int(title_ids[column]) for column, _, _ in batch]
+        with transaction.atomic():
+            SimilarTitle.objects.filter(title_id__in=pks).delete()
+            SimilarTitle.objects.bulk_create(
+                SimilarTitle(
+                    title_id=int(title_ids[column]),
+                    similar_id=int(title_ids[index]),
+                    score=float(score)
+                )
+                for column, indices, scores in batch
+                for index, score in zip(indices, scores)
+            )
+            mark_fresh(pks, seen)
+
+
+def build(full, top_k, chunk_size, processes):
+    """Пересчитывает похожие произведения. Возвращает число
+    произведений, для которых обновлены списки соседей."""
+    outdated = Title.objects.all()
+    if not full:
+        outdated = outdated.filter(similar_outdated=True)
+    seen = {
+        pk: (count, total) for pk, count, total in outdated.values_list(
+            'pk', 'reviews_count', 'score_sum'
+        )
+    }
+    outdated_ids = list(seen)
+    title_ids, matrix = review_matrix(chunk_size)
+    without_reviews = np.setdiff1d(outdated_ids, title_ids).tolist()
+    with transaction.atomic():
+        SimilarTitle.objects.filter(title_id__in=without_reviews).delete()
+        mark_fresh(without_reviews, seen)
+    dirty = np.flatnonzero(np.isin(title_ids, outdated_ids))
+    neighbours, maximum = compute(
+        matrix, dirty, top_k, chunk_size, processes
+    )
+    if not full:
+        extra, _ = compute(
+            matrix,
+            affected_columns(title_ids, maximum, dirty, top_k),
+            top_k, chunk_size, processes
+        )
+        neighbours.extend(extra)
+    store(title_ids, neighbours, chunk_size, seen)
+    return len(neighbours)
@@ -0,0 +1,15 @@
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from .revocation import revocations
+
+
+class RevocableJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication, отклоняющая отозванные токены. Проверка идёт
+    по фильтру отзывов в памяти воркера, без запроса к базе."""
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if revocations.is_revoked(token):
+            raise InvalidToken('Токен отозван')
+        return token
@@ -1,10 +1,15 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import UserManager as BaseUserManager
 from django.db import models
+from reviews.mixins import MaintainedFieldsMixin
 
 USER = 'user'
 ADMIN = 'admin'
 MODERATOR = 'moderator'
 
+# Старшинство ролей: понижение отзывает выданные токены.
+ROLE_RANKS = {USER: 0, MODERATOR: 1, ADMIN: 2}
+
 CHOICE_ROLES = [
     (USER, USER),
     (ADMIN, ADMIN),
@@ -12,7 +17,14 @@ CHOICE_ROLES = [
 ]
 
 
-class User(AbstractUser):
+class UserManager(BaseUserManager):
+    """Менеджер по умолчанию: без пользователей, помеченных на удаление."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleting=False)
+
+
+class User(MaintainedFieldsMixin, AbstractUser):
     """Кастомная модель пользователя унаследованная от AbstractUser
     для расширения атрибутов пользователя"""
 
@@ -52,6 +64,32 @@ class User(AbstractUser):
         default='user'
     )
 
+    deleting = models.BooleanField(
+        verbose_name='Удаляется',
+        default=False
+    )
+
+    reviews_count = models.PositiveIntegerField(
+        verbose_name='Число отзывов',
+        default=0
+    )
+
+    score_sum = models.PositiveIntegerField(
+        verbose_name='Сумма поставленных оценок',
+        default=0
+    )
+
+    comments_count = models.PositiveIntegerField(
+        verbose_name='Число комментариев',
+        default=0
+    )
+
+    objects = UserManager()
+    all_objects = BaseUserManager()
+
+    # Счётчики ведут сигналы отзывов и комментариев.
+    MAINTAINED_FIELDS = ('reviews_count', 'score_sum', 'comments_count')
+
     @property
     def is_user(self):
         return self.role == USER
@@ -72,3 +110,52 @@ class User(AbstractUser):
 
     def __str__(self) -> str:
         return self.username
+
+    @property
+    def average_score(self):
+        if not self.reviews_count:
+            return None
+        return self.score_sum / self.reviews_count
+
+
+class Revocation(models.Model):
+    """Отзыв JWT: отдельного токена (jti) или всех токенов пользователя,
+    выданных раньше not_before. Запись не нужна после expires_at — к
+    этому времени истекают все токены, которые она отзывает."""
+    jti = models.CharField(
+        verbose_name='id токена',
+        max_length=255,
+        unique=True,
+        null=True,
+        blank=True
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='revocations',
+        null=True,
+        blank=True,
+        verbose_name='Пользователь'
+    )
+    not_before = models.DateTimeField(
+        verbose_name='Недействительны токены, выданные раньше',
+        null=True,
+        blank=True
+    )
+    expires_at = models.DateTimeField(
+        verbose_name='Хранить до',
+        db_index=True
+    )
+    created_at = models.DateTimeField(
+        verbose_name='Создано',
+        auto_now_add=True
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=models.Q(jti__isnull=True),
+                name='unique_user_revocation'
+            ),
+        ]
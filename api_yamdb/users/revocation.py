@@ -0,0 +1,209 @@
+"""Отзыв выданных JWT.
+
+Отозванные токены (jti) и для пользователей момент not_before (токены,
+выданные раньше, недействительны) хранятся в Revocation. Запрос к базе
+на каждую проверку токена дорог, поэтому каждый воркер держит в памяти
+фильтр Блума по ключам записей: jti:<jti> и user:<id>. Проверка токена —
+два хэша и несколько проверок битов; к базе за точным ответом идут,
+только если фильтр ответил «возможно» — для отозванных токенов и их
+владельцев и для доли REVOCATION_ERROR_RATE остальных.
+
+Воркер дочитывает новые записи не чаще раза в
+REVOCATION_REFRESH_SECONDS: отзыв действует в своём воркере сразу
+после коммита, в остальных — с этой задержкой. Записи, созданные за
+последние REVOCATION_SETTLE_SECONDS, перечитываются, чтобы не
+пропустить транзакцию, закоммитившую меньший id позже. Раз в
+REVOCATION_REBUILD_SECONDS, а также когда записей стало больше, чем
+рассчитан фильтр, он строится заново без истёкших записей. Фильтр
+только читает базу: проверка идёт в транзакции запроса, в том числе
+на чтение. Истёкшие записи удаляет команда purge_revocations.
+"""
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from math import ceil, log
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import Revocation
+
+
+def token_key(jti):
+    return f'jti:{jti}'
+
+
+def user_key(user_id):
+    return f'user:{user_id}'
+
+
+def entry_key(jti, user_id):
+    return user_key(user_id) if jti is None else token_key(jti)
+
+
+class BloomFilter:
+    """Множество строк без ложноотрицательных ответов и с долей
+    error_rate ложноположительных, пока в нём не больше capacity
+    элементов."""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = max(capacity, 1)
+        self.size = max(
+            ceil(-self.capacity * log(error_rate) / log(2) ** 2), 8
+        )
+        self.hashes = max(round(self.size / self.capacity * log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, key):
+        # Двойное хэширование: k позиций из двух половин одного хэша.
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [
+            (first + i * second) % self.size for i in range(self.hashes)
+        ]
+
+    def add(self, key):
+        if key in self:
+            return
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self.positions(key)
+        )
+
+
+def issued_at(token):
+    """Время выдачи токена: iat или срок действия минус время жизни."""
+    if 'iat' in token:
+        return datetime.fromtimestamp(token['iat'], tz=dt_timezone.utc)
+    return datetime.fromtimestamp(
+        token['exp'], tz=dt_timezone.utc
+    ) - api_settings.ACCESS_TOKEN_LIFETIME
+
+
+def is_listed(jti, user_id, issued):
+    """Точная проверка по базе."""
+    return Revocation.objects.filter(
+        Q(jti=jti)
+        | Q(jti__isnull=True, user_id=user_id, not_before__gt=issued)
+    ).exists()
+
+
+class Revocations:
+    """Фильтр отзывов воркера и его дочитывание из базы."""
+
+    def __init__(self):
+        self.filter = None
+        self.settled_id = 0
+        self.built_at = 0
+        self.checked_at = 0
+        self.lock = threading.Lock()
+
+    def build(self):
+        count = Revocation.objects.filter(
+            expires_at__gt=timezone.now()
+        ).count()
+        bloom = BloomFilter(
+            max(2 * count, settings.REVOCATION_CAPACITY),
+            settings.REVOCATION_ERROR_RATE
+        )
+        with self.lock:
+            self.filter, self.settled_id = bloom, 0
+            self.load()
+            self.built_at = self.checked_at = time.monotonic()
+
+    def load(self):
+        """Дочитывает записи после settled_id. settled_id сдвигается
+        только по записям старше REVOCATION_SETTLE_SECONDS."""
+        settle = timezone.now() - timedelta(
+            seconds=settings.REVOCATION_SETTLE_SECONDS
+        )
+        settled = True
+        for pk, jti, user_id, created_at in Revocation.objects.filter(
+            pk__gt=self.settled_id, expires_at__gt=timezone.now()
+        ).order_by('pk').values_list('pk', 'jti', 'user_id', 'created_at'):
+            self.filter.add(entry_key(jti, user_id))
+            settled = settled and created_at < settle
+            if settled:
+                self.settled_id = pk
+        if self.filter.count > self.filter.capacity:
+            self.built_at = 0
+
+    def current(self):
+        now = time.monotonic()
+        age = now - self.built_at
+        if self.filter is None or age > settings.REVOCATION_REBUILD_SECONDS:
+            self.build()
+        elif now - self.checked_at > settings.REVOCATION_REFRESH_SECONDS:
+            with self.lock:
+                self.checked_at = now
+                self.load()
+        return self.filter
+
+    def add(self, key):
+        if self.filter is None:
+            return
+        with self.lock:
+            self.filter.add(key)
+
+    def is_revoked(self, token):
+        jti = token.get(api_settings.JTI_CLAIM)
+        user_id = token.get(api_settings.USER_ID_CLAIM)
+        bloom = self.current()
+        if token_key(jti) not in bloom and user_key(user_id) not in bloom:
+            return False
+        return is_listed(jti, user_id, issued_at(token))
+
+
+revocations = Revocations()
+
+
+def purge_expired():
+    """Удаляет записи об уже истёкших токенах. Возвращает их число."""
+    deleted, _ = Revocation.objects.filter(
+        expires_at__lte=timezone.now()
+    ).delete()
+    return deleted
+
+
+def revoke_token(token):
+    """Отзывает один токен."""
+    jti = token[api_settings.JTI_CLAIM]
+    Revocation.objects.get_or_create(jti=jti, defaults={
+        'user_id': token.get(api_settings.USER_ID_CLAIM),
+        'expires_at': datetime.fromtimestamp(
+            token['exp'], tz=dt_timezone.utc
+        ),
+    })
+    transaction.on_commit(lambda: revocations.add(token_key(jti)))
+
+
+def revoke_user(user_id):
+    """Отзывает все токены пользователя, выданные до этого момента."""
+    # Время выдачи токена известно с точностью до секунды: токены,
+    # выданные в ту же секунду, что и отзыв, тоже недействительны.
+    now = timezone.now()
+    not_before = now.replace(microsecond=0) + timedelta(seconds=1)
+    with transaction.atomic():
+        # Истёкшая запись уже не попадает в фильтры воркеров: отзыв
+        # должен получить новый id, чтобы его дочитали.
+        Revocation.objects.filter(
+            user_id=user_id, jti=None, expires_at__lte=now
+        ).delete()
+        Revocation.objects.update_or_create(
+            user_id=user_id, jti=None, defaults={
+                'not_before': not_before,
+                'expires_at': not_before + api_settings.ACCESS_TOKEN_LIFETIME,
+            }
+        )
+    transaction.on_commit(lambda: revocations.add(user_key(user_id)))
@@ -0,0 +1,30 @@
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+
+from .models import ROLE_RANKS, User
+from .revocation import revoke_user
+
+
+@receiver(pre_save, sender=User)
+def remember_previous_access(sender, instance, **kwargs):
+    """Сохраняет роль и активность до изменения."""
+    instance.previous_access = None
+    if instance.pk is not None:
+        instance.previous_access = User.all_objects.filter(
+            pk=instance.pk
+        ).values_list('role', 'is_active').first()
+
+
+@receiver(post_save, sender=User)
+def revoke_on_ban_or_demotion(sender, instance, created, **kwargs):
+    """Блокировка или понижение роли отзывает выданные токены."""
+    previous = getattr(instance, 'previous_access', None)
+    if created or previous is None:
+        return
+    role, is_active = previous
+    banned = is_active and not instance.is_active
+    demoted = (
+        ROLE_RANKS.get(instance.role, 0) < ROLE_RANKS.get(role, 0)
+    )
+    if banned or demoted:
+        revoke_user(instance.pk)
@@ -1,10 +1,26 @@
+import logging
 import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 from django.conf import settings
 from django.core.mail import send_mail
+from django.db import transaction
 from rest_framework.exceptions import ValidationError
 from users.models import User
 
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def mail_executor():
+    """Пул отправки писем. Письма уходят в фоне после коммита: ответ
+    на регистрацию не ждёт почтовый сервер. Пул создаётся при первом
+    письме, а не при старте воркера."""
+    return ThreadPoolExecutor(
+        max_workers=settings.EMAIL_WORKERS, thread_name_prefix='mail'
+    )
+
 
 def username_validate(name):
     """Проверка имени пользователя"""
@@ -23,7 +39,7 @@ def username_validate(name):
 
 def email_validate(value):
     """Проверка наличия такой почты в БД"""
-    if User.objects.filter(email=value):
+    if User.all_objects.filter(email=value).exists():
         raise ValidationError('Такая почта уже зарегистрирована в БД')
 
 
@@ -36,4 +52,13 @@ def sent_email_with_confirmation_code(to_email, code):
         f'В запросе передайте username и confirmation_code'
     )
     from_email = settings.DEFAULT_FROM_EMAIL
-    send_mail(subject, message, from_email, [to_email])
+    transaction.on_commit(lambda: mail_executor().submit(
+        send_in_background, subject, message, from_email, [to_email]
+    ))
+
+
+def send_in_background(*args):
+    try:
+        send_mail(*args)
+    except Exception:
+        logger.exception('Письмо с кодом подтверждения не отправлено')
@@ -0,0 +1,31 @@
+import os
+
+import pytest
+
+from api_yamdb import snapshots
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        '--rebuild-snapshot', action='store_true', default=False,
+        help='Собрать снимок тестовой базы заново.'
+    )
+
+
+@pytest.fixture(scope='session')
+def django_db_setup(request, django_db_blocker):
+    """База сессии — копия снимка с загруженной выгрузкой static/data.
+
+    Тесты с фикстурой db видят данные выгрузки и откатывают свои
+    изменения. Тесты с transactional_db очищают таблицы после себя,
+    поэтому данные после них пропадают до конца сессии. Каждый процесс
+    (в том числе воркер pytest-xdist) работает со своей копией.
+    """
+    with django_db_blocker.unblock():
+        snapshot = snapshots.ensure(
+            rebuild=request.config.getoption('--rebuild-snapshot')
+        )
+        clone, original = snapshots.attach(snapshot, os.getpid())
+    yield
+    with django_db_blocker.unblock():
+        snapshots.detach(clone, original)
@@ -0,0 +1,94 @@
+from random import Random
+
+import pytest
+from django.db import connection, transaction
+
+from reviews import autocomplete, caches
+from reviews.models import Review, Title
+
+
+@pytest.mark.django_db
+class TestSharedIndex:
+
+    def test_workers_converge_through_cache(self, settings):
+        settings.AUTOCOMPLETE_CHECK_SECONDS = 0
+        caches.shared().clear()
+        first, second = autocomplete.SharedIndex(), autocomplete.SharedIndex()
+        first.build()
+        second.build()
+        title = Title.objects.first()
+        Title.objects.filter(pk=title.pk).update(name='Кварцевый маятник')
+        title.refresh_from_db()
+        # Сигнал в первом воркере правит его индекс и версию в кэше.
+        first.upsert(autocomplete.title_entry(title))
+        found = [entry.pk for entry in second.search('кварцев', 5)]
+        assert found == [title.pk], (
+            'Проверьте, что воркер перестраивает индекс подсказок, когда '
+            'другой воркер меняет версию в общем кэше'
+        )
+        assert second.version == first.version == caches.shared().get(
+            autocomplete.VERSION_KEY
+        )
+
+
+class TestPrefixIndex:
+
+    def test_rerank_matches_rebuild(self):
+        random = Random(7)
+        words = ['альфа', 'альт', 'алмаз', 'бета', 'берег', 'бег']
+        entries = [
+            autocomplete.Entry(
+                autocomplete.TITLE, pk, None,
+                f'{random.choice(words)} {random.choice(words)} {pk}',
+                random.randrange(50)
+            )
+            for pk in range(1, 200)
+        ]
+        index = autocomplete.PrefixIndex(entries)
+        for _ in range(500):
+            entry = random.choice(entries)
+            entry = entry._replace(popularity=random.randrange(50))
+            entries[entry.pk - 1] = entry
+            index.upsert(entry)
+        rebuilt = autocomplete.PrefixIndex(entries)
+        for prefix in ('а', 'ал', 'аль', 'б', 'бе', 'бег', 'альфа'):
+            assert index.search(prefix, 20) == rebuilt.search(prefix, 20), (
+                'Проверьте, что смена популярности сдвигает произведение '
+                'в списках лучших так же, как полная перестройка'
+            )
+
+
+def run_on_commit():
+    # Тест идёт в транзакции, которая не коммитится.
+    callbacks = connection.run_on_commit[:]
+    connection.run_on_commit[:] = []
+    for _, callback in callbacks:
+        callback()
+
+
+@pytest.mark.django_db
+class TestIndexUpdates:
+
+    def test_rollback_keeps_index(self):
+        index = autocomplete.index
+        index.build()
+        review = Review.objects.first()
+        ref = (autocomplete.TITLE, review.title_id)
+        known = index.index.entries[ref]
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                Review.objects.get(pk=review.pk).delete()
+                raise RuntimeError
+        run_on_commit()
+        assert index.index.entries[ref] == known, (
+            'Проверьте, что индекс подсказок меняется только после коммита'
+        )
+        review.delete()
+        assert index.index.entries[ref] == known, (
+            'Проверьте, что индекс подсказок меняется только после коммита'
+        )
+        run_on_commit()
+        assert index.index.entries[ref].popularity == known.popularity - 1, (
+            'Проверьте, что после коммита популярность в подсказках '
+            'обновляется'
+        )
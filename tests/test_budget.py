@@ -0,0 +1,40 @@
+import pytest
+from rest_framework.test import APIClient
+
+from api.mixins import in_flight, streams
+
+
+@pytest.mark.django_db
+class TestRequestBudget:
+
+    def test_function_views_shed(self, settings):
+        settings.API_MAX_IN_FLIGHT = 0
+        response = APIClient().get('/api/v1/autocomplete/', {'q': 'a'})
+        assert response.status_code == 503, (
+            'Проверьте, что запросы к функциям API тоже отсекаются '
+            'под нагрузкой'
+        )
+        assert response['Retry-After'] == str(settings.API_RETRY_AFTER)
+        assert in_flight.count == 0, (
+            'Проверьте, что отсечённый запрос освобождает место в счётчике'
+        )
+
+    def test_stream_counted_until_closed(self, settings):
+        title_id = APIClient().get('/api/v1/titles/').json()['results'][0][
+            'id'
+        ]
+        response = APIClient().get(f'/api/v1/titles/{title_id}/reviews/'
+                                   'events/')
+        assert response.status_code == 200
+        assert (streams.count, in_flight.count) == (1, 0), (
+            'Проверьте, что открытый поток SSE считается в своём счётчике'
+        )
+        settings.API_MAX_STREAMS = 1
+        shed = APIClient().get(f'/api/v1/titles/{title_id}/reviews/events/')
+        assert shed.status_code == 503, (
+            'Проверьте, что потоки SSE сверх API_MAX_STREAMS отсекаются'
+        )
+        response.close()
+        assert streams.count == 0, (
+            'Проверьте, что закрытый поток SSE освобождает место в счётчике'
+        )
@@ -0,0 +1,39 @@
+import pytest
+
+from reviews import changes, deletion
+from reviews.models import Change, Genre, Title
+
+
+@pytest.mark.django_db
+class TestChanges:
+
+    def test_numbers_assigned_after_commit(self):
+        changes.publish()
+        last = changes.published().order_by('-seq').values_list(
+            'seq', flat=True
+        ).first() or 0
+        genre = Genre.objects.create(name='Эссе', slug='essay')
+        genre.name = 'Эссеистика'
+        genre.save()
+        pending = Change.objects.filter(key='genres/essay')
+        assert not changes.published().filter(key='genres/essay').exists(), (
+            'Проверьте, что запись журнала получает номер только после '
+            'коммита'
+        )
+        assert changes.publish() == 2
+        assert list(pending.order_by('pk').values_list('seq', 'action')) == [
+            (last + 1, Change.CREATE), (last + 2, Change.UPDATE)
+        ], 'Проверьте, что номера выдаются подряд в порядке записей'
+        assert changes.publish() == 0
+
+    def test_scheduled_deletion_logged_once(self):
+        title = Title.objects.first()
+        job = deletion.schedule(title)
+        deletion.run(job.pk)
+        assert not Title.all_objects.filter(pk=title.pk).exists()
+        assert Change.objects.filter(
+            model='title', object_id=title.pk, action=Change.DELETE
+        ).count() == 1, (
+            'Проверьте, что удаление произведения записывается в журнал '
+            'один раз — при постановке задания'
+        )
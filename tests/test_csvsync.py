@@ -0,0 +1,76 @@
+import csv
+import shutil
+
+import pytest
+
+from reviews import csvsync
+from reviews.models import Comment, Genre
+
+
+def rewrite(path, csv_f, change):
+    with open(path / csv_f, encoding='utf-8', newline='') as csv_file:
+        reader = csv.DictReader(csv_file)
+        fields, rows = reader.fieldnames, list(reader)
+    rows = change(rows)
+    with open(path / csv_f, 'w', encoding='utf-8', newline='') as csv_file:
+        writer = csv.DictWriter(csv_file, fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def totals(diffs):
+    result = dict.fromkeys(('inserted', 'updated', 'deleted'), 0)
+    for diff in diffs:
+        for key in result:
+            result[key] += diff.counts()[key]
+    return result
+
+
+def sync(path, dry_run=False):
+    return totals(csvsync.Sync(str(path), 1000).run(dry_run=dry_run))
+
+
+@pytest.mark.django_db
+class TestCsvSync:
+
+    @pytest.fixture
+    def export(self, tmp_path):
+        path = tmp_path / 'data'
+        shutil.copytree(csvsync.default_path(), path)
+        csvsync.record_baseline(str(path), 1000)
+        return path
+
+    def test_unchanged_export_is_noop(self, export):
+        assert sync(export) == {'inserted': 0, 'updated': 0, 'deleted': 0}, (
+            'Проверьте, что выгрузка, совпадающая с базой, ничего не меняет'
+        )
+
+    def test_apply_is_idempotent(self, export):
+        genre = Genre.objects.first()
+        comment = Comment.objects.first()
+
+        def rename(rows):
+            for row in rows:
+                if row['id'] == str(genre.pk):
+                    row['name'] = 'Новое название'
+            return rows + [{'id': '9999', 'name': 'Эссе', 'slug': 'essay'}]
+
+        rewrite(export, 'genre.csv', rename)
+        rewrite(export, 'comments.csv', lambda rows: [
+            row for row in rows if row['id'] != str(comment.pk)
+        ])
+        expected = {'inserted': 1, 'updated': 1, 'deleted': 1}
+        assert sync(export, dry_run=True) == expected, (
+            'Проверьте, что --dry-run считает разницу выгрузки с базой'
+        )
+        assert Genre.objects.get(pk=genre.pk).name == genre.name, (
+            'Проверьте, что --dry-run ничего не изменяет'
+        )
+        assert sync(export) == expected
+        assert Genre.objects.get(pk=genre.pk).name == 'Новое название'
+        assert Genre.objects.filter(slug='essay').exists()
+        assert not Comment.all_objects.filter(pk=comment.pk).exists()
+        assert sync(export) == {'inserted': 0, 'updated': 0, 'deleted': 0}, (
+            'Проверьте, что повторное применение той же выгрузки ничего '
+            'не меняет'
+        )
@@ -0,0 +1,59 @@
+import pytest
+from django.db import connection
+from rest_framework.test import APIClient
+
+from reviews import caches, deletion, feed
+from reviews.models import Category, Review, Title
+
+
+def schedule(instance):
+    # Само удаление (start) стоит в on_commit и в тесте не запускается:
+    # зависимые записи остаются в базе, как пока идёт фоновое задание.
+    job = deletion.schedule(instance)
+    connection.run_on_commit[:] = []
+    return job
+
+
+@pytest.mark.django_db
+class TestDeletingDependents:
+
+    def test_hidden_while_purge_pending(self, settings, tmp_path):
+        settings.CACHES = dict(settings.CACHES, **{caches.SHARED: {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': str(tmp_path),
+        }})
+        feed.fill()
+        newest = feed.page(None, 1)[0]
+        if newest['type'] == feed.REVIEW:
+            review = Review.objects.get(pk=newest['id'])
+        else:
+            review = Review.objects.get(comments__pk=newest['id'])
+        schedule(review.title)
+
+        assert review.title_id not in [
+            item['title'] for item in feed.page(None, settings.FEED_SIZE)
+        ], 'Проверьте, что записи удаляемого произведения уходят из ленты'
+        assert review.title_id not in [
+            item['title'] for item in feed.from_db(None, settings.FEED_SIZE)
+        ], (
+            'Проверьте, что лента из базы не показывает записи удаляемого '
+            'произведения'
+        )
+        response = APIClient().get(
+            '/api/v1/reviews/batch/', {'ids': str(review.pk)}
+        )
+        assert response.status_code == 200
+        assert response.json()['results'] == [], (
+            'Проверьте, что пакетное чтение не отдаёт отзывы удаляемого '
+            'произведения'
+        )
+
+    def test_deleting_category_not_shown(self):
+        title = Title.objects.filter(category__isnull=False).first()
+        schedule(Category.objects.get(pk=title.category_id))
+        response = APIClient().get(f'/api/v1/titles/{title.pk}/')
+        assert response.status_code == 200
+        assert response.json()['category'] is None, (
+            'Проверьте, что у произведений удаляемой категории она уже '
+            'не показывается'
+        )
@@ -0,0 +1,78 @@
+import pytest
+from django.db import connection
+from users.models import User
+
+from reviews import changes, events
+from reviews.models import Comment, Review, Title
+
+
+def run_on_commit():
+    # Тест идёт в транзакции, которая не коммитится; колбэки publish()
+    # добавляют свои.
+    while connection.run_on_commit:
+        callbacks = connection.run_on_commit[:]
+        connection.run_on_commit[:] = []
+        for _, callback in callbacks:
+            callback()
+
+
+def add_review(title):
+    author = User.objects.exclude(reviews__title=title).first()
+    return Review.objects.create(
+        title=title, author=author, score=7,
+        text=f'Отзыв {author.username} на {title.name}'
+    )
+
+
+@pytest.mark.django_db
+class TestEvents:
+
+    @pytest.fixture
+    def broker(self, monkeypatch):
+        broker = events.LocalBroker()
+        monkeypatch.setattr(events, 'broker', broker)
+        run_on_commit()
+        changes.publish()
+        return broker
+
+    def test_backlog_from_change_log(self, broker):
+        title, other = Title.objects.all()[:2]
+        last = events.last_published()
+        first = add_review(title)
+        add_review(other)
+        Comment.objects.create(
+            review=first, author=first.author, text='Комментарий'
+        )
+        second = add_review(title)
+        run_on_commit()
+        backlog = events.backlog(events.title_channel(title.pk), last)
+        assert [item['id'] for _, item in backlog] == [first.pk, second.pk], (
+            'Проверьте, что поток дочитывает из журнала только новые отзывы '
+            'своего произведения по порядку номеров'
+        )
+        seqs = [seq for seq, _ in backlog]
+        assert seqs == sorted(seqs) and seqs[0] > last
+        comments = events.backlog(events.review_channel(first.pk), last)
+        assert [item['type'] for _, item in comments] == ['comment']
+
+    def test_live_events_in_order(self, broker):
+        title = Title.objects.first()
+        channel = events.title_channel(title.pk)
+        subscription = broker.subscribe(channel)
+        try:
+            reviews = [add_review(title), add_review(title)]
+            run_on_commit()
+            received = [subscription.get(0), subscription.get(0)]
+        finally:
+            broker.unsubscribe(subscription)
+        assert None not in received, (
+            'Проверьте, что подписчик получает новые отзывы после коммита'
+        )
+        assert [item['id'] for _, item in received] == [
+            review.pk for review in reviews
+        ]
+        assert received[0][0] < received[1][0], (
+            'Проверьте, что id события — номер записи журнала'
+        )
+        assert subscription.get(0) is None
+
@@ -0,0 +1,31 @@
+import pytest
+from django.db.models import Count
+
+from api.includes import attach_reviews
+from reviews.models import Review, Title
+from users.models import User
+
+
+@pytest.mark.django_db
+class TestLatestPerParent:
+
+    def test_skips_deleting_and_keeps_limit(self, settings):
+        settings.INCLUDE_RELATED_LIMIT = 2
+        title = Title.objects.annotate(
+            shown=Count('reviews')
+        ).filter(shown__gt=2).first()
+        newest = Review.objects.filter(title=title).order_by(
+            '-pub_date', '-pk'
+        ).first()
+        User.all_objects.filter(pk=newest.author_id).update(deleting=True)
+        attach_reviews([title])
+        expected = list(Review.objects.alive().filter(
+            title=title
+        ).order_by('-pub_date', '-pk').values_list('pk', flat=True)[:2])
+        assert [review.pk for review in title.included_reviews] == (
+            expected
+        ), (
+            'Проверьте, что встроенные отзывы — последние показанные, '
+            'без отзывов удаляемых авторов, и их по-прежнему '
+            'INCLUDE_RELATED_LIMIT'
+        )
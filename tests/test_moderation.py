@@ -0,0 +1,104 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+
+from reviews import caches, feed, moderation
+from reviews.models import Comment, Review, Title
+
+CONSISTENT = 'Расхождений в счётчиках — произведений: 0, отзывов: 0'
+
+
+def check_counters():
+    out = StringIO()
+    call_command('reconcile_counters', '--check', stdout=out)
+    return out.getvalue().strip()
+
+
+def run_on_commit():
+    # Тест идёт в транзакции, которая не коммитится.
+    callbacks, connection.run_on_commit[:] = connection.run_on_commit[:], []
+    for _, callback in callbacks:
+        callback()
+
+
+def moderate(model, action, **lookups):
+    return moderation.Moderation(
+        moderation.select(model, action, **lookups), action
+    ).run()
+
+
+@pytest.mark.django_db
+class TestModeration:
+
+    def test_counters_stay_consistent(self):
+        assert check_counters() == CONSISTENT, (
+            'Проверьте, что счётчики в снимке тестовой базы сходятся'
+        )
+        review = Review.objects.filter(comments__isnull=False).first()
+        title = Title.objects.get(pk=review.title_id)
+        comment = review.comments.first()
+
+        moderate(Comment, moderation.HIDE, ids=[comment.pk])
+        assert Review.objects.get(pk=review.pk).comments_count == (
+            review.comments_count - 1
+        ), 'Проверьте, что скрытый комментарий не входит в comments_count'
+        assert check_counters() == CONSISTENT, (
+            'Проверьте, что после скрытия комментария счётчики сходятся'
+        )
+
+        moderate(Review, moderation.HIDE, ids=[review.pk])
+        hidden = Title.objects.get(pk=title.pk)
+        assert (hidden.reviews_count, hidden.score_sum) == (
+            title.reviews_count - 1, title.score_sum - review.score
+        ), 'Проверьте, что скрытый отзыв не входит в агрегаты произведения'
+        assert check_counters() == CONSISTENT, (
+            'Проверьте, что после скрытия отзыва счётчики сходятся'
+        )
+
+        moderate(Review, moderation.UNHIDE, ids=[review.pk])
+        shown = Title.objects.get(pk=title.pk)
+        assert (shown.reviews_count, shown.score_sum) == (
+            title.reviews_count, title.score_sum
+        ), 'Проверьте, что возвращённый отзыв снова входит в агрегаты'
+        assert check_counters() == CONSISTENT, (
+            'Проверьте, что после возврата отзыва счётчики сходятся'
+        )
+
+        summary = moderate(Review, moderation.DELETE, ids=[review.pk])
+        assert summary['cascaded_comments'] == review.comments_count, (
+            'Проверьте, что вместе с отзывом удаляются его комментарии, '
+            'в том числе скрытые'
+        )
+        assert not Comment.all_objects.filter(review_id=review.pk).exists()
+        deleted = Title.objects.get(pk=title.pk)
+        assert (deleted.reviews_count, deleted.score_sum) == (
+            title.reviews_count - 1, title.score_sum - review.score
+        ), 'Проверьте, что удалённый отзыв не входит в агрегаты'
+        assert check_counters() == CONSISTENT, (
+            'Проверьте, что после удаления отзыва счётчики сходятся'
+        )
+
+    def test_unhide_restores_feed(self, settings, tmp_path):
+        settings.CACHES = dict(settings.CACHES, **{caches.SHARED: {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': str(tmp_path),
+        }})
+        run_on_commit()
+        feed.fill()
+        newest = feed.page(None, 1)[0]
+        model = Review if newest['type'] == feed.REVIEW else Comment
+
+        moderate(model, moderation.HIDE, ids=[newest['id']])
+        run_on_commit()
+        assert newest['id'] not in [
+            item['id'] for item in feed.page(None, 5)
+            if item['type'] == newest['type']
+        ], 'Проверьте, что скрытая запись пропадает из ленты'
+
+        moderate(model, moderation.UNHIDE, ids=[newest['id']])
+        run_on_commit()
+        assert feed.page(None, 1)[0]['id'] == newest['id'], (
+            'Проверьте, что возвращённая запись снова появляется в ленте'
+        )
@@ -0,0 +1,65 @@
+import pytest
+
+from reviews import ratings
+from reviews.models import RatingPriors, Title
+
+PRIORS = RatingPriors(mean=7, votes=3)
+
+
+class TestRatings:
+
+    def test_bayesian(self, settings):
+        settings.RATING_STRATEGY = 'bayesian'
+        # (18 + 3 * 7) / (2 + 3)
+        assert ratings.rate(18, 2, PRIORS) == pytest.approx(7.8), (
+            'Проверьте формулу байесовского рейтинга'
+        )
+        assert ratings.rate(0, 0, PRIORS) is None, (
+            'Проверьте, что у произведения без оценок нет рейтинга'
+        )
+
+    @pytest.mark.parametrize('score_sum, count, expected', [
+        # Все оценки 10: нижняя граница 1 / (1 + z² / n).
+        (40, 4, 1 + 9 / (1 + 1.96 ** 2 / 4)),
+        # Все оценки 1: нижняя граница ровно 0.
+        (10, 10, 1),
+        # Средняя 7 из 10 оценок: доля 2/3, граница ≈ 0.3678.
+        (70, 10, 4.3101),
+    ])
+    def test_wilson(self, settings, score_sum, count, expected):
+        settings.RATING_STRATEGY = 'wilson'
+        assert ratings.rate(score_sum, count, PRIORS) == pytest.approx(
+            expected, abs=1e-4
+        ), 'Проверьте формулу рейтинга по нижней границе Уилсона'
+
+    def test_wilson_prefers_more_votes(self):
+        wilson = ratings.WilsonRating()
+        assert wilson.rate(90, 10, PRIORS) > wilson.rate(9, 1, PRIORS), (
+            'Проверьте, что при той же средней рейтинг Уилсона выше у '
+            'произведения с большим числом оценок'
+        )
+
+
+
+@pytest.mark.django_db
+class TestRecomputeRatings:
+
+    def test_keeps_aggregates(self):
+        title = Title.objects.filter(reviews_count__gt=0).first()
+        # Агрегаты, которые сигнал отзыва сдвинул во время пересчёта.
+        count, total = title.reviews_count + 1, title.score_sum + 10
+        Title.objects.filter(pk=title.pk).update(
+            reviews_count=count, score_sum=total
+        )
+        ratings.recompute_all(chunk_size=5)
+        title.refresh_from_db()
+        assert (title.reviews_count, title.score_sum) == (count, total), (
+            'Проверьте, что recompute_all не перезаписывает число и сумму '
+            'оценок, которые поддерживают сигналы'
+        )
+        assert title.rating == pytest.approx(
+            ratings.rate(total, count, ratings.current_priors())
+        ), 'Проверьте, что рейтинг считается по текущим агрегатам'
+        assert Title.objects.filter(
+            reviews_count=0, rating__isnull=False
+        ).count() == 0, 'Проверьте, что у произведений без оценок нет рейтинга'
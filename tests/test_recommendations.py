@@ -0,0 +1,57 @@
+import tracemalloc
+
+import numpy as np
+from scipy import sparse
+
+from reviews import recommendations
+
+FACTORS = 32
+REVIEWS = 20000
+
+
+def solve(matrix, other, regularization=0.1):
+    recommendations._rows = (matrix.indptr, matrix.indices, matrix.data)
+    recommendations._other = other
+    return recommendations._solve_chunk(0, matrix.shape[0], regularization)
+
+
+class TestAls:
+
+    def test_solves_normal_equations(self):
+        random = np.random.default_rng(1)
+        matrix = sparse.random(
+            5, 40, density=0.3, format='csr', random_state=1
+        )
+        other = random.normal(size=(40, 4))
+        solved = solve(matrix, other)
+        for row in range(matrix.shape[0]):
+            columns = matrix[row].indices
+            factors = other[columns]
+            expected = np.linalg.solve(
+                factors.T @ factors + 0.1 * len(columns) * np.eye(4),
+                factors.T @ matrix[row].data
+            )
+            assert np.allclose(solved[row], expected), (
+                'Проверьте, что строка решает нормальные уравнения ALS'
+            )
+
+    def test_memory_is_linear_in_reviews(self):
+        # Одно произведение со всеми отзывами — одна пачка: тензор
+        # nnz × k × k занял бы 160 МБ.
+        matrix = sparse.csr_matrix(
+            (np.ones(REVIEWS), (np.zeros(REVIEWS), np.arange(REVIEWS))),
+            shape=(1, REVIEWS)
+        )
+        other = np.random.default_rng(0).normal(size=(REVIEWS, FACTORS))
+        tracemalloc.start()
+        try:
+            solve(matrix, other)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        budget = 4 * REVIEWS * FACTORS * 8
+        assert peak < budget, (
+            f'Полушаг ALS занял {peak / 2 ** 20:.0f} МБ при бюджете '
+            f'{budget / 2 ** 20:.0f} МБ: не собирайте матрицы Грама через '
+            'тензор nnz × k × k'
+        )
@@ -0,0 +1,45 @@
+import pytest
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from users.models import User
+from users.revocation import revocations
+
+ME_URL = '/api/v1/users/me/'
+REVOKE_URL = '/api/v1/auth/revoke/'
+
+
+def client_with_token(user):
+    client = APIClient()
+    client.credentials(
+        HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}'
+    )
+    return client
+
+
+@pytest.mark.django_db
+class TestRevocation:
+
+    @pytest.fixture(autouse=True)
+    def fresh_filter(self, settings, monkeypatch):
+        # Фильтр воркера дочитывает отзывы на каждой проверке: в тесте
+        # транзакция не коммитится и on_commit не срабатывает.
+        settings.REVOCATION_REFRESH_SECONDS = 0
+        monkeypatch.setattr(revocations, 'filter', None)
+
+    def test_revoked_token_rejected(self):
+        user, other = User.objects.all()[:2]
+        revoked, kept = client_with_token(user), client_with_token(other)
+        assert revoked.get(ME_URL).status_code == 200, (
+            'Проверьте, что действующий токен принимается'
+        )
+        assert revoked.post(REVOKE_URL).status_code == 204
+        assert revoked.get(ME_URL).status_code == 401, (
+            'Проверьте, что отозванный токен отклоняется'
+        )
+        assert client_with_token(user).get(ME_URL).status_code == 200, (
+            'Проверьте, что отзыв одного токена не затрагивает другие '
+            'токены того же пользователя'
+        )
+        assert kept.get(ME_URL).status_code == 200, (
+            'Проверьте, что токены других пользователей принимаются'
+        )
@@ -0,0 +1,24 @@
+from api_yamdb import startup
+
+# Бюджет с запасом: на машине разработчика django.setup() и импорт
+# URLconf занимают около 0,5 с.
+BOOT_BUDGET_SECONDS = 3.0
+
+
+class TestStartup:
+
+    def test_worker_boot(self):
+        report = startup.profile()
+        assert not report['heavy'], (
+            'Проверьте, что библиотеки пакетных пересчётов '
+            f'({", ".join(report["heavy"])}) не импортируются при старте '
+            'воркера: используйте reviews.lazy.LazyModule'
+        )
+        boot = report['setup'] + sum(
+            module['import'] for module in report['modules']
+        )
+        assert boot < BOOT_BUDGET_SECONDS, (
+            f'Старт воркера занял {boot:.2f} с при бюджете '
+            f'{BOOT_BUDGET_SECONDS} с: посмотрите python manage.py '
+            'profile_startup'
+        )
@@ -0,0 +1,18 @@
+import pytest
+
+from users.models import User
+
+
+@pytest.mark.django_db
+class TestUserSave:
+
+    def test_keeps_maintained_counters(self):
+        user = User.objects.filter(reviews_count__gt=0).first()
+        User.objects.filter(pk=user.pk).update(reviews_count=100)
+        user.bio = 'Новая биография'
+        user.save()
+        user.refresh_from_db()
+        assert (user.bio, user.reviews_count) == ('Новая биография', 100), (
+            'Проверьте, что сохранение пользователя не перезаписывает '
+            'счётчики, которые ведут сигналы'
+        )